@@ -18,6 +18,10 @@ def create_app(config_class=Config):
 
     login_manager.login_view = 'auth.login'
 
+    # Money-moving forms carry a fresh key so resubmits are replayed, not re-run
+    from app.services.idempotency import new_key
+    app.jinja_env.globals['idempotency_key'] = new_key
+
     # --- REGISTER BLUEPRINTS ---
     
     # 1. Core
@@ -1,6 +1,9 @@
+import uuid
 from datetime import datetime
 from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.services.geo_service import point_index, stamp_geohash
+from app.services.money import Cents
 
 
 class User(db.Model):
@@ -8,7 +11,7 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=True)
     password_hash = db.Column(db.String(256), nullable=False)
-    wallet_balance = db.Column(db.Float, default=0.0)
+    wallet_balance = db.Column(Cents, default=0)
     reputation_points = db.Column(db.Integer, default=0)
     role = db.Column(db.String(20), default='citizen')  # citizen, provider, official
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -45,12 +48,19 @@ class Service(db.Model):
     category = db.Column(db.String(50), nullable=False)
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
+    geohash = db.Column(db.String(12), nullable=True, index=True)  # Maintained by stamp_geohash
     provider_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    price = db.Column(db.Integer, nullable=False)
+    price = db.Column(Cents, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     provider = db.relationship('User', backref=db.backref('services', lazy=True))
 
+    __table_args__ = (
+        point_index('ix_service_geom', longitude, latitude),
+        db.Index('ix_service_provider_id', 'provider_id'),
+    )
+
     def __repr__(self):
         return f'<Service {self.name}>'
 
@@ -64,13 +74,14 @@ class Job(db.Model):
     
     # Status: 'Pending' -> 'In_Progress' -> 'Completed' -> 'Paid'
     # Additional: 'Disputed', 'Cancelled'
+    # Only change it through app.services.job_states, which validates, stamps and logs
     status = db.Column(db.String(20), default='Pending')
     description = db.Column(db.Text, nullable=True)
-    price = db.Column(db.Integer, nullable=False)
+    price = db.Column(Cents, nullable=False)
     location = db.Column(db.String(200), nullable=True)
     
     # Escrow Data
-    agreed_price = db.Column(db.Integer, default=0)
+    agreed_price = db.Column(Cents, default=0)
     is_paid = db.Column(db.Boolean, default=False)
     
     # Timestamps for workflow tracking
@@ -83,10 +94,42 @@ class Job(db.Model):
     client = db.relationship('User', foreign_keys=[client_id], backref=db.backref('client_jobs', lazy=True))
     provider = db.relationship('User', foreign_keys=[provider_id], backref=db.backref('provider_jobs', lazy=True))
 
+    # Dashboards count a provider's / client's jobs by status and page
+    # through them newest first (keyset on id)
+    __table_args__ = (
+        db.Index('ix_job_provider_status', 'provider_id', 'status'),
+        db.Index('ix_job_client_status', 'client_id', 'status'),
+        db.Index('ix_job_provider_id', 'provider_id', 'id'),
+        db.Index('ix_job_client_id', 'client_id', 'id'),
+        # Sweeps such as cancelling stale Pending jobs: status = ? AND created_at < ?
+        db.Index('ix_job_status_created', 'status', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Job {self.id}>'
 
 
+class JobTransition(db.Model):
+    """Append-only log of Job status changes, for auditing and time-in-state analytics"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=False)
+    from_status = db.Column(db.String(20), nullable=True)
+    to_status = db.Column(db.String(20), nullable=False)
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # None for system sweeps
+    reason = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    job = db.relationship('Job', backref=db.backref('transitions', lazy=True, order_by='JobTransition.id'))
+
+    __table_args__ = (
+        db.Index('ix_job_transition_job_id', 'job_id', 'id'),
+        db.Index('ix_job_transition_to_status_created', 'to_status', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<JobTransition {self.job_id} {self.from_status}->{self.to_status}>'
+
+
 class Review(db.Model):
     """Rating and feedback system for completed jobs"""
     id = db.Column(db.Integer, primary_key=True)
@@ -108,9 +151,10 @@ class Review(db.Model):
     reviewer = db.relationship('User', foreign_keys=[reviewer_id], backref=db.backref('reviews_given', lazy=True))
     reviewee = db.relationship('User', foreign_keys=[reviewee_id], backref=db.backref('reviews_received', lazy=True))
     
-    # Ensure one review per role per job
+    # Ensure one review per role per job; dashboards average a user's ratings from the index alone
     __table_args__ = (
         db.UniqueConstraint('job_id', 'reviewer_id', name='unique_review_per_user_per_job'),
+        db.Index('ix_review_reviewee_role_rating', 'reviewee_id', 'role_rated', 'rating'),
     )
 
     def __repr__(self):
@@ -157,6 +201,7 @@ class CivicIssue(db.Model):
     # Geospatial Data
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
+    geohash = db.Column(db.String(12), nullable=True, index=True)  # Maintained by stamp_geohash
     
     # Status Tracking: 'Reported' -> 'Under_Review' -> 'In_Progress' -> 'Resolved'
     status = db.Column(db.String(50), default='Reported')
@@ -175,13 +220,18 @@ class CivicIssue(db.Model):
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     resolved_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
     reporter = db.relationship('User', foreign_keys=[reporter_id], backref=db.backref('civic_issues', lazy=True))
     assigned_to = db.relationship('User', foreign_keys=[assigned_to_id], backref=db.backref('assigned_issues', lazy=True))
 
+    __table_args__ = (
+        point_index('ix_civic_issue_geom', longitude, latitude),
+        db.Index('ix_civic_issue_created_at', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<CivicIssue {self.title}>'
 
@@ -217,10 +267,27 @@ class JobChat(db.Model):
     job = db.relationship('Job', backref=db.backref('messages', lazy=True))
     sender = db.relationship('User', backref=db.backref('chat_messages', lazy=True))
 
+    # History pages and the live stream both walk a job's messages by id
+    __table_args__ = (
+        db.Index('ix_job_chat_job_timestamp', 'job_id', 'timestamp'),
+        db.Index('ix_job_chat_job_id', 'job_id', 'id'),
+    )
+
     def __repr__(self):
         return f'<JobChat {self.id}>'
 
 
+class MapTombstone(db.Model):
+    """Deleted map rows, kept so delta syncs can tell clients to drop their cached pins"""
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)  # 'service' or 'issue'
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<MapTombstone {self.entity_type} {self.entity_id}>'
+
+
 class MacalaaLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -250,6 +317,11 @@ class Goal(db.Model):
     user = db.relationship('User', backref=db.backref('goals', lazy=True))
     parent = db.relationship('Goal', remote_side=[id], backref=db.backref('subgoals', lazy=True))
 
+    # Every goals view filters on (user_id, is_completed, parent_id)
+    __table_args__ = (
+        db.Index('ix_goal_user_completed_parent', 'user_id', 'is_completed', 'parent_id'),
+    )
+
     def __repr__(self):
         return f'<Goal {self.title}>'
 
@@ -263,6 +335,10 @@ class Milestone(db.Model):
 
     goal = db.relationship('Goal', backref=db.backref('milestones', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_milestone_goal_id', 'goal_id'),
+    )
+
     def __repr__(self):
         return f'<Milestone {self.title}>'
 
@@ -277,6 +353,10 @@ class NetworkContact(db.Model):
 
     user = db.relationship('User', backref=db.backref('network_contacts', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_network_contact_user_id', 'user_id'),
+    )
+
     def __repr__(self):
         return f'<NetworkContact {self.name}>'
 
@@ -295,6 +375,12 @@ class NetworkAlert(db.Model):
     user = db.relationship('User', backref=db.backref('network_alerts', lazy=True))
     contact = db.relationship('NetworkContact', backref=db.backref('alerts', lazy=True))
 
+    # Upcoming alerts: user_id = ? AND is_completed = ? AND alert_date > now
+    __table_args__ = (
+        db.Index('ix_network_alert_user_completed_date', 'user_id', 'is_completed', 'alert_date'),
+        db.Index('ix_network_alert_contact_id', 'contact_id'),
+    )
+
     def __repr__(self):
         return f'<NetworkAlert {self.title}>'
 
@@ -312,6 +398,10 @@ class BalaaHistory(db.Model):
 
     user = db.relationship('User', backref=db.backref('balaa_history', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_balaa_history_user_id', 'user_id'),
+    )
+
     def __repr__(self):
         return f'<BalaaHistory {self.id}>'
 
@@ -325,6 +415,10 @@ class DiaryEntry(db.Model):
 
     user = db.relationship('User', backref=db.backref('diary_entries', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_diary_entry_user_created', 'user_id', created_at.desc()),
+    )
+
     def __repr__(self):
         return f'<DiaryEntry {self.id}>'
 
@@ -338,6 +432,10 @@ class ChatLog(db.Model):
 
     user = db.relationship('User', backref=db.backref('chat_logs', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_chat_log_user_created', 'user_id', created_at.desc()),
+    )
+
     def __repr__(self):
         return f'<ChatLog {self.id}>'
 
@@ -345,8 +443,8 @@ class ChatLog(db.Model):
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    transaction_type = db.Column(db.String(50), nullable=False)  # Deposit, Withdrawal, Payment, Earning, Conversion
+    amount = db.Column(Cents, nullable=False)
+    transaction_type = db.Column(db.String(50), nullable=False)  # Deposit, Withdrawal, Payment, Earning, Conversion, Escrow, Refund, Reward
     description = db.Column(db.Text, nullable=True)
     related_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -354,10 +452,201 @@ class Transaction(db.Model):
     user = db.relationship('User', foreign_keys=[user_id], backref=db.backref('transactions', lazy=True))
     related_user = db.relationship('User', foreign_keys=[related_user_id])
 
+    # Wallet history keyset: user_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC
+    __table_args__ = (
+        db.Index('ix_transaction_user_timestamp', 'user_id', timestamp.desc(), id.desc()),
+    )
+
     def __repr__(self):
         return f'<Transaction {self.id}>'
 
 
+class LedgerEntry(db.Model):
+    """One balanced money movement; its postings always sum to zero"""
+    id = db.Column(db.Integer, primary_key=True)
+    entry_type = db.Column(db.String(50), nullable=False)  # Deposit, Withdrawal, Transfer, Escrow, Release, Refund, Conversion, Reward, Opening
+    description = db.Column(db.Text, nullable=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    job = db.relationship('Job', backref=db.backref('ledger_entries', lazy=True))
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.id} {self.entry_type}>'
+
+
+class LedgerPosting(db.Model):
+    """One side of a ledger entry against an account ('wallet:<user_id>', 'escrow', ...)"""
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('ledger_entry.id'), nullable=False)
+    account = db.Column(db.String(40), nullable=False)
+    amount = db.Column(Cents, nullable=False)  # Positive credits the account, negative debits it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    entry = db.relationship('LedgerEntry', backref=db.backref('postings', lazy=True))
+
+    # Balances are summed per account from the last snapshot's posting id onwards
+    __table_args__ = (
+        db.Index('ix_ledger_posting_account_id', 'account', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<LedgerPosting {self.account} {self.amount}>'
+
+
+class BalanceSnapshot(db.Model):
+    """Running balance of an account up to and including posting `last_posting_id`"""
+    id = db.Column(db.Integer, primary_key=True)
+    account = db.Column(db.String(40), nullable=False)
+    balance = db.Column(Cents, nullable=False)
+    last_posting_id = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_balance_snapshot_account_taken', 'account', 'taken_at'),
+    )
+
+    def __repr__(self):
+        return f'<BalanceSnapshot {self.account} {self.balance}>'
+
+
+class RatingAggregate(db.Model):
+    """Running totals of a user's reviews in one role, kept in step with Review inserts by app.services.ratings"""
+    reviewee_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    role_rated = db.Column(db.String(20), primary_key=True)  # 'provider' or 'customer', as on Review
+    review_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    average = db.Column(db.Float, default=0, nullable=False)
+    stars_1 = db.Column(db.Integer, default=0, nullable=False)
+    stars_2 = db.Column(db.Integer, default=0, nullable=False)
+    stars_3 = db.Column(db.Integer, default=0, nullable=False)
+    stars_4 = db.Column(db.Integer, default=0, nullable=False)
+    stars_5 = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Ranking and min-rating filters: role_rated = ? ORDER BY / WHERE average (ties by review_count)
+    __table_args__ = (
+        db.Index('ix_rating_aggregate_role_average', 'role_rated', 'average', 'review_count'),
+    )
+
+    @property
+    def histogram(self):
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(1, 6)}
+
+    def __repr__(self):
+        return f'<RatingAggregate {self.reviewee_id} {self.role_rated} {self.average:.2f}>'
+
+
+class EscrowHold(db.Model):
+    """Money taken from a client when a job is hired, held until released to the provider or refunded"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=False, unique=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    provider_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount = db.Column(Cents, nullable=False)
+    status = db.Column(db.String(20), default='held', nullable=False)  # held, released, refunded
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    settled_at = db.Column(db.DateTime, nullable=True)
+
+    job = db.relationship('Job', backref=db.backref('escrow_hold', uselist=False))
+
+    # Pending earnings: SUM(amount) WHERE provider_id = ? AND status = 'held', from the index alone
+    __table_args__ = (
+        db.Index('ix_escrow_hold_provider_status_amount', 'provider_id', 'status', 'amount'),
+    )
+
+    def __repr__(self):
+        return f'<EscrowHold job {self.job_id} {self.amount} {self.status}>'
+
+
+class ReconciledBalance(db.Model):
+    """Per-user running sum of Transaction.amount up to the last reconciliation checkpoint"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    opening = db.Column(Cents, default=0, nullable=False)  # Balance not explained by transaction history, accepted as-is
+    transaction_total = db.Column(Cents, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<ReconciledBalance {self.user_id} {self.opening + self.transaction_total}>'
+
+
+class ReconciliationRun(db.Model):
+    """One reconciliation pass; the latest run's last_transaction_id is where the next one resumes"""
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    last_transaction_id = db.Column(db.Integer, default=0, nullable=False)
+    transactions_checked = db.Column(db.Integer, default=0, nullable=False)
+    users_checked = db.Column(db.Integer, default=0, nullable=False)
+    drift_count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<ReconciliationRun {self.id} up to {self.last_transaction_id}>'
+
+
+class BalanceDrift(db.Model):
+    """A wallet balance that disagreed with its transaction history during a run"""
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('reconciliation_run.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    expected = db.Column(Cents, nullable=False)  # Opening + transaction total
+    actual = db.Column(Cents, nullable=False)    # wallet_balance at the checkpoint
+    detected_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    run = db.relationship('ReconciliationRun', backref=db.backref('drifts', lazy=True))
+    user = db.relationship('User', backref=db.backref('balance_drifts', lazy=True))
+
+    @property
+    def difference(self):
+        return self.actual - self.expected
+
+    def __repr__(self):
+        return f'<BalanceDrift user {self.user_id} {self.difference}>'
+
+
+class IdempotencyKey(db.Model):
+    """Outcome of a money-moving request, replayed when the client retries with the same key"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # SHA-256 of the request it was first used with
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, committed, completed
+    response = db.Column(db.Text, nullable=True)  # JSON: status, location, body, flashes
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    # Every retry is answered by this one lookup
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_key'),
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} {self.status}>'
+
+
+class BackgroundTask(db.Model):
+    """Work handed to the background queue (AI vision calls and their follow-ups) and its outcome"""
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    name = db.Column(db.String(50), nullable=False)  # Registered task, e.g. 'vision.analyze'
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON arguments
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    result = db.Column(db.Text, nullable=True)  # JSON, once done
+    error = db.Column(db.Text, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # None for API clients
+    parent_id = db.Column(db.String(32), db.ForeignKey('background_task.id'), nullable=True)  # Task that queued this one
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Workers claim the oldest queued task
+    __table_args__ = (
+        db.Index('ix_background_task_status_created', 'status', 'created_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<BackgroundTask {self.name} {self.status}>'
+
+
 class Opportunity(db.Model):
     """Opportunities like jobs, internships, events that match user goals"""
     id = db.Column(db.Integer, primary_key=True)
@@ -366,6 +655,7 @@ class Opportunity(db.Model):
     category = db.Column(db.String(50), nullable=False)  # Job, Internship, Event, Training
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
+    geohash = db.Column(db.String(12), nullable=True, index=True)  # Maintained by stamp_geohash
     location_name = db.Column(db.String(200), nullable=True)
     company = db.Column(db.String(100), nullable=True)
     requirements = db.Column(db.Text, nullable=True)
@@ -373,6 +663,10 @@ class Opportunity(db.Model):
     expires_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        point_index('ix_opportunity_geom', longitude, latitude),
+    )
+
     def __repr__(self):
         return f'<Opportunity {self.title}>'
 
@@ -385,10 +679,21 @@ class NewsItem(db.Model):
     category = db.Column(db.String(50), nullable=False)  # Crime, Traffic, Weather, Community
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)  # Maintained by stamp_geohash
     location_name = db.Column(db.String(200), nullable=True)
     source = db.Column(db.String(100), nullable=True)
     published_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_breaking = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        point_index('ix_news_item_geom', longitude, latitude),
+    )
+
     def __repr__(self):
         return f'<NewsItem {self.title}>'
+
+
+# Keep the geohash grid cell in sync with lat/lng on every insert and update
+for _geo_model in (Service, CivicIssue, Opportunity, NewsItem):
+    db.event.listen(_geo_model, 'before_insert', stamp_geohash)
+    db.event.listen(_geo_model, 'before_update', stamp_geohash)
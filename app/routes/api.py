@@ -1,9 +1,17 @@
 import base64
 import io
 import os
-from flask import Blueprint, request, jsonify
-from PIL import Image
+import uuid
+from flask import Blueprint, request, jsonify, Response, stream_with_context, abort
+from flask_login import current_user
+from PIL import UnidentifiedImageError
+from app.extensions import db
+from app.models import BackgroundTask
 from app.services.ai_service import get_skhokho_response
+from app.services.response_cache import response_cache
+from app.services.task_queue import queue, accepted, serialize, stream_result
+from app.services.vision_tasks import queue_analysis
+from app.services.image_pipeline import process_upload
 
 api_bp = Blueprint('api', __name__)
 
@@ -50,18 +58,25 @@ def public_api():
         image_data = data.get('image_base64', None) # Expecting Base64 string
         
         # 3. PROCESS IMAGE (If Macalaa sent one) 👁️
-        pil_image = None
+        # Vision calls are slow, so images are queued: poll status_url for the reply
         if image_data:
-            # Decode the base64 string back into an image
+            # Decode the base64 string back into an image, stored downsized and EXIF-free
             image_bytes = base64.b64decode(image_data)
-            pil_image = Image.open(io.BytesIO(image_bytes))
+            try:
+                upload = process_upload(io.BytesIO(image_bytes), f"ask_{uuid.uuid4().hex}")
+            except UnidentifiedImageError:
+                return jsonify({"error": "image_base64 is not an image"}), 400
+            queued = queue_analysis(
+                upload.image_url, message=user_message,
+                context="External App User (Macalaa/Blind Assist)"
+            )
+            return jsonify(accepted(queued)), 202
 
         # 4. ASK SKHOKHO (Reuse your existing brain!) 🧠
         # We pass context="Public API User" since we don't have login info for this
         reply = get_skhokho_response(
             user_message=user_message, 
-            context_data="External App User (Macalaa/Blind Assist)", 
-            image=pil_image
+            context_data="External App User (Macalaa/Blind Assist)"
         )
 
         # 5. RETURN JSON
@@ -73,3 +88,52 @@ def public_api():
     except Exception as e:
         print(f"⚠️ API ERROR: {e}")
         return jsonify({"error": "Skhokho Brain Malfunction"}), 500
+
+
+@api_bp.route('/v1/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the model response cache (this worker's view)"""
+    client_key = request.headers.get('X-API-KEY')
+    internal_secret = os.environ.get('SKHOKHO_CLIENT_SECRET')
+
+    if not client_key or client_key != internal_secret:
+        return jsonify({"error": "Unauthorized Access. Invalid API Key."}), 401
+
+    return jsonify(response_cache.stats())
+
+
+def _visible_task(task_id):
+    """The task if the caller may see it: its owner, or an API client for tasks queued over the API"""
+    background_task = db.session.get(BackgroundTask, task_id) or abort(404)
+    if background_task.user_id is not None:
+        if not current_user.is_authenticated or current_user.id != background_task.user_id:
+            abort(404)
+    else:
+        client_key = request.headers.get('X-API-KEY')
+        if not client_key or client_key != os.environ.get('SKHOKHO_CLIENT_SECRET'):
+            abort(401)
+    return background_task
+
+
+@api_bp.route('/tasks/<task_id>', methods=['GET'])
+def task_status(task_id):
+    """
+    A queued task's status and, once done, its result.
+    Pass ?wait=N (up to 30) to hold the request until it finishes or N seconds pass.
+    """
+    background_task = _visible_task(task_id)
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    if wait > 0 and background_task.status not in ('done', 'failed'):
+        background_task = queue.wait(task_id, wait)
+    return jsonify(serialize(background_task))
+
+
+@api_bp.route('/tasks/<task_id>/stream', methods=['GET'])
+def task_stream(task_id):
+    """Server-Sent Events: keep-alives until the task finishes, then one 'result' event"""
+    _visible_task(task_id)
+    return Response(
+        stream_with_context(stream_result(task_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -3,11 +3,17 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from app.extensions import db
 # ✅ FIX: Import NetworkContact, not Contact
-from app.models import ChatLog, Goal, DiaryEntry, NetworkContact, Service
+from app.models import ChatLog, Goal, DiaryEntry, NetworkContact
 from app.services.ai_service import get_skhokho_response 
+from app.services.intent_parser import parse_intent
+from app.services.nearby_service import nearest_services
+from app.services.search_service import search_services, category_for
 
 chat_bp = Blueprint('chat', __name__)
 
+# How far the chat's find_service command looks for providers (metres)
+SERVICE_SEARCH_RADIUS = 10000
+
 @chat_bp.route('/send', methods=['POST'])
 @login_required
 def send_message():
@@ -19,24 +25,29 @@ def send_message():
     
     user_msg = data['message']
 
-    # 2. Gather Context (The "Memory")
-    active_goals = Goal.query.filter_by(user_id=current_user.id, is_completed=False).limit(3).all()
-    goals_text = ", ".join([g.title for g in active_goals]) if active_goals else "No active goals"
-    
-    contacts = NetworkContact.query.filter_by(user_id=current_user.id).limit(3).all()
-    contacts_text = ", ".join([c.name for c in contacts]) if contacts else "No contacts"
-    
-    # Include wallet and reputation in context
-    context_data = f"""
-    User: {current_user.username}
-    Wallet Balance: R{current_user.wallet_balance}
-    Reputation Points: {current_user.reputation_points}
-    Current Goals: {goals_text}
-    Key Contacts: {contacts_text}
-    """
+    # Plain commands ("split R60 between 4") are run directly, without a model call
+    intent = parse_intent(user_msg)
+    if intent:
+        ai_reply = json.dumps(intent)
+    else:
+        # 2. Gather Context (The "Memory")
+        active_goals = Goal.query.filter_by(user_id=current_user.id, is_completed=False).limit(3).all()
+        goals_text = ", ".join([g.title for g in active_goals]) if active_goals else "No active goals"
+        
+        contacts = NetworkContact.query.filter_by(user_id=current_user.id).limit(3).all()
+        contacts_text = ", ".join([c.name for c in contacts]) if contacts else "No contacts"
+        
+        # Include wallet and reputation in context
+        context_data = f"""
+        User: {current_user.username}
+        Wallet Balance: R{current_user.wallet_balance}
+        Reputation Points: {current_user.reputation_points}
+        Current Goals: {goals_text}
+        Key Contacts: {contacts_text}
+        """
 
-    # 3. Get AI Response
-    ai_reply = get_skhokho_response(user_msg, context_data)
+        # 3. Get AI Response
+        ai_reply = get_skhokho_response(user_msg, context_data)
 
     # 4. Save Conversation
     log = ChatLog(
@@ -81,6 +92,9 @@ def send_message():
                 db.session.add(new_contact)
                 ai_reply = f"✅ Ayt, I saved {new_contact.name} ({new_contact.role}) to your network."
                 
+            elif cmd == 'balance':
+                ai_reply = f"💰 Your wallet balance is R{current_user.wallet_balance}. Reputation: {current_user.reputation_points} points."
+                
             elif cmd == 'set_alert':
                 # For now, just acknowledge - full alert system would need Alert model
                 threshold = cmd_data.get('threshold', 200)
@@ -96,10 +110,15 @@ def send_message():
             elif cmd == 'find_service':
                 # Find service providers integration
                 service_type = cmd_data.get('service_type', '')
-                services = Service.query.filter(
-                    Service.name.ilike(f'%{service_type}%') | 
-                    Service.category.ilike(f'%{service_type}%')
-                ).limit(3).all()
+                services = []
+                # With a GPS fix, return the closest matching providers first
+                if data.get('latitude') and data.get('longitude'):
+                    services = [service for service, _ in nearest_services(
+                        data['latitude'], data['longitude'], k=3,
+                        category=category_for(service_type), radius_meters=SERVICE_SEARCH_RADIUS
+                    )]
+                if not services:
+                    services = search_services(service_type, limit=3)
                 
                 if services:
                     service_list = []
@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from app.extensions import db
 from app.models import CivicIssue
 from app.services.ai_service import analyze_issue
+from app.services.wallet import WalletService
 import hashlib
 from datetime import datetime
 
@@ -23,8 +24,9 @@ def report_issue():
     """The 'CivicNerve' Scenario"""
     title = request.form.get('title')
     description = request.form.get('description')
-    latitude = request.form.get('latitude', -26.2321)
-    longitude = request.form.get('longitude', 27.8816)
+    # The hidden fields arrive empty when the browser had no location fix
+    latitude = request.form.get('latitude') or -26.2321
+    longitude = request.form.get('longitude') or 27.8816
     image = request.files.get('image') # The photo of the issue
     
     # 1. AI GUARDIAN ANALYSIS 🛡️
@@ -35,25 +37,26 @@ def report_issue():
     raw_data = f"{title}{current_user.id}{datetime.utcnow()}"
     digital_seal = hashlib.sha256(raw_data.encode()).hexdigest()
     
-    # 3. GAMIFICATION: REWARD USER
-    if ai_severity_score > 50:
-        current_user.wallet_balance += 50
-        current_user.reputation_points += 10
-        flash('City AI analyzed your report. Severity: High. You earned 50 Credits!', 'success')
-    else:
-        flash('City AI analyzed your report. Severity: Low.', 'info')
-    
-    # 4. SAVE TO DB
+    # 3. SAVE TO DB
     new_issue = CivicIssue(
         title=title,
         description=description,
         reporter_id=current_user.id,
+        category=request.form.get('category') or 'General',
         latitude=float(latitude),
         longitude=float(longitude),
-        ai_severity_score=ai_severity_score,
-        city_status="Reported"
+        ai_risk_score=ai_severity_score,
+        guardian_seal=digital_seal,
+        status="Reported"
     )
     db.session.add(new_issue)
     db.session.commit()
     
+    # 4. GAMIFICATION: REWARD USER (paid through the wallet ledger)
+    if ai_severity_score > 50:
+        WalletService.reward(current_user.id, 50, points=10, reason="High-severity civic report")
+        flash('City AI analyzed your report. Severity: High. You earned 50 Credits!', 'success')
+    else:
+        flash('City AI analyzed your report. Severity: Low.', 'info')
+    
     return redirect(url_for('civic.dashboard'))
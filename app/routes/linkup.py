@@ -1,7 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, current_app
 from flask_login import login_required, current_user
 from app.extensions import db
 from app.models import Service, Job, User, JobChat, NetworkContact, NetworkAlert, CivicIssue
+from app.services.escrow import EscrowService
+from app.services.provider_stats import provider_stats, job_page
+from app.services.job_states import transition, InvalidTransition, IN_PROGRESS, COMPLETED
+from app.services.job_chat import message_page, latest_message_id, serialize, stream_messages, PAGE_SIZE
+from app.services.money import Money
+from app.services.idempotency import idempotent
 from datetime import datetime
 
 linkup_bp = Blueprint('linkup', __name__, url_prefix='/linkup')
@@ -126,7 +132,10 @@ def map_view():
     # Get counts for legend
     services_count = Service.query.filter(Service.latitude.isnot(None), Service.longitude.isnot(None)).count()
     issues_count = CivicIssue.query.filter(CivicIssue.latitude.isnot(None), CivicIssue.longitude.isnot(None)).count()
-    return render_template('linkup/map.html', services_count=services_count, issues_count=issues_count)
+    # ?lite=1 switches pins to binary vector tiles for low-data users
+    vector_tiles = request.args.get('lite') == '1'
+    return render_template('linkup/map.html', services_count=services_count, issues_count=issues_count,
+                           vector_tiles=vector_tiles)
 
 @linkup_bp.route('/join', methods=['POST'])
 @login_required
@@ -138,7 +147,7 @@ def join_economy():
             name=request.form.get('service_name'),
             category=request.form.get('category'),
             description=request.form.get('description'),
-            price=int(request.form.get('price', 50)), # Default 50 credits
+            price=Money.coerce(request.form.get('price', 50)), # Default 50 credits
             latitude=float(request.form.get('location_lat', -26.23)),
             longitude=float(request.form.get('location_lng', 27.85))
         )
@@ -160,80 +169,162 @@ def join_economy():
 @linkup_bp.route('/dashboard')
 @login_required
 def dashboard():
-    """Show user or provider dashboard based on role"""
+    """Show user or provider dashboard based on role (?before=<cursor> pages the job list)"""
+    before = request.args.get('before')
     if current_user.role == 'provider':
         # Provider dashboard data
-        provider_jobs = Job.query.filter_by(provider_id=current_user.id).all()
-        total_earnings = sum(job.price for job in provider_jobs if job.status == 'Completed' and job.is_paid)
-        completed_jobs = len([job for job in provider_jobs if job.status == 'Completed'])
+        provider_jobs, next_cursor = job_page(Job.provider_id, current_user.id, before=before)
+        stats = provider_stats(current_user.id)
         return render_template('linkup/dashboard.html', 
                             provider_jobs=provider_jobs,
-                            total_earnings=total_earnings,
-                            completed_jobs=completed_jobs)
+                            next_cursor=next_cursor,
+                            paged=bool(before),
+                            total_earnings=stats['total_earnings'],
+                            pending_earnings=EscrowService.pending_earnings(current_user.id),
+                            completed_jobs=stats['completed_jobs'],
+                            jobs_by_status=stats['jobs_by_status'],
+                            average_rating=stats['average_rating'],
+                            review_count=stats['review_count'])
     else:
         # User dashboard data
-        client_jobs = Job.query.filter_by(client_id=current_user.id).all()
+        client_jobs, next_cursor = job_page(Job.client_id, current_user.id, before=before)
         recommended_services = Service.query.limit(3).all()
         return render_template('linkup/dashboard.html', 
                             client_jobs=client_jobs,
+                            next_cursor=next_cursor,
+                            paged=bool(before),
                             recommended_services=recommended_services)
 
 # 💰 THE TRANSACTION ROUTE
 @linkup_bp.route('/hire/<int:service_id>', methods=['POST'])
 @login_required
+@idempotent
 def hire_provider(service_id):
     service = Service.query.get_or_404(service_id)
     
-    # 1. Check Funds
-    print(f"Current user: {current_user.username}, Wallet: {current_user.wallet_balance}, Service Price: {service.price}, Current user ID: {current_user.id}")
-    if current_user.wallet_balance < service.price:
-        flash(f"Insufficient Credits. Need {service.price}.", "error")
-        return redirect(url_for('linkup.map_view'))
-    
-    # 2. Deduct & Lock (Escrow)
-    current_user.wallet_balance -= service.price
-    
-    # 3. Create Job
+    # 1. Create Job (flushed so the escrow entry can reference it) and start it
     new_job = Job(
         client_id=current_user.id,
         provider_id=service.provider_id,
         service_id=service.id,
-        status="In_Progress",
+        status="Pending",
         price=service.price,
     )
-    
     db.session.add(new_job)
-    db.session.commit()
+    db.session.flush()
+    transition(new_job, IN_PROGRESS, actor_id=current_user.id, reason="Hired")
+    
+    # 2. Check Funds, Deduct & Lock (Escrow) - commits the job with the hold
+    result = EscrowService.hold(new_job.id, f"Escrow for {service.name}")
+    if not result['success']:
+        flash(f"Insufficient Credits. Need {service.price}.", "error")
+        return redirect(url_for('linkup.map_view'))
     
     flash("Job Started! Credits held in escrow.", "success")
     return redirect(url_for('linkup.view_job', job_id=new_job.id))
 
+@linkup_bp.route('/complete/<int:job_id>', methods=['POST'])
+@login_required
+@idempotent
+def complete_job(job_id):
+    """Client signs off a job, releasing the escrowed payment to the provider"""
+    job = Job.query.get_or_404(job_id)
+    if job.client_id != current_user.id:
+        flash("Only the client can complete this job.", "error")
+        return redirect(url_for('linkup.view_job', job_id=job_id))
+    try:
+        # Committed together with the release, or rolled back with it
+        transition(job, COMPLETED, actor_id=current_user.id)
+    except InvalidTransition:
+        db.session.rollback()
+        flash(f"Job is {job.status}, not in progress.", "error")
+        return redirect(url_for('linkup.view_job', job_id=job_id))
+    result = EscrowService.release(job.id)
+    if not result['success']:
+        flash(f"Could not release payment: {result['message']}", "error")
+        return redirect(url_for('linkup.view_job', job_id=job_id))
+    
+    flash("Job Completed! Payment released to the provider.", "success")
+    return redirect(url_for('linkup.view_job', job_id=job_id))
+
 # 💬 THE CHAT ROUTES
+def _participant_job(job_id):
+    """The job if the current user is its client or provider, else None"""
+    job = Job.query.get_or_404(job_id)
+    return job if current_user.id in [job.client_id, job.provider_id] else None
+
 @linkup_bp.route('/job/<int:job_id>')
 @login_required
 def view_job(job_id):
-    job = Job.query.get_or_404(job_id)
+    job = _participant_job(job_id)
     # Security: Only participants can view
-    if current_user.id not in [job.client_id, job.provider_id]:
+    if job is None:
         flash("Unauthorized access.", "error")
         return redirect(url_for('linkup.map_view'))
-        
-    return render_template('job_chat.html', job=job)
+    
+    # Only the latest page; older ones load from chat_history, newer ones arrive on chat_stream
+    messages, next_cursor = message_page(job.id)
+    return render_template('job_chat.html', job=job, messages=messages, next_cursor=next_cursor)
+
+@linkup_bp.route('/job/<int:job_id>/messages')
+@login_required
+def chat_history(job_id):
+    """A page of chat history as JSON (?before=<next_cursor> for older)"""
+    job = _participant_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    limit = min(request.args.get('limit', PAGE_SIZE, type=int), PAGE_SIZE)
+    messages, next_cursor = message_page(job.id, limit=max(limit, 1), before=request.args.get('before'))
+    return jsonify({'messages': [serialize(m) for m in messages], 'next_cursor': next_cursor})
+
+@linkup_bp.route('/job/<int:job_id>/stream')
+@login_required
+def chat_stream(job_id):
+    """
+    Server-Sent Events feed of new messages for a job.
+    Resumes after the Last-Event-ID header (sent by EventSource on reconnect)
+    or ?after=<message id>; otherwise starts from the newest message.
+    """
+    job = _participant_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    after = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        after_id = int(after)
+    except (TypeError, ValueError):
+        after_id = latest_message_id(job.id)
+    
+    duration = current_app.config.get('CHAT_STREAM_SECONDS', 300)
+    return Response(
+        stream_with_context(stream_messages(job.id, after_id, duration)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @linkup_bp.route('/chat/send', methods=['POST'])
 @login_required
 def send_chat():
-    job_id = request.form.get('job_id')
-    content = request.form.get('message')
+    job_id = request.form.get('job_id', type=int)
+    content = (request.form.get('message') or '').strip()
+    wants_json = request.accept_mimetypes.best == 'application/json'
     
-    if job_id and content:
-        # Create a new chat message
-        chat_message = JobChat(
-            job_id=job_id,
-            sender_id=current_user.id,
-            message=content
-        )
-        db.session.add(chat_message)
-        db.session.commit()
+    job = _participant_job(job_id) if job_id else None
+    if job is None or not content:
+        if wants_json:
+            return jsonify({'error': 'Message not sent'}), 400
+        return redirect(url_for('linkup.view_job', job_id=job_id) if job_id else url_for('linkup.map_view'))
     
-    return redirect(url_for('linkup.view_job', job_id=job_id))
+    # Create a new chat message; open streams pick it up once committed
+    chat_message = JobChat(
+        job_id=job.id,
+        sender_id=current_user.id,
+        message=content
+    )
+    db.session.add(chat_message)
+    db.session.commit()
+    
+    if wants_json:
+        return jsonify(serialize(chat_message)), 201
+    return redirect(url_for('linkup.view_job', job_id=job.id))
@@ -19,10 +19,10 @@ def scan_area():
     findings = scan_surroundings(lat, lng)
     
     # 2. Prepare the context for the AI
+    # Built from the findings only: raw GPS differs on every reading and
+    # would give every scan its own response cache key
     context_text = f"""
     USER LOCATION REPORT:
-    The user is currently standing at Lat: {lat}, Long: {lng}.
-    
     RADAR DETECTED THESE SPOTS NEARBY:
     {findings}
     
@@ -1,11 +1,12 @@
-from flask import Blueprint, request, jsonify, render_template, current_app
+from flask import Blueprint, request, jsonify, render_template
 from flask_login import login_required, current_user
-from app.extensions import db
-from app.models import CivicIssue, Service, Job, User
-from app.services.ai_service import get_skhokho_response
-from PIL import Image
-import os
-from werkzeug.utils import secure_filename
+from app.models import CivicIssue, Job, User
+from app.services.nearby_service import nearest_services
+from app.services.search_service import search_services
+from app.services.task_queue import accepted
+from app.services.vision_tasks import queue_analysis
+from app.services.image_pipeline import process_upload
+from PIL import UnidentifiedImageError
 from datetime import datetime
 
 macalaa_bp = Blueprint('macalaa', __name__)
@@ -25,14 +26,18 @@ def voice_command():
         command = data.get('command', '').lower()
         
         # Voice command routing
-        if 'hire' in command and 'plumber' in command:
-            # Find plumbers nearby
-            plumbers = Service.query.filter_by(category='Plumbing').limit(5).all()
-            if plumbers:
-                response = f"I found {len(plumbers)} plumbers nearby. Opening LinkUp map..."
+        if 'hire' in command:
+            # "hire a sparky", "hire someone to fix my geyser": whatever follows is the search
+            wanted = command.split('hire', 1)[1].strip()
+            providers = search_services(wanted, limit=5) if wanted else []
+            if providers:
+                response = f"I found {len(providers)} {providers[0].category} providers for '{wanted}'. Opening LinkUp map..."
                 action = {'type': 'navigate', 'url': '/linkup/map'}
+            elif wanted:
+                response = f"No '{wanted}' providers found nearby. Try expanding your search area."
+                action = None
             else:
-                response = "No plumbers found nearby. Try expanding your search area."
+                response = "Who would you like to hire? Try 'hire a plumber'."
                 action = None
                 
         elif 'balance' in command or 'money' in command:
@@ -66,7 +71,10 @@ def voice_command():
 @macalaa_bp.route('/api/macalaa/scan-environment', methods=['POST'])
 @login_required
 def scan_environment():
-    """Environment scanning with AI vision - Describes surroundings and detects dangers"""
+    """
+    Environment scanning with AI vision - Describes surroundings and detects dangers.
+    Returns 202 with a task id; the narration arrives at its status_url / stream_url.
+    """
     try:
         if 'image' not in request.files:
             return jsonify({'error': 'No image provided'}), 400
@@ -75,51 +83,20 @@ def scan_environment():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save image temporarily
-        filename = secure_filename(f"scan_{current_user.id}_{int(datetime.now().timestamp())}.jpg")
-        upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-        
-        # Analyze with AI Vision
-        image = Image.open(filepath)
-        analysis = get_skhokho_response("", "", image=image)
-        
-        # Check for danger keywords
-        is_danger = any(keyword in analysis.upper() for keyword in ['DANGER', 'HAZARD', 'WARNING', 'UNSAFE', 'FIRE', 'MANHOLE'])
-        
-        response_data = {
-            'narration': analysis,
-            'is_danger': is_danger,
-            'image_url': f"/static/uploads/{filename}"
-        }
-        
-        # If danger detected, auto-trigger CivicNerve report
-        if is_danger:
-            # Extract location from request if provided
-            latitude = request.form.get('latitude', -26.2309)
-            longitude = request.form.get('longitude', 27.8596)
-            
-            # Auto-create civic issue
-            civic_issue = CivicIssue(
-                title="⚠️ DANGER DETECTED by Macalaa",
-                description=f"Automatic danger detection:\n\n{analysis}",
-                latitude=float(latitude),
-                longitude=float(longitude),
-                ai_severity_score=95,  # High severity for dangers
-                city_status='Reported',
-                image_url=f"/static/uploads/{filename}",
-                reporter_id=current_user.id
-            )
-            db.session.add(civic_issue)
-            db.session.commit()
-            
-            response_data['auto_reported'] = True
-            response_data['civic_issue_id'] = civic_issue.id
-            response_data['urgent_warning'] = "⚠️ DANGER DETECTED! Civic report auto-generated. Nearby users alerted."
+        # Save a downsized, EXIF-free copy; that is what gets analysed and served
+        try:
+            upload = process_upload(file.stream, f"scan_{current_user.id}_{int(datetime.now().timestamp())}")
+        except UnidentifiedImageError:
+            return jsonify({'error': 'That file is not an image'}), 400
         
-        return jsonify(response_data)
+        # Analyze with AI Vision in the background; a danger sighting queues the CivicNerve report
+        queued = queue_analysis(
+            upload.image_url, user_id=current_user.id, detect_danger=True,
+            latitude=request.form.get('latitude', type=float),
+            longitude=request.form.get('longitude', type=float)
+        )
+        
+        return jsonify(accepted(queued, image_url=upload.image_url, thumbnail_url=upload.thumbnail_url)), 202
         
     except Exception as e:
         print(f"⚠️ Environment Scan Error: {e}")
@@ -137,11 +114,8 @@ def navigate_assist():
         if not latitude or not longitude:
             return jsonify({'error': 'Location required'}), 400
         
-        # Find nearby landmarks (services and civic issues)
-        nearby_services = Service.query.filter(
-            Service.latitude.between(latitude - 0.01, latitude + 0.01),
-            Service.longitude.between(longitude - 0.01, longitude + 0.01)
-        ).limit(3).all()
+        # Find nearby landmarks (closest services and civic issues)
+        nearby_services = [service for service, _ in nearest_services(latitude, longitude, k=3)]
         
         nearby_issues = CivicIssue.query.filter(
             CivicIssue.latitude.between(latitude - 0.01, latitude + 0.01),
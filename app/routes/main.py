@@ -1,12 +1,24 @@
-from flask import Blueprint, render_template, redirect, url_for, jsonify, request, flash
+from flask import Blueprint, render_template, redirect, url_for, jsonify, request, flash, send_file, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime
-from app.models import Service, CivicIssue, Goal, Transaction
+from app.extensions import db
+from app.models import Service, CivicIssue, Goal, Transaction, RatingAggregate
+from app.services.wallet import WalletService, transaction_page, iter_statement
+from app.services.money import Money
+from app.services.idempotency import idempotent
+from app.services.geo_service import parse_bbox, viewport_filter
+from app.services.nearby_service import nearest_services
 from app.services.ai_service import get_skhokho_response
-from app.services.wallet import WalletService
-from PIL import Image
-import os
-from werkzeug.utils import secure_filename
+from app.services.cluster_service import get_tile_clusters, MAX_ZOOM as CLUSTER_MAX_ZOOM
+from app.services.sync_service import changed_since, deleted_since, make_cursor, parse_cursor
+from app.services.tile_service import get_tile_path, MVT_MIMETYPE, MAX_ZOOM as TILE_MAX_ZOOM
+from app.services.task_queue import accepted
+from app.services.vision_tasks import queue_analysis
+from app.services.image_pipeline import process_upload
+from PIL import UnidentifiedImageError
+import csv
+import io
+import json
 
 main_bp = Blueprint('main', __name__)
 
@@ -19,37 +31,104 @@ def index():
 @main_bp.route('/api/map-data')
 @login_required
 def map_data():
-    # Get all services with valid lat/lng
-    services = []
-    all_services = Service.query.all()
-    for service in all_services:
-        if service.latitude and service.longitude:
-            services.append({
-                'id': service.id,
-                'lat': service.latitude,
-                'lng': service.longitude,
-                'title': service.name,
-                'type': 'service',
-                'category': service.category,
-                'price': service.price
-            })
+    """
+    Services and civic issues for the LinkUp map.
+
+    Pass ?bbox=west,south,east,north&zoom=N (Leaflet's getBounds().toBBoxString())
+    to only receive the points inside the visible viewport.
+
+    Pass ?since=<cursor> (the 'cursor' from a previous response) to only receive
+    rows created or updated since then, plus the ids deleted in 'deleted'. Deltas
+    ignore the bbox so pins that moved out of view are still updated. 'full' is
+    true when the whole (bbox-filtered) dataset was sent instead of a delta.
+
+    Pass ?min_rating=N to only receive services whose provider averages at
+    least N stars; each service carries its provider's 'rating' and 'reviews'.
+    In a delta, changed services that fall below N are listed in 'deleted'.
+    """
+    now = datetime.utcnow()
+    bbox = parse_bbox(request.args.get('bbox'))
+    zoom = request.args.get('zoom', type=int)
+    min_rating = request.args.get('min_rating', type=float)
+    changed_after = changed_since(parse_cursor(request.args.get('since')), now)
+    dialect = db.engine.dialect.name
+
+    service_query = Service.query.filter(Service.latitude.isnot(None), Service.longitude.isnot(None))
+    issue_query = CivicIssue.query.filter(CivicIssue.latitude.isnot(None), CivicIssue.longitude.isnot(None))
+    if changed_after:
+        service_query = service_query.filter(Service.updated_at > changed_after)
+        issue_query = issue_query.filter(CivicIssue.updated_at > changed_after)
+    elif bbox:
+        service_query = service_query.filter(viewport_filter(Service, bbox, zoom, dialect))
+        issue_query = issue_query.filter(viewport_filter(CivicIssue, bbox, zoom, dialect))
+
+    # Provider ratings come from the one-row-per-provider aggregate, not Review
+    service_query = service_query.outerjoin(RatingAggregate, db.and_(
+        RatingAggregate.reviewee_id == Service.provider_id, RatingAggregate.role_rated == 'provider'
+    )).add_columns(RatingAggregate.average, RatingAggregate.review_count)
+    if min_rating and not changed_after:
+        service_query = service_query.filter(RatingAggregate.average >= min_rating)
+
+    rows = service_query.all()
+    dropped = []
+    if min_rating and changed_after:
+        below = {service.id for service, average, _ in rows if average is None or average < min_rating}
+        rows = [row for row in rows if row[0].id not in below]
+        dropped = sorted(below)
+
+    services = [{
+        'id': service.id,
+        'lat': service.latitude,
+        'lng': service.longitude,
+        'title': service.name,
+        'type': 'service',
+        'category': service.category,
+        'price': float(service.price),
+        'rating': round(average, 1) if average is not None else None,
+        'reviews': review_count or 0
+    } for service, average, review_count in rows]
+
+    issues = [{
+        'id': issue.id,
+        'lat': issue.latitude,
+        'lng': issue.longitude,
+        'title': issue.title,
+        'type': 'issue',
+        'severity': issue.ai_risk_score,
+        'status': issue.status
+    } for issue in issue_query.all()]
     
-    # Get all civic issues with valid lat/lng
-    issues = []
-    all_issues = CivicIssue.query.all()
-    for issue in all_issues:
-        if issue.latitude and issue.longitude:
-            issues.append({
-                'id': issue.id,
-                'lat': issue.latitude,
-                'lng': issue.longitude,
-                'title': issue.title,
-                'type': 'issue',
-                'severity': issue.ai_severity_score,
-                'status': issue.city_status
-            })
+    deleted = {'services': [], 'issues': []}
+    if changed_after:
+        deleted = deleted_since(changed_after)
+        # Changed pins now under the rating filter are dropped like deleted ones
+        deleted['services'].extend(dropped)
+
+    return jsonify({
+        'services': services,
+        'issues': issues,
+        'deleted': deleted,
+        'cursor': make_cursor(now),
+        'full': changed_after is None
+    })
+
+@main_bp.route('/api/map-clusters/<int:z>/<int:x>/<int:y>')
+@login_required
+def map_clusters(z, x, y):
+    """Pre-aggregated service/issue clusters for one slippy-map tile"""
+    if z > CLUSTER_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({'error': 'Tile out of range'}), 404
     
-    return jsonify({'services': services, 'issues': issues})
+    return jsonify({'z': z, 'x': x, 'y': y, 'clusters': get_tile_clusters(z, x, y)})
+
+@main_bp.route('/tiles/<int:z>/<int:x>/<int:y>.mvt')
+@login_required
+def vector_tile(z, x, y):
+    """Binary Mapbox Vector Tile with 'services' and 'issues' point layers"""
+    if z > TILE_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({'error': 'Tile out of range'}), 404
+    
+    return send_file(get_tile_path(z, x, y), mimetype=MVT_MIMETYPE, max_age=60)
 
 @main_bp.route('/home')
 @login_required
@@ -101,19 +180,28 @@ def scan_location():
         if not latitude or not longitude:
             return jsonify({'error': 'Location required'}), 400
         
-        # Find nearby services (within ~1km)
-        nearby_services = Service.query.filter(
-            Service.latitude.between(latitude - 0.01, latitude + 0.01),
-            Service.longitude.between(longitude - 0.01, longitude + 0.01)
-        ).limit(5).all()
+        # Find the closest services (within 1km)
+        nearby_services = nearest_services(latitude, longitude, k=5)
         
         findings = []
-        for service in nearby_services:
-            findings.append(f"📍 FOUND: {service.name} ({service.category}) - R{service.price}")
+        for service, distance in nearby_services:
+            findings.append(f"📍 FOUND: {service.name} ({service.category}) - R{service.price} ({distance:.0f}m away)")
         
-        advice = "Sharp! I found some opportunities nearby. Check LinkUp for more details."
-        if not findings:
-            advice = "No services detected in this area. Try expanding your search radius."
+        advice = "No services detected in this area. Try expanding your search radius."
+        if findings:
+            # Names and categories only: distances change with every GPS reading
+            # and would give every scan its own response cache key
+            spots = "\n".join(sorted({f"- {service.name} ({service.category})" for service, _ in nearby_services}))
+            advice = get_skhokho_response(
+                user_message="What should I do here?",
+                context_data=f"""
+    RADAR DETECTED THESE SERVICES NEARBY:
+    {spots}
+
+    INSTRUCTION:
+    Based on what is nearby, give the user specific advice on the opportunities around them.
+    """
+            )
         
         return jsonify({
             'findings': findings,
@@ -134,7 +222,7 @@ def contact():
 @main_bp.route('/analyze/image', methods=['POST'])
 @login_required
 def analyze_image():
-    """Analyze uploaded image with AI vision"""
+    """Analyze uploaded image with AI vision (202 with a task id to poll for the analysis)"""
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -143,22 +231,16 @@ def analyze_image():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save image temporarily
-        from flask import current_app
-        filename = secure_filename(f"analysis_{current_user.id}_{int(datetime.now().timestamp())}.jpg")
-        upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
+        # Save a downsized, EXIF-free copy; that is what gets analysed and served
+        try:
+            upload = process_upload(file.stream, f"analysis_{current_user.id}_{int(datetime.now().timestamp())}")
+        except UnidentifiedImageError:
+            return jsonify({'error': 'That file is not an image'}), 400
         
-        # Analyze with AI
-        image = Image.open(filepath)
-        analysis = get_skhokho_response("", "", image=image)
+        # Analyze with AI in the background; the answer arrives at the task's status_url
+        queued = queue_analysis(upload.image_url, user_id=current_user.id)
         
-        return jsonify({
-            'analysis': analysis,
-            'image_url': f"/static/uploads/{filename}"
-        })
+        return jsonify(accepted(queued, image_url=upload.image_url, thumbnail_url=upload.thumbnail_url)), 202
         
     except Exception as e:
         print(f"⚠️ Analysis Error: {e}")
@@ -173,32 +255,81 @@ def about():
 @main_bp.route('/wallet')
 @login_required
 def wallet():
-    """Wallet page with transactions and conversion functionality"""
-    # Get transaction history
-    transactions = Transaction.query.filter_by(user_id=current_user.id)\
-        .order_by(Transaction.timestamp.desc())\
-        .limit(10)\
-        .all()
+    """Wallet page with transactions and conversion functionality (?before=<cursor> for older pages)"""
+    before = request.args.get('before')
+    transactions, next_cursor = transaction_page(current_user.id, limit=10, before=before)
     
     # Get last transaction date
-    last_transaction = None
-    if transactions:
-        last_transaction = transactions[0].timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    if transactions and not before:
+        latest = transactions[0].timestamp
+    else:
+        latest = db.session.query(db.func.max(Transaction.timestamp))\
+            .filter(Transaction.user_id == current_user.id).scalar()
+    last_transaction = latest.strftime('%Y-%m-%d %H:%M:%S') if latest else None
     
     return render_template(
         'wallet.html',
         wallet_balance=current_user.wallet_balance,
         reputation_points=current_user.reputation_points,
         transactions=transactions,
+        next_cursor=next_cursor,
+        paged=bool(before),
         last_transaction=last_transaction
     )
 
+@main_bp.route('/wallet/statement.<fmt>')
+@login_required
+def wallet_statement(fmt):
+    """
+    Full transaction statement as a CSV or JSON download, oldest first.
+    Rows are streamed from a server-side cursor, so the statement is never
+    built in memory.
+    """
+    if fmt not in ('csv', 'json'):
+        abort(404)
+    user_id = current_user.id
+    rows = iter_statement(user_id)
+
+    def as_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['id', 'timestamp', 'type', 'description', 'amount'])
+        for count, row in enumerate(rows, 1):
+            writer.writerow([row.id, row.timestamp.isoformat() if row.timestamp else '', row.transaction_type, row.description or '', str(row.amount)])
+            if count % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def as_json():
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps({
+                'id': row.id,
+                'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+                'type': row.transaction_type,
+                'description': row.description,
+                'amount': str(row.amount)
+            })
+            separator = ','
+        yield ']'
+
+    filename = f"skhokho-statement-{datetime.utcnow():%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(as_csv() if fmt == 'csv' else as_json()),
+        mimetype='text/csv' if fmt == 'csv' else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @main_bp.route('/deposit', methods=['POST'])
 @login_required
+@idempotent
 def deposit():
     """Deposit money into user's wallet"""
     try:
-        amount = float(request.form.get('amount', 0))
+        amount = Money.coerce(request.form.get('amount', 0))
         result = WalletService.deposit(current_user.id, amount, "Manual deposit")
         if result['success']:
             flash(result['message'], 'success')
@@ -210,10 +341,11 @@ def deposit():
 
 @main_bp.route('/withdraw', methods=['POST'])
 @login_required
+@idempotent
 def withdraw():
     """Withdraw money from user's wallet"""
     try:
-        amount = float(request.form.get('amount', 0))
+        amount = Money.coerce(request.form.get('amount', 0))
         result = WalletService.withdraw(current_user.id, amount, "Manual withdrawal")
         if result['success']:
             flash(result['message'], 'success')
@@ -243,7 +375,7 @@ def convert_points_to_money():
 def convert_money_to_points():
     """Convert money to reputation points"""
     try:
-        amount = float(request.form.get('amount', 0))
+        amount = Money.coerce(request.form.get('amount', 0))
         result = WalletService.convert_money_to_points(current_user.id, amount)
         if result['success']:
             flash(result['message'], 'success')
@@ -1,7 +1,104 @@
 import os
+import base64
+import io
+import threading
 import google.generativeai as genai
+import requests
 from PIL import Image
 import json
+from app.services.response_cache import response_cache, cache_key
+
+MODEL_NAME = os.environ.get('GEMINI_MODEL', 'gemini-flash-latest')
+
+
+class GeminiBackend:
+    """Google Gemini, configured once with one GenerativeModel kept per model name"""
+
+    def __init__(self, api_key):
+        genai.configure(api_key=api_key)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, name=MODEL_NAME):
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = genai.GenerativeModel(name)
+            return self._models[name]
+
+    def generate(self, parts, model=MODEL_NAME):
+        return self.model(model).generate_content(parts).text
+
+    def list_models(self):
+        return [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+
+
+class HTTPBackend:
+    """
+    Any server that answers POST {url}/generate with {"text": ...}, e.g. a
+    local fake model for load tests. Requests share one keep-alive session.
+    """
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def generate(self, parts, model=MODEL_NAME):
+        parts = parts if isinstance(parts, list) else [parts]
+        payload = {'model': model, 'prompt': '', 'images': []}
+        for part in parts:
+            if isinstance(part, Image.Image):
+                buffer = io.BytesIO()
+                part.convert('RGB').save(buffer, format='JPEG')
+                payload['images'].append(base64.b64encode(buffer.getvalue()).decode('ascii'))
+            else:
+                payload['prompt'] += str(part)
+        response = self._session.post(f'{self.url}/generate', json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['text']
+
+    def list_models(self):
+        return [MODEL_NAME]
+
+
+class ModelRegistry:
+    """
+    The process's model backend, built on first use and shared by every request.
+
+    SKHOKHO_AI_URL points it at an HTTPBackend instead of Gemini; tests can
+    install any object with generate(parts, model) via set_backend().
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    def backend(self):
+        """The shared backend, or None when no model is configured"""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._configured_backend()
+        return self._backend
+
+    def set_backend(self, backend):
+        with self._lock:
+            self._backend = backend
+
+    def reset(self):
+        """Forget the backend so the next call rebuilds it from the environment"""
+        self.set_backend(None)
+
+    @staticmethod
+    def _configured_backend():
+        url = os.environ.get('SKHOKHO_AI_URL')
+        if url:
+            return HTTPBackend(url)
+        api_key = os.environ.get('GOOGLE_API_KEY')
+        return GeminiBackend(api_key) if api_key else None
+
+
+registry = ModelRegistry()
 
 def analyze_issue(description):
     """Mock AI for CivicNerve demo - analyzes issue severity"""
@@ -14,17 +111,12 @@ def analyze_issue(description):
 
 def get_skhokho_response(user_message, context_data="", image=None):
     """Enhanced Skhokho chatbot with write access to database"""
-    api_key = os.environ.get("GOOGLE_API_KEY")
+    backend = registry.backend()
     
-    if not api_key:
+    if backend is None:
         return "System Alert: Neural Link Disconnected (Key Missing)."
 
     try:
-        genai.configure(api_key=api_key)
-        
-        # USE THE MODERN FLASH MODEL (Handles Text & Images)
-        model = genai.GenerativeModel('gemini-flash-latest')
-
         # SCENARIO A: VISION 👁️ (For Macalaa Environment Scanning)
         if image:
             print("👁️ ACTIVATING SKHOKHO VISION (Gemini 1.5 Flash)...", flush=True)
@@ -35,13 +127,16 @@ def get_skhokho_response(user_message, context_data="", image=None):
             4. If there's danger (open manhole, fire, hazard), start with "DANGER:" and describe urgently
             
             Keep response brief but informative. Use local South African context."""
-            response = model.generate_content([prompt, image])
-            return response.text
+            return backend.generate([prompt, image])
 
         else:
             # SCENARIO B: TEXT CHAT WITH DATABASE WRITE ACCESS
-            model = genai.GenerativeModel('gemini-flash-latest')
-            
+            # The same question with the same context gets the same answer
+            key = cache_key(user_message, context_data, MODEL_NAME)
+            cached = response_cache.get(key)
+            if cached is not None:
+                return cached
+
             system_instruction = """
             You are Skhokho, a wise street-smart AI assistant in Soweto, South Africa.
             You have WRITE ACCESS to the user's personal database.
@@ -70,17 +165,18 @@ def get_skhokho_response(user_message, context_data="", image=None):
             
             full_prompt = f"{system_instruction}\n\nCONTEXT:\n{context_data}\n\nUSER:\n{user_message}"
             
-            response = model.generate_content(full_prompt)
-            return response.text.replace("```json", "").replace("```", "").strip()
+            response = backend.generate(full_prompt)
+            reply = response.replace("```json", "").replace("```", "").strip()
+            response_cache.set(key, reply)
+            return reply
     except Exception as e:
         print(f"⚠️ BRAIN FAILURE: {e}", flush=True)
         
         # DEBUG: If it fails, print what models ARE available
         try:
             print("📋 AVAILABLE MODELS:", flush=True)
-            for m in genai.list_models():
-                if 'generateContent' in m.supported_generation_methods:
-                    print(f" - {m.name}", flush=True)
+            for name in backend.list_models():
+                print(f" - {name}", flush=True)
         except:
             pass
             
@@ -88,13 +184,10 @@ def get_skhokho_response(user_message, context_data="", image=None):
     
 
 def get_hustle_plan(goal):
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key: return None
+    backend = registry.backend()
+    if backend is None: return None
 
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-flash-latest') # Use the fast one!
-        
         # PROMPT ENGINEERING: Force JSON Output
         prompt = f"""
         You are a business mentor in Soweto.
@@ -111,10 +204,10 @@ def get_hustle_plan(goal):
         }}
         """
         
-        response = model.generate_content(prompt)
+        response = backend.generate(prompt)
         
         # Clean the response (sometimes AI adds ```json ... ```)
-        clean_json = response.text.replace("```json", "").replace("```", "").strip()
+        clean_json = response.replace("```json", "").replace("```", "").strip()
         
         return json.loads(clean_json) # Return as Python Dictionary
         
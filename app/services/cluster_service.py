@@ -0,0 +1,171 @@
+"""
+Cluster Service
+Server-side marker clustering for the LinkUp map, aggregated in SQL per map tile
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import func, cast, null, Integer
+
+from app.extensions import db
+from app.models import Service, CivicIssue
+from app.services.geo_service import tile_bounds, tile_for, viewport_filter
+
+# Each tile is split into GRID x GRID cells; every non-empty cell becomes one cluster
+GRID = 8
+
+# Highest zoom served (and cached) by the cluster endpoint
+MAX_ZOOM = 18
+
+# Cached tiles expire after this many seconds so other workers' writes show up
+TILE_TTL = 60
+MAX_CACHED_TILES = 4096
+
+
+class TileCache:
+    """Thread-safe LRU of computed tiles with TTL, invalidated by the points inside them"""
+
+    def __init__(self, ttl=TILE_TTL, max_entries=MAX_CACHED_TILES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_point(self, lat, lng):
+        """Drop every cached tile, at every zoom, that contains this point"""
+        with self._lock:
+            for z in range(MAX_ZOOM + 1):
+                x, y = tile_for(lat, lng, z)
+                self._entries.pop((z, x, y), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cluster_cache = TileCache()
+
+
+def _cell_index(expr, dialect):
+    # CAST truncates on SQLite but rounds on PostgreSQL, so floor explicitly there
+    if dialect == 'postgresql':
+        return cast(func.floor(expr), Integer)
+    return cast(expr, Integer)
+
+
+def _aggregate(model, bounds, z, severity_column, dialect):
+    """Per-cell, per-category counts, coordinate sums and max severity for one table"""
+    south, west, north, east = bounds
+    cell_w = (east - west) / GRID
+    cell_h = (north - south) / GRID
+    cx = _cell_index((model.longitude - west) / cell_w, dialect)
+    cy = _cell_index((north - model.latitude) / cell_h, dialect)
+    severity = func.max(severity_column) if severity_column is not None else null()
+
+    return db.session.query(
+        cx, cy, model.category,
+        func.count(model.id),
+        func.sum(model.latitude),
+        func.sum(model.longitude),
+        severity
+    ).filter(
+        viewport_filter(model, bounds, z, dialect),
+        # Half-open on the shared edges so a point is never counted in two tiles
+        model.longitude < east,
+        model.latitude > south
+    ).group_by(cx, cy, model.category).all()
+
+
+def compute_clusters(z, x, y):
+    """Aggregate services and civic issues in one tile into at most GRID*GRID clusters"""
+    bounds = tile_bounds(z, x, y)
+    dialect = db.engine.dialect.name
+    cells = {}
+
+    layers = (
+        ('services', Service, None),
+        ('issues', CivicIssue, CivicIssue.ai_risk_score),
+    )
+    for layer, model, severity_column in layers:
+        for cx, cy, category, count, lat_sum, lng_sum, max_severity in _aggregate(
+            model, bounds, z, severity_column, dialect
+        ):
+            key = (min(cx, GRID - 1), min(cy, GRID - 1))
+            cell = cells.setdefault(key, {
+                'count': 0, 'services': 0, 'issues': 0,
+                'lat_sum': 0.0, 'lng_sum': 0.0,
+                'max_severity': None, 'categories': {}
+            })
+            cell['count'] += count
+            cell[layer] += count
+            cell['lat_sum'] += lat_sum
+            cell['lng_sum'] += lng_sum
+            cell['categories'][category] = cell['categories'].get(category, 0) + count
+            if max_severity is not None:
+                cell['max_severity'] = max(cell['max_severity'] or 0, max_severity)
+
+    return [{
+        'lat': cell['lat_sum'] / cell['count'],
+        'lng': cell['lng_sum'] / cell['count'],
+        'count': cell['count'],
+        'services': cell['services'],
+        'issues': cell['issues'],
+        'max_severity': cell['max_severity'],
+        'categories': cell['categories']
+    } for cell in cells.values()]
+
+
+def get_tile_clusters(z, x, y):
+    """Cached clusters for one tile"""
+    key = (z, x, y)
+    clusters = cluster_cache.get(key)
+    if clusters is None:
+        clusters = compute_clusters(z, x, y)
+        cluster_cache.set(key, clusters)
+    return clusters
+
+
+def _on_point_written(mapper, connection, target):
+    # Moving a point stales the tiles it left as well as the ones it entered
+    state = db.inspect(target)
+    old_lat = state.attrs.latitude.history.deleted
+    old_lng = state.attrs.longitude.history.deleted
+    if old_lat or old_lng:
+        cluster_cache.invalidate_point(
+            old_lat[0] if old_lat else target.latitude,
+            old_lng[0] if old_lng else target.longitude
+        )
+    if target.latitude is not None and target.longitude is not None:
+        cluster_cache.invalidate_point(target.latitude, target.longitude)
+
+
+def _on_table_recreated(target, connection, **kw):
+    cluster_cache.clear()
+
+
+for _model in (Service, CivicIssue):
+    db.event.listen(_model, 'after_insert', _on_point_written)
+    db.event.listen(_model, 'after_update', _on_point_written)
+    db.event.listen(_model, 'after_delete', _on_point_written)
+    db.event.listen(_model.__table__, 'after_create', _on_table_recreated)
+    db.event.listen(_model.__table__, 'after_drop', _on_table_recreated)
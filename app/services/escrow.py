@@ -0,0 +1,273 @@
+"""
+Escrow Service
+Holds a client's payment for a job until it is released to the provider or refunded
+"""
+from datetime import datetime
+
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models import Job, Transaction, EscrowHold
+from app.services import ledger
+from app.services.job_states import bulk_transition, COMPLETED, PAID
+from app.services.money import Money
+from app.services.wallet import _apply_delta, _apply_credits, _insufficient_funds
+
+
+# A hold leaves 'held' exactly once: release and refund both flip it with a
+# guarded UPDATE ... WHERE status = 'held', so two concurrent settlements of
+# the same job can't both pay out.
+
+def _settle(job_id: int, status: str, now: datetime):
+    """Mark a job's hold settled; returns (client_id, provider_id, amount) or None if nothing is held"""
+    return db.session.execute(
+        update(EscrowHold)
+        .where(EscrowHold.job_id == job_id, EscrowHold.status == 'held')
+        .values(status=status, settled_at=now)
+        .returning(EscrowHold.client_id, EscrowHold.provider_id, EscrowHold.amount)
+    ).one_or_none()
+
+
+# Per settled status: who is paid, the history row they get, and the ledger entry type
+_BATCH_SETTLEMENTS = {
+    'released': ('provider_id', 'client_id', "Earning", "Release", "Payment released for job #{}", "Released"),
+    'refunded': ('client_id', 'provider_id', "Refund", "Refund", "Escrow refund for job #{}", "Refunded"),
+}
+
+
+def _settle_batch(job_status: str, hold_status: str) -> dict:
+    """Settle every held payment whose job is in `job_status`, in one transaction"""
+    payee, other, transaction_type, entry_type, description, verb = _BATCH_SETTLEMENTS[hold_status]
+    now = datetime.utcnow()
+    try:
+        holds = db.session.execute(
+            select(EscrowHold.id, EscrowHold.job_id, EscrowHold.client_id,
+                   EscrowHold.provider_id, EscrowHold.amount)
+            .join(Job, Job.id == EscrowHold.job_id)
+            .where(EscrowHold.status == 'held', Job.status == job_status)
+            .order_by(EscrowHold.id)
+            .with_for_update(of=EscrowHold)
+        ).all()
+        if not holds:
+            db.session.rollback()
+            return {"success": True, "message": f"Nothing to settle for {job_status} jobs", "count": 0, "total": Money(0)}
+
+        settled = db.session.execute(
+            update(EscrowHold)
+            .where(EscrowHold.id.in_([hold.id for hold in holds]), EscrowHold.status == 'held')
+            .values(status=hold_status, settled_at=now)
+        ).rowcount
+        if settled != len(holds):
+            # Another worker settled some of these first; let the next run pick up the rest
+            db.session.rollback()
+            return {"success": False, "message": "Holds changed during settlement, try again"}
+
+        credits = {}
+        for hold in holds:
+            payee_id = getattr(hold, payee)
+            credits[payee_id] = credits.get(payee_id, Money(0)) + hold.amount
+        _apply_credits(credits)
+
+        db.session.execute(insert(Transaction), [{
+            'user_id': getattr(hold, payee), 'amount': hold.amount, 'transaction_type': transaction_type,
+            'description': description.format(hold.job_id), 'related_user_id': getattr(hold, other)
+        } for hold in holds])
+        for hold in holds:
+            ledger.record(entry_type, [
+                (ledger.ESCROW, -hold.amount),
+                (ledger.wallet_account(getattr(hold, payee)), hold.amount)
+            ], description.format(hold.job_id), job_id=hold.job_id)
+        if hold_status == 'released':
+            paid = bulk_transition(COMPLETED, PAID, Job.id.in_([hold.job_id for hold in holds]), now=now)
+            if len(paid) != len(holds):
+                # A job was disputed after its hold was read; leave the whole batch for the next run
+                db.session.rollback()
+                return {"success": False, "message": "Jobs changed during settlement, try again"}
+        db.session.commit()
+
+        total = sum((hold.amount for hold in holds), Money(0))
+        return {
+            "success": True,
+            "message": f"{verb} R{total:.2f} across {len(holds)} jobs",
+            "count": len(holds),
+            "total": total
+        }
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return {"success": False, "message": f"Database error: {str(e)}"}
+
+
+class EscrowService:
+    """Service for holding and settling job payments"""
+
+    @staticmethod
+    def hold(job_id: int, description: str = "Escrow hold") -> dict:
+        """
+        Move a job's price from the client's wallet into escrow
+
+        The job row may still be pending in the session; it is committed
+        together with the hold, or rolled back with it if funds are short.
+
+        Args:
+            job_id: The (flushed) job the money is held for
+            description: Optional description of the hold
+
+        Returns:
+            dict with success status and message
+        """
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return {"success": False, "message": "Job not found"}
+        amount = Money.coerce(job.price)
+        if amount <= 0:
+            return {"success": False, "message": "Amount must be positive"}
+
+        try:
+            new_balance = _apply_delta(job.client_id, -amount)
+            if new_balance is None:
+                db.session.rollback()
+                return _insufficient_funds(job.client_id)
+
+            db.session.add(EscrowHold(
+                job_id=job.id,
+                client_id=job.client_id,
+                provider_id=job.provider_id,
+                amount=amount
+            ))
+            db.session.add(Transaction(
+                user_id=job.client_id,
+                amount=-amount,
+                transaction_type="Escrow",
+                description=description,
+                related_user_id=job.provider_id
+            ))
+            ledger.record("Escrow", [
+                (ledger.wallet_account(job.client_id), -amount),
+                (ledger.ESCROW, amount)
+            ], description, job_id=job.id)
+            db.session.commit()
+
+            return {
+                "success": True,
+                "message": f"Holding R{amount:.2f} in escrow",
+                "new_balance": new_balance
+            }
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"success": False, "message": f"Database error: {str(e)}"}
+
+    @staticmethod
+    def release(job_id: int) -> dict:
+        """
+        Pay a Completed job's held money to its provider and move the job to Paid
+
+        Args:
+            job_id: The job to release
+
+        Returns:
+            dict with success status and message
+        """
+        now = datetime.utcnow()
+        try:
+            held = _settle(job_id, 'released', now)
+            if held is None:
+                db.session.rollback()
+                return {"success": False, "message": "No funds held for this job"}
+            client_id, provider_id, amount = held
+
+            if _apply_delta(provider_id, amount) is None:
+                db.session.rollback()
+                return {"success": False, "message": "Provider not found"}
+
+            db.session.add(Transaction(
+                user_id=provider_id,
+                amount=amount,
+                transaction_type="Earning",
+                description=f"Payment released for job #{job_id}",
+                related_user_id=client_id
+            ))
+            ledger.record("Release", [
+                (ledger.ESCROW, -amount),
+                (ledger.wallet_account(provider_id), amount)
+            ], f"Payment released for job #{job_id}", job_id=job_id)
+            if not bulk_transition(COMPLETED, PAID, Job.id == job_id, now=now):
+                db.session.rollback()
+                return {"success": False, "message": "Job is not completed"}
+            db.session.commit()
+
+            return {"success": True, "message": f"Released R{amount:.2f} to the provider"}
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"success": False, "message": f"Database error: {str(e)}"}
+
+    @staticmethod
+    def refund(job_id: int) -> dict:
+        """
+        Return a job's held money to the client
+
+        Args:
+            job_id: The job to refund
+
+        Returns:
+            dict with success status and message
+        """
+        try:
+            held = _settle(job_id, 'refunded', datetime.utcnow())
+            if held is None:
+                db.session.rollback()
+                return {"success": False, "message": "No funds held for this job"}
+            client_id, provider_id, amount = held
+
+            if _apply_delta(client_id, amount) is None:
+                db.session.rollback()
+                return {"success": False, "message": "Client not found"}
+
+            db.session.add(Transaction(
+                user_id=client_id,
+                amount=amount,
+                transaction_type="Refund",
+                description=f"Escrow refund for job #{job_id}",
+                related_user_id=provider_id
+            ))
+            ledger.record("Refund", [
+                (ledger.ESCROW, -amount),
+                (ledger.wallet_account(client_id), amount)
+            ], f"Escrow refund for job #{job_id}", job_id=job_id)
+            db.session.commit()
+
+            return {"success": True, "message": f"Refunded R{amount:.2f}"}
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"success": False, "message": f"Database error: {str(e)}"}
+
+    @staticmethod
+    def release_completed() -> dict:
+        """
+        Release every hold whose job is Completed, all in one transaction
+
+        Providers are credited with one executemany and the history is
+        written with one bulk insert, however many jobs are settled.
+
+        Returns:
+            dict with success status, message, count and total
+        """
+        return _settle_batch('Completed', 'released')
+
+    @staticmethod
+    def refund_cancelled() -> dict:
+        """
+        Refund every hold whose job was Cancelled, all in one transaction
+
+        Returns:
+            dict with success status, message, count and total
+        """
+        return _settle_batch('Cancelled', 'refunded')
+
+    @staticmethod
+    def pending_earnings(provider_id: int) -> Money:
+        """Money held in escrow for a provider's unpaid jobs"""
+        return db.session.query(func.coalesce(func.sum(EscrowHold.amount), 0)).filter(
+            EscrowHold.provider_id == provider_id,
+            EscrowHold.status == 'held'
+        ).scalar()
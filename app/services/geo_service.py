@@ -0,0 +1,208 @@
+"""
+Geo Service
+Geohash grid cells and map tiles for indexed viewport lookups on the LinkUp map
+"""
+import math
+from sqlalchemy import and_, or_, func
+from app.extensions import db
+
+# Stored precision: 9 characters is roughly a 5m x 5m cell
+GEOHASH_PRECISION = 9
+
+# Never OR together more than this many cells in one viewport query
+MAX_COVER_CELLS = 32
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Encode a coordinate pair into a geohash string"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits = bits << 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def decode_bbox(geohash):
+    """Return the (south, west, north, east) bounds of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def cell_size(precision):
+    """Return the (lat_degrees, lng_degrees) size of a cell at this precision"""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def precision_for_zoom(zoom):
+    """Pick a cover precision whose cells are a little smaller than a tile at this zoom"""
+    if zoom is None:
+        return 5
+    if zoom <= 2:
+        return 1
+    if zoom <= 5:
+        return 2
+    if zoom <= 7:
+        return 3
+    if zoom <= 10:
+        return 4
+    if zoom <= 12:
+        return 5
+    if zoom <= 15:
+        return 6
+    return 7
+
+
+def cover(south, west, north, east, precision):
+    """
+    List the geohash cells that cover a bounding box.
+
+    Drops to a coarser precision until the cover fits in MAX_COVER_CELLS,
+    so a zoomed-out viewport never turns into hundreds of OR clauses.
+    """
+    south, north = max(south, -90.0), min(north, 90.0)
+    west, east = max(west, -180.0), min(east, 180.0)
+
+    while precision > 1:
+        lat_step, lng_step = cell_size(precision)
+        rows = int((north - south) / lat_step) + 2
+        cols = int((east - west) / lng_step) + 2
+        if rows * cols <= MAX_COVER_CELLS:
+            break
+        precision -= 1
+
+    lat_step, lng_step = cell_size(precision)
+    cells = set()
+    lat = south
+    while True:
+        lng = west
+        while True:
+            cells.add(encode(min(lat, north), min(lng, east), precision))
+            if lng >= east:
+                break
+            lng += lng_step
+        if lat >= north:
+            break
+        lat += lat_step
+
+    return sorted(cells)
+
+
+def parse_bbox(raw):
+    """
+    Parse a Leaflet 'west,south,east,north' bbox string.
+
+    Returns (south, west, north, east) or None if the string is missing or invalid.
+    """
+    if not raw:
+        return None
+    try:
+        west, south, east, north = (float(part) for part in raw.split(','))
+    except ValueError:
+        return None
+    if south > north or west > east:
+        return None
+    return south, west, north, east
+
+
+def viewport_filter(model, bbox, zoom=None, dialect='sqlite'):
+    """
+    Build a filter clause that keeps only rows of `model` inside `bbox`.
+
+    On PostGIS this is an envelope overlap test served by the GiST index
+    on the point expression. Everywhere else the geohash cover narrows the
+    scan to a handful of indexed range lookups and the lat/lng comparison
+    trims the cell edges.
+    """
+    south, west, north, east = bbox
+    exact = and_(
+        model.latitude.between(south, north),
+        model.longitude.between(west, east)
+    )
+
+    if dialect == 'postgresql':
+        envelope = func.ST_MakeEnvelope(west, south, east, north, 4326)
+        return and_(_point(model.longitude, model.latitude).op('&&')(envelope), exact)
+
+    cells = cover(south, west, north, east, precision_for_zoom(zoom))
+    # Prefix match written as a range so the b-tree index is always usable
+    prefix_ranges = [
+        and_(model.geohash >= cell, model.geohash < cell + '~')
+        for cell in cells
+    ]
+    return and_(or_(*prefix_ranges), exact)
+
+
+def _point(longitude, latitude):
+    return func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326)
+
+
+def point_index(name, longitude, latitude):
+    """Functional GiST index over the lat/lng point, only emitted on PostgreSQL"""
+    return db.Index(
+        name, _point(longitude, latitude), postgresql_using='gist'
+    ).ddl_if(dialect='postgresql')
+
+
+def stamp_geohash(mapper, connection, target):
+    """SQLAlchemy before_insert/before_update hook that keeps `geohash` in sync"""
+    if target.latitude is None or target.longitude is None:
+        target.geohash = None
+    else:
+        target.geohash = encode(target.latitude, target.longitude)
+
+
+def tile_bounds(z, x, y):
+    """Return the (south, west, north, east) bounds of a slippy-map (Web Mercator) tile"""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def tile_for(lat, lng, z):
+    """Return the (x, y) of the slippy-map tile containing a point at zoom z"""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
@@ -0,0 +1,207 @@
+"""
+Idempotency Service
+Answers retried money-moving POSTs from the stored outcome instead of re-running them
+"""
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, session, flash, redirect, make_response
+from flask_login import current_user
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.extensions import db
+from app.models import IdempotencyKey
+
+# How long a key (and the outcome it replays) is kept
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+# How long a pending key holds off retries. Past this the key can be taken
+# over, but only if nothing the view did has committed (see _mark_committed).
+PENDING_LOCK = timedelta(seconds=60)
+
+HEADER = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+
+
+class KeyTakenOver(SQLAlchemyError):
+    """Raised from commit when a retry has claimed the request's key, so its changes must not land"""
+
+
+def new_key():
+    """Fresh key for a form to submit with (exposed to templates)"""
+    return uuid.uuid4().hex
+
+
+def _fingerprint():
+    form = sorted((k, v) for k, v in request.form.items(multi=True) if k != FORM_FIELD)
+    raw = json.dumps([request.endpoint, request.view_args, form], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _claim(key, fingerprint, now):
+    """
+    Insert a pending key, or return the existing one.
+    Returns (record, claimed) where `claimed` means this request runs the view.
+
+    A key past its expiry is taken over in place: a completed or committed
+    one past its TTL, or a pending one past PENDING_LOCK. A pending key has
+    no committed effects, and taking it over restamps `created_at`, so the
+    request that held it can no longer commit any.
+    """
+    record = IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).first()
+    if record is not None:
+        taken = IdempotencyKey.query.filter(
+            IdempotencyKey.id == record.id,
+            IdempotencyKey.expires_at <= now
+        ).update({
+            'endpoint': request.endpoint,
+            'fingerprint': fingerprint,
+            'status': 'pending',
+            'response': None,
+            'created_at': now,
+            'expires_at': now + PENDING_LOCK
+        }, synchronize_session=False)
+        db.session.commit()
+        if not taken:
+            return record, False
+        return record, True
+
+    record = IdempotencyKey(
+        user_id=current_user.id,
+        key=key,
+        endpoint=request.endpoint,
+        fingerprint=fingerprint,
+        created_at=now,
+        expires_at=now + PENDING_LOCK
+    )
+    db.session.add(record)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent retry claimed it first
+        db.session.rollback()
+        return IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).first(), False
+    return record, True
+
+
+def _replay(record, fingerprint):
+    if record.status == 'committed':
+        return ("The request with this idempotency key went through but its response was lost; "
+                "check your history before sending it again with a new key"), 409
+    if record.status != 'completed':
+        return "A request with this idempotency key is still being processed", 409
+    if record.fingerprint != fingerprint:
+        return "Idempotency key was already used for a different request", 422
+
+    stored = json.loads(record.response)
+    for category, message in stored['flashes']:
+        flash(message, category)
+    if stored['location']:
+        response = redirect(stored['location'], code=stored['status'])
+    else:
+        response = make_response(stored['body'], stored['status'])
+        response.mimetype = stored['mimetype']
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Run a POST view at most once per (user, Idempotency-Key).
+
+    The key comes from the Idempotency-Key header or an `idempotency_key`
+    form field; requests without one run as normal. A retry gets the first
+    response back, flashes included. Use under @login_required.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER) or request.form.get(FORM_FIELD)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return f"Idempotency key must be at most {MAX_KEY_LENGTH} characters", 400
+
+        fingerprint = _fingerprint()
+        claimed_at = datetime.utcnow()
+        record, claimed = _claim(key, fingerprint, claimed_at)
+        if not claimed:
+            return _replay(record, fingerprint)
+        record_id = record.id
+
+        flashes_before = len(session.get('_flashes', []))
+        db.session.info[CLAIM] = (record_id, claimed_at)
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.info.pop(CLAIM, None)
+            db.session.rollback()
+            # Nothing committed means nothing to replay; free the key so the client can retry
+            _held(record_id, claimed_at).filter_by(status='pending').delete()
+            db.session.commit()
+            raise
+        db.session.info.pop(CLAIM, None)
+        # Only what the view committed counts; don't let the bookkeeping commit anything it left behind
+        db.session.rollback()
+
+        _complete(record_id, claimed_at, response, session.get('_flashes', [])[flashes_before:])
+        return response
+    return wrapper
+
+
+def _held(record_id, claimed_at):
+    return IdempotencyKey.query.filter_by(id=record_id, created_at=claimed_at)
+
+
+def _complete(record_id, claimed_at, response, flashes):
+    """Store the response a retry replays"""
+    is_redirect = 300 <= response.status_code < 400
+    _held(record_id, claimed_at).update({
+        'status': 'completed',
+        'expires_at': datetime.utcnow() + IDEMPOTENCY_TTL,
+        'response': json.dumps({
+            'status': response.status_code,
+            'location': response.location if is_redirect else None,
+            'body': None if is_redirect else response.get_data(as_text=True),
+            'mimetype': response.mimetype,
+            'flashes': flashes
+        })
+    })
+    db.session.commit()
+
+
+# The view's own commits mark its key as committed in the same transaction as
+# the money they move. A crash before the response is stored then leaves a
+# key that is never run again, and a request whose key was taken over while it
+# ran fails its commit instead of moving the money a second time.
+
+CLAIM = 'idempotency_claim'
+
+
+def _mark_committed(db_session):
+    claim = db_session.info.get(CLAIM)
+    if claim is None:
+        return
+    record_id, claimed_at = claim
+    marked = db_session.execute(update(IdempotencyKey).where(
+        IdempotencyKey.id == record_id,
+        IdempotencyKey.created_at == claimed_at
+    ).values(status='committed', expires_at=datetime.utcnow() + IDEMPOTENCY_TTL))
+    if marked.rowcount == 0:
+        raise KeyTakenOver(f'Idempotency key {record_id} was claimed by another request')
+
+
+db.event.listen(db.session, 'before_commit', _mark_committed)
+
+
+def prune_idempotency_keys(now=None):
+    """Delete keys past their TTL; returns how many went"""
+    removed = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at < (now or datetime.utcnow())
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
@@ -0,0 +1,112 @@
+"""
+Image Pipeline
+Shrinks uploads once, on the way in: decoded at reduced size, turned upright,
+stripped of EXIF and re-encoded small, with a thumbnail from the same decode
+"""
+import os
+from dataclasses import dataclass
+
+from flask import current_app
+from PIL import Image
+
+MAX_EDGE = 1280
+THUMBNAIL_EDGE = 256
+FORMAT = 'WEBP'
+QUALITY = 80
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+# EXIF orientation tag value -> the transpose that makes the picture upright
+ORIENTATION_TAG = 0x0112
+ORIENTATION = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+@dataclass
+class ProcessedImage:
+    image_url: str
+    thumbnail_url: str
+    path: str
+    width: int
+    height: int
+    size_bytes: int
+
+
+def _setting(name, default):
+    return current_app.config.get(name) or default
+
+
+def shrink(image, max_edge):
+    """
+    Fit `image` inside max_edge x max_edge.
+
+    JPEGs are asked to decode at a smaller DCT scale with draft() before any
+    pixels are read; whatever is still more than twice too big is cut down by
+    the largest whole factor with reduce(), and only the last step resamples.
+    """
+    if image.format == 'JPEG':
+        image.draft('RGB', (max_edge, max_edge))
+    factor = max(image.size) // max_edge
+    if factor >= 2:
+        image = image.reduce(factor)
+    if max(image.size) > max_edge:
+        scale = max_edge / max(image.size)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.Resampling.LANCZOS)
+    return image
+
+
+def _upright(image, orientation):
+    # Turn the pixels to match the EXIF orientation, since the tag itself is dropped
+    if orientation in ORIENTATION:
+        image = image.transpose(ORIENTATION[orientation])
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    return image
+
+
+def process_upload(stream, stem, folder=None):
+    """
+    Decode an uploaded image once and save a downsized copy plus a thumbnail.
+
+    Nothing from the original file's metadata (EXIF, GPS, ICC) is written
+    back out. Raises PIL.UnidentifiedImageError if `stream` isn't an image.
+
+    Returns a ProcessedImage whose image_url is what gets analysed and served.
+    """
+    max_edge = int(_setting('IMAGE_MAX_EDGE', MAX_EDGE))
+    thumbnail_edge = int(_setting('THUMBNAIL_EDGE', THUMBNAIL_EDGE))
+    image_format = _setting('IMAGE_FORMAT', FORMAT).upper()
+    extension = EXTENSIONS.get(image_format, image_format.lower())
+    folder = folder or os.path.join(current_app.root_path, 'static', 'uploads')
+    os.makedirs(folder, exist_ok=True)
+
+    with Image.open(stream) as original:
+        orientation = original.getexif().get(ORIENTATION_TAG)
+        image = _upright(shrink(original, max_edge), orientation)
+        image.load()  # a small upright RGB upload can still be the (lazy) original
+    if image_format == 'JPEG' and image.mode == 'RGBA':
+        image = image.convert('RGB')
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((thumbnail_edge, thumbnail_edge), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    path = os.path.join(folder, f'{stem}.{extension}')
+    image.save(path, format=image_format, quality=QUALITY)
+    thumbnail.save(os.path.join(folder, f'{stem}_thumb.{extension}'), format=image_format, quality=QUALITY)
+
+    return ProcessedImage(
+        image_url=f'/static/uploads/{stem}.{extension}',
+        thumbnail_url=f'/static/uploads/{stem}_thumb.{extension}',
+        path=path,
+        width=image.width,
+        height=image.height,
+        size_bytes=os.path.getsize(path)
+    )
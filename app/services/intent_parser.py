@@ -0,0 +1,131 @@
+"""
+Intent Parser
+Recognises the structured chat commands Skhokho knows without asking the model,
+returning the same {"cmd": ...} dicts the model would have produced
+"""
+import re
+
+from app.services.search_service import SYNONYMS
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+}
+
+# Category names that can only mean a trade; broader targets ("car", "hair",
+# "security", "painting") stay with the model, which can ask what is meant
+TRADE_CATEGORIES = {'electrical', 'plumbing', 'carpentry', 'gardening', 'cleaning', 'automotive', 'construction'}
+
+# Trade words find_service is confident about: the slang plus those categories
+TRADES = set(SYNONYMS) | TRADE_CATEGORIES
+
+_AMOUNT = r'r\s?(?P<amount>\d+(?:[.,]\d{1,2})?)|(?P<rands>\d+(?:[.,]\d{1,2})?)\s?(?:rand|bucks)'
+_COUNT = r'(?P<count>\d+|' + '|'.join(NUMBER_WORDS) + r')'
+
+# Every pattern must match the whole message; anything looser goes to the model
+PATTERNS = [
+    ('baala_calc', re.compile(
+        r'(?:split|divide|share)\s+(?:a\s+|the\s+|my\s+|our\s+)?(?:taxi\s+fare\s+(?:of\s+)?)?(?:' + _AMOUNT + r')'
+        r'(?:\s+(?:taxi\s+)?fare)?\s+(?:between|among|amongst|by|with|for)\s+' + _COUNT +
+        r'(?:\s+(?:people|of\s+us|friends|ppl))?'
+    )),
+    ('baala_calc', re.compile(
+        r'(?:baala|taxi\s+fare)\s+(?:' + _AMOUNT + r')\s+(?:for|between|by)\s+' + _COUNT +
+        r'(?:\s+(?:people|of\s+us|friends|ppl))?'
+    )),
+    ('balance', re.compile(
+        r"(?:what'?s|what\s+is|check|show)\s+(?:my\s+)?(?:wallet\s+)?balance"
+        r"|(?:my\s+)?(?:wallet\s+)?balance"
+        r"|how\s+much\s+(?:money\s+)?(?:do\s+i\s+have|is\s+in\s+my\s+wallet)"
+    )),
+    ('set_alert', re.compile(
+        r'(?:alert|warn|tell)\s+me\s+(?:when|if)\s+(?:my\s+)?(?:wallet\s+)?balance\s+'
+        r'(?:drops|goes|falls|gets)\s+(?:below|under)\s+(?:' + _AMOUNT + r'|(?P<bare>\d+))'
+    )),
+    ('add_goal', re.compile(
+        r'(?:add|create|new|set)\s+(?:a\s+)?(?:new\s+)?goal\s*(?::|-|to)?\s*(?P<title>.+)'
+    )),
+    ('add_diary', re.compile(
+        r'(?:add|log|save|note)\s+(?:a\s+|an\s+)?(?:diary\s+)?(?P<entry_type>expense|thought|event)'
+        r'\s*(?::|-)?\s*(?P<content>.+)'
+    )),
+    ('add_diary', re.compile(
+        r'(?:dear\s+diary|diary)\s*(?::|,|-)?\s*(?P<content>.+)'
+    )),
+    ('add_network', re.compile(
+        r'(?:add|save)\s+(?:a\s+)?(?:new\s+)?contact\s*(?::|-)?\s*(?P<name>[^,]+?)'
+        r'(?:\s*,\s*(?P<role>[^,\d+][^,]*?))?(?:\s*,\s*(?P<phone>\+?\d[\d\s-]{6,}\d))?'
+    )),
+    ('find_service', re.compile(
+        r'(?:i\s+)?(?:need|find|get|looking\s+for|want)\s+(?:me\s+)?(?:a\s+|an\s+|some\s+)?'
+        r'(?P<service_type>[a-z]+)(?:\s+(?:near\s+me|nearby|around\s+here|please))?'
+    )),
+]
+
+_TRAILING = re.compile(r'[\s?!.]+$')
+
+
+def _amount(match):
+    raw = match.group('amount') or match.group('rands')
+    value = float(raw.replace(',', '.'))
+    return int(value) if value.is_integer() else value
+
+
+def _count(raw):
+    return int(raw) if raw.isdigit() else NUMBER_WORDS[raw]
+
+
+def _original(message, match, group):
+    """A slot's text in the user's own casing"""
+    start, end = match.span(group)
+    return message[start:end].strip()
+
+
+def _command(cmd, match, message):
+    if cmd == 'baala_calc':
+        group_size = _count(match.group('count'))
+        return {'cmd': cmd, 'fare': _amount(match), 'group_size': group_size} if group_size else None
+    if cmd == 'balance':
+        return {'cmd': cmd}
+    if cmd == 'set_alert':
+        threshold = int(match.group('bare')) if match.group('bare') else _amount(match)
+        return {'cmd': cmd, 'threshold': threshold, 'message': f'Alert when balance drops below R{threshold}'}
+    if cmd == 'add_goal':
+        return {'cmd': cmd, 'title': _original(message, match, 'title'), 'description': 'Added via Skhokho AI'}
+    if cmd == 'add_diary':
+        entry_type = match.groupdict().get('entry_type')
+        return {'cmd': cmd, 'entry_type': (entry_type or 'thought').capitalize(),
+                'content': _original(message, match, 'content')}
+    if cmd == 'add_network':
+        return {
+            'cmd': cmd,
+            'name': _original(message, match, 'name'),
+            'role': _original(message, match, 'role') if match.group('role') else 'Contact',
+            'phone': re.sub(r'[\s-]', '', match.group('phone')) if match.group('phone') else None,
+            'email': None
+        }
+    if cmd == 'find_service':
+        service_type = match.group('service_type')
+        return {'cmd': cmd, 'service_type': service_type} if service_type in TRADES else None
+    return None
+
+
+def parse_intent(message):
+    """
+    The command a chat message is unambiguously asking for, or None.
+
+    Only messages that match a pattern end to end count, and find_service
+    only fires for trades it knows, so anything open-ended still reaches
+    the model.
+    """
+    text = _TRAILING.sub('', (message or '').strip())
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        text = lowered  # slot offsets must line up with the original
+    for cmd, pattern in PATTERNS:
+        match = pattern.fullmatch(lowered)
+        if match:
+            command = _command(cmd, match, text)
+            if command:
+                return command
+    return None
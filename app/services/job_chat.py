@@ -0,0 +1,150 @@
+"""
+Job Chat Service
+Cursor-paged message history and a Server-Sent Events feed of new messages
+"""
+import json
+import threading
+import time
+
+from app.extensions import db
+from app.models import JobChat
+
+PAGE_SIZE = 50
+
+# A stream re-checks the database at least this often, so messages written
+# by other worker processes (which can't wake this one) still arrive
+POLL_SECONDS = 2.0
+
+# Comment line sent when nothing else has been, to keep proxies from timing out
+HEARTBEAT_SECONDS = 15.0
+
+
+def serialize(message):
+    return {
+        'id': message.id,
+        'job_id': message.job_id,
+        'sender_id': message.sender_id,
+        'sender': message.sender.username if message.sender else None,
+        'message': message.message,
+        'timestamp': message.timestamp.isoformat() if message.timestamp else None
+    }
+
+
+def message_page(job_id, limit=PAGE_SIZE, before=None):
+    """
+    The newest `limit` messages older than id `before`, returned oldest
+    first for display. Returns (messages, next_cursor); pass next_cursor
+    back as `before` for the page above, None once the top is reached.
+    """
+    query = JobChat.query.filter(JobChat.job_id == job_id)
+    try:
+        query = query.filter(JobChat.id < int(before)) if before else query
+    except (TypeError, ValueError):
+        pass
+    rows = query.options(db.joinedload(JobChat.sender)).order_by(JobChat.id.desc()).limit(limit + 1).all()
+    messages = rows[:limit]
+    next_cursor = messages[-1].id if len(rows) > limit else None
+    return messages[::-1], next_cursor
+
+
+def messages_after(job_id, after_id, limit=PAGE_SIZE):
+    """Messages newer than id `after_id`, oldest first"""
+    return JobChat.query.options(db.joinedload(JobChat.sender)).filter(
+        JobChat.job_id == job_id, JobChat.id > after_id
+    ).order_by(JobChat.id).limit(limit).all()
+
+
+def latest_message_id(job_id):
+    return db.session.query(db.func.max(JobChat.id)).filter(JobChat.job_id == job_id).scalar() or 0
+
+
+class ChatNotifier:
+    """Wakes this process's streams for a job as soon as one of its messages commits"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = {}
+
+    def version(self, job_id):
+        with self._condition:
+            return self._versions.get(job_id, 0)
+
+    def notify(self, job_ids):
+        with self._condition:
+            for job_id in job_ids:
+                self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            self._condition.notify_all()
+
+    def wait(self, job_id, seen_version, timeout):
+        """Block until the job's version moves past `seen_version` or `timeout` passes"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._versions.get(job_id, 0) != seen_version, timeout)
+            return self._versions.get(job_id, 0)
+
+
+notifier = ChatNotifier()
+
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_messages(job_id, after_id, duration, clock=time.monotonic):
+    """
+    SSE frames for messages after `after_id`, for up to `duration` seconds.
+
+    Each message goes out with its id, so a reconnecting EventSource
+    resumes from Last-Event-ID without gaps or repeats. The connection is
+    handed back between polls rather than held while waiting.
+    """
+    deadline = clock() + duration
+    last_beat = clock()
+    yield 'retry: 3000\n\n'
+    while True:
+        seen_version = notifier.version(job_id)
+        fresh = messages_after(job_id, after_id)
+        for message in fresh:
+            yield _sse('message', serialize(message), event_id=message.id)
+            after_id = message.id
+        db.session.close()
+        if fresh:
+            last_beat = clock()
+            if len(fresh) == PAGE_SIZE:
+                continue  # more backlog waiting
+
+        now = clock()
+        if now >= deadline:
+            return
+        if now - last_beat >= HEARTBEAT_SECONDS:
+            yield ': keep-alive\n\n'
+            last_beat = now
+        notifier.wait(job_id, seen_version, min(POLL_SECONDS, deadline - now))
+
+
+# Streams are only woken once the commit lands, so they never look for a
+# message that could still be rolled back.
+
+def _remember_message(mapper, connection, target):
+    session = db.inspect(target).session
+    if session is not None:
+        session.info.setdefault('new_chat_jobs', set()).add(int(target.job_id))
+
+
+def _notify_after_commit(session):
+    job_ids = session.info.pop('new_chat_jobs', None)
+    if job_ids:
+        notifier.notify(job_ids)
+
+
+def _forget_after_rollback(session):
+    session.info.pop('new_chat_jobs', None)
+
+
+db.event.listen(JobChat, 'after_insert', _remember_message)
+db.event.listen(db.session, 'after_commit', _notify_after_commit)
+db.event.listen(db.session, 'after_rollback', _forget_after_rollback)
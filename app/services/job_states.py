@@ -0,0 +1,147 @@
+"""
+Job State Machine
+The one place Job.status changes: validates the move, stamps the matching
+timestamp and appends to the JobTransition log
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, insert, select, func, literal
+
+from app.extensions import db
+from app.models import Job, JobTransition
+
+PENDING = 'Pending'
+IN_PROGRESS = 'In_Progress'
+COMPLETED = 'Completed'
+PAID = 'Paid'
+DISPUTED = 'Disputed'
+CANCELLED = 'Cancelled'
+
+TRANSITIONS = {
+    PENDING: {IN_PROGRESS, CANCELLED},
+    IN_PROGRESS: {COMPLETED, DISPUTED, CANCELLED},
+    COMPLETED: {PAID, DISPUTED},
+    DISPUTED: {IN_PROGRESS, COMPLETED, CANCELLED},
+    PAID: set(),
+    CANCELLED: set(),
+}
+
+# Entering these states stamps the column the first time only, so a job that
+# goes back to In_Progress after a dispute keeps its original started_at
+STAMPS = {
+    IN_PROGRESS: 'started_at',
+    COMPLETED: 'completed_at',
+    PAID: 'paid_at',
+}
+
+# Pending jobs untouched for this long are cancelled by cancel_stale_pending
+STALE_PENDING_AFTER = timedelta(days=7)
+
+
+class InvalidTransition(ValueError):
+    """The job can't move to the requested status from where it is"""
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, set())
+
+
+def _changes(to_status, now):
+    values = {'status': to_status}
+    stamp = STAMPS.get(to_status)
+    if stamp:
+        values[stamp] = func.coalesce(getattr(Job, stamp), now)
+    if to_status == PAID:
+        values['is_paid'] = True
+    return values
+
+
+def transition(job, to_status, actor_id=None, reason=None, now=None):
+    """
+    Move one job to `to_status` and log it (the caller commits).
+
+    The UPDATE is guarded on the status the job was read with, so if
+    another request moved it first this raises instead of overwriting.
+    """
+    from_status = job.status
+    if not can_transition(from_status, to_status):
+        raise InvalidTransition(f'Job #{job.id} cannot go from {from_status} to {to_status}')
+
+    now = now or datetime.utcnow()
+    moved = db.session.execute(
+        update(Job).where(Job.id == job.id, Job.status == from_status).values(**_changes(to_status, now))
+    ).rowcount
+    if moved != 1:
+        raise InvalidTransition(f'Job #{job.id} is no longer {from_status}')
+    db.session.refresh(job, ['status', 'started_at', 'completed_at', 'paid_at', 'is_paid'])
+
+    db.session.add(JobTransition(
+        job_id=job.id, from_status=from_status, to_status=to_status,
+        actor_id=actor_id, reason=reason, created_at=now
+    ))
+    return job
+
+
+def bulk_transition(from_status, to_status, *criteria, actor_id=None, reason=None, now=None):
+    """
+    Move every `from_status` job matching `criteria` in one UPDATE and log
+    them with one bulk insert (the caller commits). Returns the job ids moved.
+    """
+    if not can_transition(from_status, to_status):
+        raise InvalidTransition(f'Jobs cannot go from {from_status} to {to_status}')
+
+    now = now or datetime.utcnow()
+    moved = db.session.execute(
+        update(Job).where(Job.status == from_status, *criteria)
+        .values(**_changes(to_status, now))
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if moved:
+        db.session.execute(insert(JobTransition), [{
+            'job_id': job_id, 'from_status': from_status, 'to_status': to_status,
+            'actor_id': actor_id, 'reason': reason, 'created_at': now
+        } for job_id in moved])
+    return moved
+
+
+def cancel_stale_pending(older_than=STALE_PENDING_AFTER, now=None):
+    """Cancel Pending jobs created before `older_than` ago; returns the ids cancelled"""
+    now = now or datetime.utcnow()
+    cancelled = bulk_transition(
+        PENDING, CANCELLED, Job.created_at < now - older_than,
+        reason=f'Pending for over {older_than.days} days', now=now
+    )
+    db.session.commit()
+    return cancelled
+
+
+def _seconds_between(start, end):
+    if db.engine.dialect.name == 'postgresql':
+        return func.extract('epoch', end - start)
+    return (func.julianday(end) - func.julianday(start)) * literal(86400.0)
+
+
+def time_in_state(since=None):
+    """
+    How long jobs spend in each status, from the transition log.
+    Returns {status: {'count': n, 'avg_seconds': s}} over stays that have ended.
+    """
+    left_at = func.lead(JobTransition.created_at).over(
+        partition_by=JobTransition.job_id, order_by=JobTransition.id
+    )
+    stays = select(
+        JobTransition.to_status.label('status'),
+        JobTransition.created_at.label('entered_at'),
+        left_at.label('left_at')
+    )
+    if since is not None:
+        stays = stays.where(JobTransition.created_at >= since)
+    stays = stays.subquery()
+
+    rows = db.session.execute(
+        select(stays.c.status, func.count(), func.avg(_seconds_between(stays.c.entered_at, stays.c.left_at)))
+        .where(stays.c.left_at.isnot(None))
+        .group_by(stays.c.status)
+    ).all()
+    return {status: {'count': count, 'avg_seconds': float(seconds)} for status, count, seconds in rows}
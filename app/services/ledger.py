@@ -0,0 +1,136 @@
+"""
+Ledger Service
+Double-entry postings behind every wallet movement, with balance snapshots
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func
+
+from app.extensions import db
+from app.models import LedgerEntry, LedgerPosting, BalanceSnapshot
+from app.services.money import Money
+
+# System accounts on the other side of user wallets
+EXTERNAL = 'external'  # Money entering or leaving the platform
+ESCROW = 'escrow'      # Held for jobs until release or refund
+REWARDS = 'rewards'    # Civic rewards and points conversions
+OPENING = 'opening'    # Balances that predate the ledger
+
+# Snapshots skip postings newer than this, so most slow transactions have
+# committed their lower posting ids before a snapshot passes them. Any that
+# commit later still are caught when the next run re-verifies the snapshot.
+SNAPSHOT_SETTLE = timedelta(minutes=1)
+
+
+def wallet_account(user_id):
+    return f'wallet:{user_id}'
+
+
+def record(entry_type, postings, description=None, job_id=None):
+    """
+    Add a balanced entry to the session (the caller commits).
+
+    `postings` is a list of (account, amount); positive amounts credit the
+    account, negative amounts debit it, and together they must sum to
+    exactly zero cents.
+    """
+    postings = [(account, Money.coerce(amount)) for account, amount in postings]
+    if sum(amount for _, amount in postings) != 0:
+        raise ValueError(f'Unbalanced {entry_type} entry: {postings}')
+
+    now = datetime.utcnow()
+    entry = LedgerEntry(entry_type=entry_type, description=description, job_id=job_id, created_at=now)
+    db.session.add(entry)
+    db.session.add_all(
+        LedgerPosting(entry=entry, account=account, amount=amount, created_at=now)
+        for account, amount in postings
+    )
+    return entry
+
+
+def _latest_snapshot(account, as_of=None):
+    query = BalanceSnapshot.query.filter_by(account=account)
+    if as_of is not None:
+        query = query.filter(BalanceSnapshot.taken_at <= as_of)
+    return query.order_by(BalanceSnapshot.taken_at.desc(), BalanceSnapshot.id.desc()).first()
+
+
+def balance(account, as_of=None):
+    """Balance of an account now, or as of `as_of`: last snapshot plus the postings after it"""
+    snapshot = _latest_snapshot(account, as_of)
+    query = db.session.query(func.coalesce(func.sum(LedgerPosting.amount), 0)).filter(
+        LedgerPosting.account == account
+    )
+    if snapshot is not None:
+        query = query.filter(LedgerPosting.id > snapshot.last_posting_id)
+    if as_of is not None:
+        query = query.filter(LedgerPosting.created_at <= as_of)
+    return (snapshot.balance if snapshot else Money(0)) + query.scalar()
+
+
+def take_snapshots(now=None):
+    """
+    Snapshot every account that has settled postings since its last snapshot.
+    One grouped query over the new postings; returns how many were written.
+
+    Each latest snapshot is first re-checked against the sum of postings up
+    to its `last_posting_id`. A posting committed late under a lower id shows
+    up as a mismatch, and the account gets a corrected snapshot even if
+    nothing new has settled.
+    """
+    now = now or datetime.utcnow()
+
+    latest_ids = db.session.query(
+        BalanceSnapshot.account, func.max(BalanceSnapshot.id).label('snapshot_id')
+    ).group_by(BalanceSnapshot.account).subquery()
+    previous = {
+        snap.account: snap for snap in BalanceSnapshot.query.join(
+            latest_ids, BalanceSnapshot.id == latest_ids.c.snapshot_id
+        )
+    }
+
+    verified = dict(db.session.query(
+        LedgerPosting.account, func.sum(LedgerPosting.amount)
+    ).join(
+        BalanceSnapshot, and_(
+            BalanceSnapshot.account == LedgerPosting.account,
+            LedgerPosting.id <= BalanceSnapshot.last_posting_id
+        )
+    ).join(
+        latest_ids, BalanceSnapshot.id == latest_ids.c.snapshot_id
+    ).group_by(LedgerPosting.account).all())
+
+    last_seen = db.session.query(
+        BalanceSnapshot.account, func.max(BalanceSnapshot.last_posting_id).label('last_posting_id')
+    ).group_by(BalanceSnapshot.account).subquery()
+    grouped = db.session.query(
+        LedgerPosting.account,
+        func.sum(LedgerPosting.amount),
+        func.max(LedgerPosting.id)
+    ).outerjoin(
+        last_seen, LedgerPosting.account == last_seen.c.account
+    ).filter(
+        LedgerPosting.id > func.coalesce(last_seen.c.last_posting_id, 0),
+        LedgerPosting.created_at <= now - SNAPSHOT_SETTLE
+    ).group_by(LedgerPosting.account).all()
+    settled = {account: (delta, last_posting_id) for account, delta, last_posting_id in grouped}
+
+    written = 0
+    for account in sorted(settled.keys() | previous.keys()):
+        prior = previous.get(account)
+        base = verified.get(account, Money(0)) if prior else Money(0)
+        if account in settled:
+            delta, last_posting_id = settled[account]
+        elif base != prior.balance:
+            delta, last_posting_id = Money(0), prior.last_posting_id
+        else:
+            continue
+        db.session.add(BalanceSnapshot(
+            account=account,
+            balance=base + delta,
+            last_posting_id=last_posting_id,
+            taken_at=now
+        ))
+        written += 1
+    db.session.commit()
+    return written
@@ -0,0 +1,126 @@
+"""
+Money
+Exact rand amounts, stored as integer cents
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from functools import total_ordering
+
+from sqlalchemy.types import TypeDecorator, BigInteger
+
+_CENT = Decimal('0.01')
+
+
+@total_ordering
+class Money:
+    """
+    An amount of rands held as whole cents.
+
+    Plain numbers (from forms, tests, templates) are read as rands, so
+    `Money.coerce(12.5) == Money(1250)` and `Money(1250) == 12.5`.
+    """
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        if not isinstance(cents, int):
+            raise TypeError(f'Money takes whole cents, got {cents!r}')
+        self.cents = cents
+
+    @classmethod
+    def from_rands(cls, value):
+        """Round a rand amount (number or numeric string) to the nearest cent"""
+        rands = Decimal(str(value)).quantize(_CENT, rounding=ROUND_HALF_UP)
+        return cls(int(rands * 100))
+
+    @classmethod
+    def coerce(cls, value):
+        """Money as-is, None as None, anything numeric as rands"""
+        if value is None or isinstance(value, Money):
+            return value
+        return cls.from_rands(value)
+
+    @property
+    def rands(self):
+        return Decimal(self.cents) / 100
+
+    # --- Arithmetic (results are always exact cents) ---
+
+    def __add__(self, other):
+        other = _as_money(other)
+        return NotImplemented if other is None else Money(self.cents + other.cents)
+
+    __radd__ = __add__  # sum() starts from 0
+
+    def __sub__(self, other):
+        other = _as_money(other)
+        return NotImplemented if other is None else Money(self.cents - other.cents)
+
+    def __rsub__(self, other):
+        other = _as_money(other)
+        return NotImplemented if other is None else Money(other.cents - self.cents)
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __abs__(self):
+        return Money(abs(self.cents))
+
+    def __mul__(self, factor):
+        if isinstance(factor, (Money, bool)) or not isinstance(factor, (int, float, Decimal)):
+            return NotImplemented
+        cents = (Decimal(self.cents) * Decimal(str(factor))).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        return Money(int(cents))
+
+    __rmul__ = __mul__
+
+    # --- Comparison ---
+
+    def __eq__(self, other):
+        other = _as_money(other)
+        return NotImplemented if other is None else self.cents == other.cents
+
+    def __lt__(self, other):
+        other = _as_money(other)
+        return NotImplemented if other is None else self.cents < other.cents
+
+    def __hash__(self):
+        # Equal to the plain number it compares equal to
+        return hash(self.rands)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    # --- Display ---
+
+    def __float__(self):
+        return float(self.rands)
+
+    def __format__(self, spec):
+        return format(self.rands, spec or '.2f')
+
+    def __str__(self):
+        return f'{self.rands:.2f}'
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+
+def _as_money(value):
+    if isinstance(value, Money):
+        return value
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return Money.from_rands(value)
+    return None
+
+
+class Cents(TypeDecorator):
+    """Column type for Money: BIGINT cents in the database, Money in Python"""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        value = Money.coerce(value)
+        return None if value is None else value.cents
+
+    def process_result_value(self, value, dialect):
+        # SUM over BIGINT comes back as NUMERIC on PostgreSQL
+        return None if value is None else Money(int(value))
@@ -0,0 +1,303 @@
+"""
+Nearby Service
+Per-process KD-tree over Service coordinates for "k closest providers" queries
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from math import asin, sin
+
+import numpy as np
+
+from app.extensions import db
+from app.models import Service
+from app.services.radar_service import EARTH_RADIUS
+
+# Points per KD-tree leaf; leaves are scanned with NumPy
+LEAF_SIZE = 16
+
+# Fold pending inserts/deletes into a fresh tree once this many pile up
+REBUILD_THRESHOLD = 256
+
+# Full rebuild interval, so deletes and moves made by other workers are picked up
+REBUILD_SECONDS = 600
+
+# Rows are stamped updated_at at flush but only become visible at commit, so
+# catch-up re-reads everything stamped from this long before the last rebuild
+# began. Only a transaction held open longer than that waits for the next
+# rebuild; the rebuild itself reads every committed row.
+CATCH_UP_WINDOW = timedelta(seconds=REBUILD_SECONDS)
+
+# Default search radius for "nearby" lookups
+NEARBY_RADIUS = 1000
+
+
+def to_unit_vector(lat, lng):
+    """Project lat/lng onto the unit sphere; straight-line distance there orders like great-circle distance"""
+    phi = np.radians(lat)
+    lam = np.radians(lng)
+    return np.array([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)])
+
+
+def _chord_for(meters):
+    return 2 * sin(min(meters / EARTH_RADIUS, np.pi) / 2)
+
+
+def _meters_for(chord):
+    return 2 * EARTH_RADIUS * asin(min(chord / 2, 1.0))
+
+
+def category_key(category):
+    """
+    Loose category key so "plumber", "Plumbing" and "plumbers" land together.
+    """
+    key = (category or '').strip().lower()
+    for suffix in ('icians', 'ician', 'ical', 'ians', 'ian', 'ers', 'er', 'ing', 'al', 's'):
+        if key.endswith(suffix) and len(key) - len(suffix) >= 4:
+            return key[:-len(suffix)]
+    return key
+
+
+class KDTree:
+    """Static KD-tree over 3D points, built once and queried for k nearest within a radius"""
+
+    def __init__(self, ids, points):
+        self.ids = np.asarray(ids)
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.order = np.arange(len(self.ids))
+        # Node: (lo, hi, axis, split, left, right); axis -1 marks a leaf
+        self.nodes = []
+        self.root = self._build(0, len(self.ids)) if len(self.ids) else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _build(self, lo, hi):
+        node_id = len(self.nodes)
+        if hi - lo <= LEAF_SIZE:
+            self.nodes.append((lo, hi, -1, 0.0, -1, -1))
+            return node_id
+
+        points = self.points[self.order[lo:hi]]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        mid = (hi - lo) // 2
+        partition = np.argpartition(points[:, axis], mid)
+        self.order[lo:hi] = self.order[lo:hi][partition]
+        split = float(self.points[self.order[lo + mid], axis])
+
+        self.nodes.append(None)
+        left = self._build(lo, lo + mid)
+        right = self._build(lo + mid, hi)
+        self.nodes[node_id] = (lo, hi, axis, split, left, right)
+        return node_id
+
+    def query(self, target, k, max_distance):
+        """Return up to k (distance, id) pairs within max_distance, nearest first"""
+        if self.root is None or k <= 0:
+            return []
+
+        best = []  # max-heap via negated distances
+
+        def bound():
+            return -best[0][0] if len(best) == k else max_distance
+
+        def visit(node_id):
+            lo, hi, axis, split, left, right = self.nodes[node_id]
+            if axis < 0:
+                rows = self.order[lo:hi]
+                distances = np.sqrt(((self.points[rows] - target) ** 2).sum(axis=1))
+                for row, distance in zip(rows, distances):
+                    if distance <= bound():
+                        item = (-float(distance), int(row))
+                        if len(best) < k:
+                            heapq.heappush(best, item)
+                        else:
+                            heapq.heapreplace(best, item)
+                return
+
+            diff = target[axis] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if abs(diff) <= bound():
+                visit(far)
+
+        visit(self.root)
+        return sorted((-distance, self.ids[row].item()) for distance, row in best)
+
+
+class ServiceIndex:
+    """
+    Process-wide spatial index of services, one KD-tree per category.
+
+    Inserts land in a small pending buffer and deletes in a tombstone set,
+    both consulted at query time; once either grows past REBUILD_THRESHOLD
+    the trees are rebuilt. This process's writes arrive when they commit;
+    rows added or moved by other workers are caught up by updated_at
+    before each query.
+    """
+
+    def __init__(self):
+        # Re-entrant: a query's autoflush can fire the insert hooks on the same thread
+        self._lock = threading.RLock()
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop everything; the next query rebuilds from the database"""
+        self._trees = {}
+        self._pending = {}   # service_id -> (category key, unit vector)
+        self._removed = set()
+        self._versions = {}  # service_id -> updated_at of the copy indexed
+        self._window_start = None  # catch-up re-reads rows stamped from here on
+        self._built_at = None
+
+    def add(self, service_id, category, lat, lng, updated_at=None):
+        with self._lock:
+            self._removed.discard(service_id)
+            self._pending[service_id] = (category_key(category), to_unit_vector(lat, lng))
+            self._versions[service_id] = updated_at
+
+    def remove(self, service_id):
+        with self._lock:
+            self._pending.pop(service_id, None)
+            self._versions.pop(service_id, None)
+            self._removed.add(service_id)
+
+    def _rebuild(self):
+        started = datetime.utcnow()
+        rows = db.session.query(
+            Service.id, Service.category, Service.latitude, Service.longitude, Service.updated_at
+        ).all()
+
+        grouped = {}
+        for service_id, category, lat, lng, _ in rows:
+            grouped.setdefault(category_key(category), []).append((service_id, lat, lng))
+
+        self._trees = {
+            key: KDTree(
+                [service_id for service_id, _, _ in members],
+                to_unit_vector(
+                    np.array([lat for _, lat, _ in members]),
+                    np.array([lng for _, _, lng in members])
+                ).T
+            )
+            for key, members in grouped.items()
+        }
+        self._pending = {}
+        self._removed = set()
+        self._versions = {row[0]: row[4] for row in rows}
+        self._window_start = started - CATCH_UP_WINDOW
+        self._built_at = time.monotonic()
+
+    def _catch_up(self):
+        # Not from the newest stamp seen: a row stamped earlier can commit later,
+        # so the whole window is re-read and only rows that changed are taken
+        rows = db.session.query(
+            Service.id, Service.category, Service.latitude, Service.longitude, Service.updated_at
+        ).filter(Service.updated_at >= self._window_start).all()
+        for service_id, category, lat, lng, updated_at in rows:
+            if service_id in self._removed or self._versions.get(service_id) == updated_at:
+                continue
+            self._pending[service_id] = (category_key(category), to_unit_vector(lat, lng))
+            self._versions[service_id] = updated_at
+
+    def _ensure_fresh(self):
+        stale = (
+            self._built_at is None
+            or time.monotonic() - self._built_at > REBUILD_SECONDS
+            or len(self._pending) + len(self._removed) > REBUILD_THRESHOLD
+        )
+        if stale:
+            self._rebuild()
+        else:
+            self._catch_up()
+
+    def nearest(self, lat, lng, k=5, category=None, radius_meters=NEARBY_RADIUS):
+        """
+        Return up to k (service_id, distance_m) pairs sorted by true distance.
+
+        `category` is matched loosely (see category_key); None searches all.
+        """
+        target = to_unit_vector(lat, lng)
+        max_chord = _chord_for(radius_meters)
+
+        with self._lock:
+            self._ensure_fresh()
+            wanted = category_key(category) if category else None
+            trees = [tree for key, tree in self._trees.items() if wanted is None or key == wanted]
+            # Tree entries that were deleted or re-added (moved) since the build are stale;
+            # ask for extra hits so they can't starve the result
+            stale = self._removed | self._pending.keys()
+            fetch = k + len(stale)
+
+            hits = []
+            for tree in trees:
+                hits.extend(hit for hit in tree.query(target, fetch, max_chord) if hit[1] not in stale)
+
+            for service_id, (key, point) in self._pending.items():
+                if wanted is None or key == wanted:
+                    chord = float(np.sqrt(((point - target) ** 2).sum()))
+                    if chord <= max_chord:
+                        hits.append((chord, service_id))
+
+        return [(service_id, _meters_for(chord)) for chord, service_id in sorted(hits)[:k]]
+
+
+service_index = ServiceIndex()
+
+
+def nearest_services(lat, lng, k=5, category=None, radius_meters=NEARBY_RADIUS):
+    """
+    The k closest services to a point, as (Service, distance_m) pairs nearest first.
+    """
+    hits = service_index.nearest(lat, lng, k=k, category=category, radius_meters=radius_meters)
+    if not hits:
+        return []
+
+    services = {s.id: s for s in Service.query.filter(Service.id.in_([sid for sid, _ in hits])).all()}
+    # A row deleted by another worker since the last rebuild simply drops out here
+    return [(services[sid], distance) for sid, distance in hits if sid in services]
+
+
+# Writes reach the index once they commit, so a rolled-back move or delete
+# never shows up in (or vanishes from) the results.
+
+def _on_service_written(mapper, connection, target):
+    session = db.inspect(target).session
+    if session is not None:
+        session.info.setdefault('nearby_written', {})[target.id] = (
+            target.category, target.latitude, target.longitude, target.updated_at
+        )
+        session.info.get('nearby_deleted', set()).discard(target.id)
+
+
+def _on_service_deleted(mapper, connection, target):
+    session = db.inspect(target).session
+    if session is not None:
+        session.info.get('nearby_written', {}).pop(target.id, None)
+        session.info.setdefault('nearby_deleted', set()).add(target.id)
+
+
+def _apply_after_commit(session):
+    for service_id, (category, lat, lng, updated_at) in session.info.pop('nearby_written', {}).items():
+        service_index.add(service_id, category, lat, lng, updated_at)
+    for service_id in session.info.pop('nearby_deleted', set()):
+        service_index.remove(service_id)
+
+
+def _forget_after_rollback(session):
+    session.info.pop('nearby_written', None)
+    session.info.pop('nearby_deleted', None)
+
+
+def _on_table_recreated(target, connection, **kw):
+    service_index.invalidate()
+
+
+db.event.listen(Service, 'after_insert', _on_service_written)
+db.event.listen(Service, 'after_update', _on_service_written)
+db.event.listen(Service, 'after_delete', _on_service_deleted)
+db.event.listen(db.session, 'after_commit', _apply_after_commit)
+db.event.listen(db.session, 'after_rollback', _forget_after_rollback)
+db.event.listen(Service.__table__, 'after_create', _on_table_recreated)
+db.event.listen(Service.__table__, 'after_drop', _on_table_recreated)
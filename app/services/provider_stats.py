@@ -0,0 +1,61 @@
+"""
+Provider Stats Service
+LinkUp dashboard figures computed in SQL rather than over every Job row
+"""
+from sqlalchemy import func, case
+
+from app.extensions import db
+from app.models import Job
+from app.services.job_states import COMPLETED, PAID
+from app.services.money import Money
+from app.services.ratings import rating_for
+
+JOBS_PER_PAGE = 20
+
+
+def provider_stats(provider_id: int) -> dict:
+    """
+    Earnings, job counts by status and average rating for a provider.
+    One grouped query over their jobs plus the rating aggregate's row.
+    """
+    by_status = db.session.query(
+        Job.status,
+        func.count(Job.id),
+        func.coalesce(func.sum(case((Job.is_paid.is_(True), Job.price), else_=0)), 0)
+    ).filter(Job.provider_id == provider_id).group_by(Job.status).all()
+
+    jobs_by_status = {status: count for status, count, _ in by_status}
+    paid = {status: earned for status, _, earned in by_status}
+    finished = (COMPLETED, PAID)  # released jobs move on to Paid
+
+    rating = rating_for(provider_id, 'provider')
+    if rating is not None and not rating.review_count:
+        rating = None  # every review was removed
+
+    return {
+        "total_earnings": sum((paid.get(status, Money(0)) for status in finished), Money(0)),
+        "completed_jobs": sum(jobs_by_status.get(status, 0) for status in finished),
+        "total_jobs": sum(jobs_by_status.values()),
+        "jobs_by_status": jobs_by_status,
+        "average_rating": round(rating.average, 1) if rating else None,
+        "review_count": rating.review_count if rating else 0,
+        "rating_histogram": rating.histogram if rating else {stars: 0 for stars in range(1, 6)}
+    }
+
+
+def job_page(role_column, user_id: int, limit: int = JOBS_PER_PAGE, before=None):
+    """
+    One page of a user's jobs, newest first, keyset-paged on Job.id.
+
+    `role_column` is Job.provider_id or Job.client_id. Pass the returned
+    next_cursor back as `before` for the next page; it is None on the last.
+    """
+    query = Job.query.filter(role_column == user_id)
+    try:
+        query = query.filter(Job.id < int(before)) if before else query
+    except (TypeError, ValueError):
+        pass
+    rows = query.order_by(Job.id.desc()).limit(limit + 1).all()
+    jobs = rows[:limit]
+    next_cursor = jobs[-1].id if len(rows) > limit else None
+    return jobs, next_cursor
@@ -1,6 +1,8 @@
 from app import db
 from app.models import Opportunity, NewsItem, Goal
-from math import radians, sin, cos, sqrt, atan2
+from app.services.geo_service import viewport_filter
+from math import radians, sin, cos, sqrt, atan2, degrees
+import numpy as np
 
 # Earth radius in meters
 EARTH_RADIUS = 6371000
@@ -19,6 +21,48 @@ def haversine(lat1, lon1, lat2, lon2):
     distance = R * c
     return distance
 
+def haversine_many(lat, long, lats, longs):
+    """Distances in meters from one point to arrays of points, in a single NumPy pass"""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(np.asarray(longs, dtype=np.float64) - long)
+    
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def bounding_box(lat, long, radius_meters):
+    """(south, west, north, east) box that fully contains the radius circle"""
+    delta_lat = degrees(radius_meters / EARTH_RADIUS)
+    # Longitude degrees shrink towards the poles; clamp to avoid dividing by ~0
+    delta_long = degrees(radius_meters / (EARTH_RADIUS * max(cos(radians(lat)), 0.01)))
+    return lat - delta_lat, long - delta_long, lat + delta_lat, long + delta_long
+
+def find_within(query, model, lat, long, radius_meters):
+    """
+    Rows of `query` within `radius_meters`, paired with their distance.
+    
+    The bounding box runs in SQL (geohash index) so only candidates near the
+    user are loaded; the exact haversine cut is then one vectorised NumPy call.
+    """
+    bbox = bounding_box(lat, long, radius_meters)
+    candidates = query.filter(
+        viewport_filter(model, bbox, dialect=db.engine.dialect.name)
+    ).all()
+    if not candidates:
+        return []
+    
+    distances = haversine_many(
+        lat, long,
+        [row.latitude for row in candidates],
+        [row.longitude for row in candidates]
+    )
+    return [
+        (row, float(distance))
+        for row, distance in zip(candidates, distances)
+        if distance <= radius_meters
+    ]
+
 def scan_surroundings(lat, long, radius_meters=5000):
     """
     Takes user coordinates and finds interesting spots nearby.
@@ -27,44 +71,34 @@ def scan_surroundings(lat, long, radius_meters=5000):
     nearby_tags = []
     
     # Get nearby opportunities
-    opportunities = Opportunity.query.all()
-    for opp in opportunities:
-        distance = haversine(lat, long, opp.latitude, opp.longitude)
-        if distance <= radius_meters:
-            nearby_tags.append(f"🎯 OPPORTUNITY: {opp.title} ({opp.category})")
+    for opp, _ in find_within(Opportunity.query, Opportunity, lat, long, radius_meters):
+        nearby_tags.append(f"🎯 OPPORTUNITY: {opp.title} ({opp.category})")
     
     # Get nearby news items
-    news_items = NewsItem.query.all()
-    for news in news_items:
-        if news.latitude and news.longitude:
-            distance = haversine(lat, long, news.latitude, news.longitude)
-            if distance <= radius_meters:
-                tag = f"📰 NEWS: {news.title}"
-                if news.is_breaking:
-                    tag = f"🚨 BREAKING: {news.title}"
-                nearby_tags.append(tag)
+    for news, _ in find_within(NewsItem.query, NewsItem, lat, long, radius_meters):
+        tag = f"📰 NEWS: {news.title}"
+        if news.is_breaking:
+            tag = f"🚨 BREAKING: {news.title}"
+        nearby_tags.append(tag)
     
     return nearby_tags if nearby_tags else ["📭 Nothing nearby. You are in the wild."]
 
 def get_breaking_news(lat, long, radius_meters=10000):
     """Get breaking news within specified radius"""
     breaking_news = []
-    news_items = NewsItem.query.filter_by(is_breaking=True).all()
-    
-    for news in news_items:
-        if news.latitude and news.longitude:
-            distance = haversine(lat, long, news.latitude, news.longitude)
-            if distance <= radius_meters:
-                breaking_news.append({
-                    'id': news.id,
-                    'title': news.title,
-                    'description': news.description,
-                    'category': news.category,
-                    'location': news.location_name,
-                    'source': news.source,
-                    'published_at': news.published_at,
-                    'is_breaking': news.is_breaking
-                })
+    news_query = NewsItem.query.filter_by(is_breaking=True)
+    
+    for news, _ in find_within(news_query, NewsItem, lat, long, radius_meters):
+        breaking_news.append({
+            'id': news.id,
+            'title': news.title,
+            'description': news.description,
+            'category': news.category,
+            'location': news.location_name,
+            'source': news.source,
+            'published_at': news.published_at,
+            'is_breaking': news.is_breaking
+        })
     
     return breaking_news
 
@@ -72,31 +106,33 @@ def match_opportunities(user, lat, long, radius_meters=5000):
     """Match user goals with nearby opportunities"""
     matched_opportunities = []
     user_goals = Goal.query.filter_by(user_id=user.id, is_completed=False).all()
-    opportunities = Opportunity.query.all()
+    if not user_goals:
+        return matched_opportunities
+    
+    # Distances are computed once, not once per goal
+    nearby = find_within(Opportunity.query, Opportunity, lat, long, radius_meters)
     
     for goal in user_goals:
-        for opp in opportunities:
-            distance = haversine(lat, long, opp.latitude, opp.longitude)
-            if distance <= radius_meters:
-                if is_goal_match(goal, opp):
-                    matched_opportunities.append({
-                        'opportunity': {
-                            'id': opp.id,
-                            'title': opp.title,
-                            'description': opp.description,
-                            'category': opp.category,
-                            'company': opp.company,
-                            'location': opp.location_name,
-                            'salary': opp.salary
-                        },
-                        'goal': {
-                            'id': goal.id,
-                            'title': goal.title,
-                            'description': goal.description
-                        },
-                        'match_score': calculate_match_score(goal, opp),
-                        'distance': distance
-                    })
+        for opp, distance in nearby:
+            if is_goal_match(goal, opp):
+                matched_opportunities.append({
+                    'opportunity': {
+                        'id': opp.id,
+                        'title': opp.title,
+                        'description': opp.description,
+                        'category': opp.category,
+                        'company': opp.company,
+                        'location': opp.location_name,
+                        'salary': opp.salary
+                    },
+                    'goal': {
+                        'id': goal.id,
+                        'title': goal.title,
+                        'description': goal.description
+                    },
+                    'match_score': calculate_match_score(goal, opp),
+                    'distance': distance
+                })
     
     return sorted(matched_opportunities, key=lambda x: x['match_score'], reverse=True)
 
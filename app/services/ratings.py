@@ -0,0 +1,150 @@
+"""
+Ratings Service
+Per-user rating aggregates (count, sum, average, star histogram) maintained
+on every Review insert, so showing, ranking or filtering by rating never
+scans Review.
+"""
+from datetime import datetime
+
+from sqlalchemy import case, cast, func, insert, select, update, Float
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+from app.models import Review, RatingAggregate, Service
+
+STARS = range(1, 6)
+
+_aggregates = RatingAggregate.__table__
+
+
+def _star_column(rating):
+    if rating not in STARS:
+        raise ValueError(f'Rating must be 1-5, got {rating!r}')
+    return f'stars_{rating}'
+
+
+def _add_review(connection, reviewee_id, role_rated, rating, now):
+    """
+    Fold one rating into the aggregate row, creating it if needed.
+
+    Runs on the flush's own connection, so the aggregate commits or rolls
+    back with the Review. The upsert is a single statement, so two first
+    reviews for the same user can't race each other into a duplicate key.
+    """
+    star = _star_column(rating)
+    bumped = {
+        'review_count': _aggregates.c.review_count + 1,
+        'rating_sum': _aggregates.c.rating_sum + rating,
+        'average': cast(_aggregates.c.rating_sum + rating, Float) / (_aggregates.c.review_count + 1),
+        star: _aggregates.c[star] + 1,
+        'updated_at': now
+    }
+    first = {
+        'reviewee_id': reviewee_id, 'role_rated': role_rated, 'review_count': 1,
+        'rating_sum': rating, 'average': float(rating), star: 1, 'updated_at': now
+    }
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        upsert = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(_aggregates).values(**first)
+        connection.execute(upsert.on_conflict_do_update(
+            index_elements=['reviewee_id', 'role_rated'], set_=bumped
+        ))
+        return
+
+    updated = connection.execute(update(_aggregates).where(
+        _aggregates.c.reviewee_id == reviewee_id, _aggregates.c.role_rated == role_rated
+    ).values(**bumped))
+    if updated.rowcount == 0:
+        connection.execute(insert(_aggregates).values(**first))
+
+
+def _remove_review(connection, reviewee_id, role_rated, rating, now):
+    star = _star_column(rating)
+    remaining = _aggregates.c.review_count - 1
+    connection.execute(update(_aggregates).where(
+        _aggregates.c.reviewee_id == reviewee_id, _aggregates.c.role_rated == role_rated
+    ).values(
+        review_count=remaining,
+        rating_sum=_aggregates.c.rating_sum - rating,
+        average=case((remaining > 0, cast(_aggregates.c.rating_sum - rating, Float) / remaining), else_=0.0),
+        updated_at=now,
+        **{star: _aggregates.c[star] - 1}
+    ))
+
+
+def _touch_services(connection, provider_id, now):
+    # Map delta sync only resends services whose updated_at moved
+    connection.execute(update(Service.__table__).where(
+        Service.__table__.c.provider_id == provider_id
+    ).values(updated_at=now))
+
+
+def _provider_averages():
+    return dict(db.session.execute(
+        select(_aggregates.c.reviewee_id, _aggregates.c.average).where(_aggregates.c.role_rated == 'provider')
+    ).all())
+
+
+def _on_review_inserted(mapper, connection, target):
+    now = datetime.utcnow()
+    _add_review(connection, target.reviewee_id, target.role_rated, target.rating, now)
+    if target.role_rated == 'provider':
+        _touch_services(connection, target.reviewee_id, now)
+
+
+def _on_review_deleted(mapper, connection, target):
+    now = datetime.utcnow()
+    _remove_review(connection, target.reviewee_id, target.role_rated, target.rating, now)
+    if target.role_rated == 'provider':
+        _touch_services(connection, target.reviewee_id, now)
+
+
+db.event.listen(Review, 'after_insert', _on_review_inserted)
+db.event.listen(Review, 'after_delete', _on_review_deleted)
+
+
+def rating_for(user_id, role_rated='provider'):
+    """A user's aggregate in one role, or None if nobody has rated them yet"""
+    return db.session.get(RatingAggregate, (user_id, role_rated))
+
+
+def top_rated(role_rated='provider', min_reviews=1, limit=10):
+    """Highest average first; ties go to the user with more reviews"""
+    return RatingAggregate.query.filter(
+        RatingAggregate.role_rated == role_rated,
+        RatingAggregate.review_count >= min_reviews
+    ).order_by(
+        RatingAggregate.average.desc(), RatingAggregate.review_count.desc()
+    ).limit(limit).all()
+
+
+def rebuild_rating_aggregates():
+    """Recompute every aggregate from Review in one grouped pass; returns the row count"""
+    now = datetime.utcnow()
+    grouped = select(
+        Review.reviewee_id,
+        Review.role_rated,
+        func.count(Review.id),
+        func.sum(Review.rating),
+        cast(func.sum(Review.rating), Float) / func.count(Review.id),
+        *[func.sum(case((Review.rating == stars, 1), else_=0)) for stars in STARS],
+        func.max(func.coalesce(Review.created_at, now))
+    ).group_by(Review.reviewee_id, Review.role_rated)
+
+    before = _provider_averages()
+    db.session.execute(_aggregates.delete())
+    db.session.execute(_aggregates.insert().from_select(
+        ['reviewee_id', 'role_rated', 'review_count', 'rating_sum', 'average',
+         *[f'stars_{stars}' for stars in STARS], 'updated_at'],
+        grouped
+    ))
+    after = _provider_averages()
+    changed = sorted(
+        provider_id for provider_id in before.keys() | after.keys()
+        if before.get(provider_id) != after.get(provider_id)
+    )
+    if changed:
+        db.session.execute(update(Service).where(Service.provider_id.in_(changed)).values(updated_at=now))
+    db.session.commit()
+    return RatingAggregate.query.count()
@@ -0,0 +1,137 @@
+"""
+Response Cache
+Remembers Skhokho's answers to prompts it has already seen with the same context,
+so repeated questions skip the model round-trip
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Answers go stale as the world changes; the context hash catches changes to
+# the user's own data, this catches everything else
+RESPONSE_TTL = int(os.environ.get('AI_CACHE_TTL', 600))
+MAX_CACHED_RESPONSES = int(os.environ.get('AI_CACHE_SIZE', 2048))
+
+# Keys live under this prefix in the shared store
+SHARED_PREFIX = 'skhokho:reply:'
+
+_SPACES = re.compile(r'\s+')
+_TRAILING = re.compile(r'[\s?!.,]+$')
+
+
+def normalize_prompt(text):
+    """Case, spacing and trailing punctuation don't change the question"""
+    return _TRAILING.sub('', _SPACES.sub(' ', (text or '').strip().lower()))
+
+
+def context_hash(context):
+    """Digest of the context block, ignoring indentation and line wrapping"""
+    return hashlib.sha256(_SPACES.sub(' ', (context or '').strip()).encode()).hexdigest()
+
+
+def cache_key(prompt, context='', model=''):
+    return hashlib.sha256(
+        '\x1f'.join((model, normalize_prompt(prompt), context_hash(context))).encode()
+    ).hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of model replies with a TTL, in front of an optional
+    shared store (anything with Redis-style get(key) and setex(key, ttl, value))
+    that lets every worker reuse an answer any one of them paid for.
+    """
+
+    def __init__(self, ttl=RESPONSE_TTL, max_entries=MAX_CACHED_RESPONSES, shared=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._counts['hits'] += 1
+                    return value
+                del self._entries[key]
+
+        value = self._shared_get(key)
+        with self._lock:
+            if value is None:
+                self._counts['misses'] += 1
+                return None
+            self._counts['shared_hits'] += 1
+            self._remember(key, value)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._counts['stores'] += 1
+            self._remember(key, value)
+        self._shared_set(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for name in self._counts:
+                self._counts[name] = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts, size=len(self._entries), max_entries=self.max_entries,
+                         ttl=self.ttl, shared=self.shared is not None)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['shared_hits']) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counts['evictions'] += 1
+
+    # A shared store that is down just means a local miss; answering still works
+
+    def _shared_get(self, key):
+        if self.shared is None:
+            return None
+        try:
+            value = self.shared.get(SHARED_PREFIX + key)
+        except Exception as e:
+            print(f"⚠️ Response cache unavailable: {e}", flush=True)
+            return None
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _shared_set(self, key, value):
+        if self.shared is None:
+            return
+        try:
+            self.shared.setex(SHARED_PREFIX + key, self.ttl, value)
+        except Exception as e:
+            print(f"⚠️ Response cache unavailable: {e}", flush=True)
+
+
+def _shared_store():
+    """Redis at AI_CACHE_URL when set and the redis package is installed"""
+    url = os.environ.get('AI_CACHE_URL')
+    if not url:
+        return None
+    try:
+        import redis
+    except ImportError:
+        print("⚠️ AI_CACHE_URL is set but redis is not installed; caching per worker only", flush=True)
+        return None
+    return redis.Redis.from_url(url, socket_timeout=0.2)
+
+
+response_cache = ResponseCache(shared=_shared_store())
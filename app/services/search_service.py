@@ -0,0 +1,193 @@
+"""
+Search Service
+Full-text search over service name, category and description: an FTS5 table
+on SQLite and a GIN-indexed tsvector on PostgreSQL, ranked, with prefix
+matching and local trade synonyms
+"""
+import re
+
+from sqlalchemy import select, text, func, literal_column, or_
+
+from app.extensions import db
+from app.models import Service
+
+SEARCH_LIMIT = 10
+
+# Slang and trade names people actually type, mapped to the words service
+# listings use. The first word is the category the term stands for.
+SYNONYMS = {
+    'sparky': ('electrical', 'electrician'),
+    'electrician': ('electrical',),
+    'plumber': ('plumbing',),
+    'geyser': ('plumbing',),
+    'mechanic': ('automotive', 'car'),
+    'panelbeater': ('automotive',),
+    'builder': ('construction', 'building'),
+    'bricklayer': ('construction',),
+    'carpenter': ('carpentry', 'woodwork'),
+    'painter': ('painting',),
+    'gardener': ('gardening', 'garden'),
+    'cleaner': ('cleaning',),
+    'domestic': ('cleaning',),
+    'braids': ('beauty', 'hair'),
+    'barber': ('beauty', 'hair'),
+    'hairdresser': ('beauty', 'hair'),
+    'tutor': ('education', 'tutoring'),
+    'locksmith': ('security', 'locks'),
+}
+
+# Filler that says nothing about the kind of service wanted
+STOPWORDS = {
+    'a', 'an', 'the', 'me', 'my', 'i', 'to', 'for', 'in', 'near', 'nearby',
+    'find', 'hire', 'need', 'want', 'get', 'some', 'someone', 'please', 'service', 'services',
+}
+
+# Name and category count for more than free-text description
+FTS5_WEIGHTS = (10.0, 5.0, 1.0)
+
+# The indexed expression; queries must use this exact text for PostgreSQL to pick the index
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+SQLITE_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS service_fts USING fts5("
+    "name, category, description, content='service', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    # External-content table: these triggers keep it in step with every write
+    # to service, including bulk UPDATE/DELETE statements the ORM never sees
+    "CREATE TRIGGER IF NOT EXISTS service_fts_insert AFTER INSERT ON service BEGIN "
+    "INSERT INTO service_fts(rowid, name, category, description) "
+    "VALUES (new.id, new.name, new.category, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS service_fts_delete AFTER DELETE ON service BEGIN "
+    "INSERT INTO service_fts(service_fts, rowid, name, category, description) "
+    "VALUES ('delete', old.id, old.name, old.category, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS service_fts_update AFTER UPDATE OF name, category, description ON service BEGIN "
+    "INSERT INTO service_fts(service_fts, rowid, name, category, description) "
+    "VALUES ('delete', old.id, old.name, old.category, old.description); "
+    "INSERT INTO service_fts(rowid, name, category, description) "
+    "VALUES (new.id, new.name, new.category, new.description); END",
+    "INSERT INTO service_fts(service_fts) VALUES ('rebuild')",
+)
+
+SQLITE_DROP_DDL = (
+    "DROP TRIGGER IF EXISTS service_fts_insert",
+    "DROP TRIGGER IF EXISTS service_fts_delete",
+    "DROP TRIGGER IF EXISTS service_fts_update",
+    "DROP TABLE IF EXISTS service_fts",
+)
+
+POSTGRES_INDEX_DDL = (
+    f"CREATE INDEX IF NOT EXISTS ix_service_search ON service USING GIN (({PG_SEARCH_VECTOR}))",
+)
+
+POSTGRES_DROP_DDL = (
+    "DROP INDEX IF EXISTS ix_service_search",
+)
+
+
+def search_terms(query):
+    """Lower-cased words of a query, minus filler, each with its synonyms"""
+    words = [word for word in re.findall(r'[a-z0-9]+', (query or '').lower()) if word not in STOPWORDS]
+    return [(word,) + SYNONYMS.get(word, ()) for word in words]
+
+
+def category_for(term):
+    """The category a single trade word stands for ('sparky' -> 'electrical')"""
+    word = (term or '').strip().lower()
+    return SYNONYMS.get(word, (word,))[0]
+
+
+def fts5_match(terms):
+    """FTS5 MATCH expression: any word (or synonym) as a prefix, so 'plumb' finds 'plumbing'"""
+    return ' OR '.join(
+        '(' + ' OR '.join(f'"{alternative}"*' for alternative in alternatives) + ')'
+        for alternatives in terms
+    )
+
+
+def ts_query(terms):
+    """to_tsquery() text with the same shape as fts5_match"""
+    return ' | '.join(
+        '(' + ' | '.join(f'{alternative}:*' for alternative in alternatives) + ')'
+        for alternatives in terms
+    )
+
+
+def _has_fts5_table():
+    return db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'service_fts'")
+    ).first() is not None
+
+
+def search_services(query, limit=SEARCH_LIMIT):
+    """
+    Services matching `query`, best match first.
+
+    Every word matches as a prefix and brings its synonyms along, so
+    "sparky" finds Electrical listings and "plumb" finds plumbers.
+    Rows matching more of the words, or matching in the name or
+    category rather than the description, rank higher.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite' and _has_fts5_table():
+        weights = ', '.join(str(weight) for weight in FTS5_WEIGHTS)
+        ranked = text(
+            'SELECT service.* FROM service_fts JOIN service ON service.id = service_fts.rowid '
+            f'WHERE service_fts MATCH :match ORDER BY bm25(service_fts, {weights}), service.id LIMIT :limit'
+        ).bindparams(match=fts5_match(terms), limit=limit)
+        return db.session.scalars(select(Service).from_statement(ranked)).all()
+
+    if dialect == 'postgresql':
+        vector = literal_column(PG_SEARCH_VECTOR)
+        tsquery = func.to_tsquery('english', ts_query(terms))
+        return Service.query.filter(vector.op('@@')(tsquery)).order_by(
+            func.ts_rank(vector, tsquery).desc(), Service.id
+        ).limit(limit).all()
+
+    # No full-text index available: unranked substring match, as before
+    words = [alternative for alternatives in terms for alternative in alternatives]
+    return Service.query.filter(or_(*(
+        column.ilike(f'%{word}%')
+        for word in words
+        for column in (Service.name, Service.category, Service.description)
+    ))).order_by(Service.id).limit(limit).all()
+
+
+def create_search_index(connection):
+    """Create (or repair) the full-text index for this connection's dialect and fill it"""
+    statements = {'sqlite': SQLITE_INDEX_DDL, 'postgresql': POSTGRES_INDEX_DDL}
+    for statement in statements.get(connection.dialect.name, ()):
+        connection.execute(text(statement))
+
+
+def drop_search_index(connection):
+    statements = {'sqlite': SQLITE_DROP_DDL, 'postgresql': POSTGRES_DROP_DDL}
+    for statement in statements.get(connection.dialect.name, ()):
+        connection.execute(text(statement))
+
+
+def rebuild_search_index():
+    """Recreate the index from scratch, e.g. after a migration rebuilt the service table"""
+    connection = db.session.connection()
+    drop_search_index(connection)
+    create_search_index(connection)
+    db.session.commit()
+
+
+def _on_table_created(target, connection, **kw):
+    create_search_index(connection)
+
+
+def _on_table_dropped(target, connection, **kw):
+    drop_search_index(connection)
+
+
+db.event.listen(Service.__table__, 'after_create', _on_table_created)
+db.event.listen(Service.__table__, 'before_drop', _on_table_dropped)
@@ -0,0 +1,76 @@
+"""
+Sync Service
+Since-cursors and tombstones for incremental LinkUp map syncs
+"""
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models import Service, CivicIssue, MapTombstone
+
+# Rows are stamped at flush but become visible at commit, so each delta
+# re-sends a short window before the cursor rather than risk missing one.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+# Tombstones older than this are pruned; older cursors get a full resync
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+_EPOCH = datetime(1970, 1, 1)
+
+_ENTITY_TYPES = {Service: 'service', CivicIssue: 'issue'}
+
+
+def make_cursor(moment):
+    """Opaque cursor string for a UTC timestamp (microseconds since epoch)"""
+    return str((moment - _EPOCH) // timedelta(microseconds=1))
+
+
+def parse_cursor(raw):
+    """Cursor string back to a UTC datetime, or None if missing/invalid"""
+    if not raw:
+        return None
+    try:
+        return _EPOCH + timedelta(microseconds=int(raw))
+    except (ValueError, OverflowError):
+        return None
+
+
+def changed_since(since, now):
+    """
+    Lower bound for a delta query, or None when the cursor is too old to
+    trust because the tombstones it would need have been pruned.
+    """
+    if since is None or since < now - TOMBSTONE_RETENTION:
+        return None
+    return since - SYNC_OVERLAP
+
+
+def deleted_since(changed_after):
+    """Ids deleted after `changed_after`, grouped as {'services': [...], 'issues': [...]}"""
+    rows = db.session.query(MapTombstone.entity_type, MapTombstone.entity_id).filter(
+        MapTombstone.deleted_at > changed_after
+    ).all()
+    deleted = {'services': [], 'issues': []}
+    for entity_type, entity_id in rows:
+        deleted['services' if entity_type == 'service' else 'issues'].append(entity_id)
+    return deleted
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones past the retention window; returns how many went"""
+    cutoff = (now or datetime.utcnow()) - TOMBSTONE_RETENTION
+    removed = MapTombstone.query.filter(MapTombstone.deleted_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def _write_tombstone(mapper, connection, target):
+    # Same connection, same transaction: a rolled-back delete leaves no tombstone
+    connection.execute(MapTombstone.__table__.insert().values(
+        entity_type=_ENTITY_TYPES[mapper.class_],
+        entity_id=target.id,
+        deleted_at=datetime.utcnow()
+    ))
+
+
+for _model in _ENTITY_TYPES:
+    db.event.listen(_model, 'after_delete', _write_tombstone)
@@ -0,0 +1,274 @@
+"""
+Task Queue
+Slow work (AI vision calls and what follows from them) handed to background
+workers, so the request that queued it returns a task id straight away
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, url_for
+from sqlalchemy import select, update
+
+from app.extensions import db
+from app.models import BackgroundTask
+
+# Idle workers look for queued tasks at least this often, so tasks queued
+# by other processes (which can't wake this one) still get picked up
+POLL_SECONDS = 2.0
+
+# How long one /api/tasks/<id>/stream connection waits for a result
+STREAM_SECONDS = 120
+
+# A running task whose worker hasn't finished it within the lease is assumed
+# lost (crashed process, killed thread) and queued again (TASK_LEASE_SECONDS)
+LEASE_SECONDS = 600
+
+# How often a process sweeps for tasks that outlived their lease
+SWEEP_SECONDS = 30
+
+# Registered task functions: name -> fn(payload, task) returning a JSON-able result
+TASKS = {}
+
+
+def task(name):
+    """Register a function as a background task under `name`"""
+    def register(fn):
+        TASKS[name] = fn
+        return fn
+    return register
+
+
+def _oldest_queued():
+    return db.session.execute(
+        select(BackgroundTask.id).where(BackgroundTask.status == 'queued')
+        .order_by(BackgroundTask.created_at, BackgroundTask.id).limit(1)
+    ).scalar()
+
+
+class DatabaseBroker:
+    """The task table is the queue: the oldest queued row is next"""
+
+    def push(self, task_id):
+        pass
+
+    def pop(self, timeout):
+        return _oldest_queued()
+
+
+class RedisBroker:
+    """
+    Task ids on a Redis (or compatible) list, so idle workers block on it
+    instead of polling the table. The row still holds the task's state, and
+    an idle pop falls back to the table, so an id lost between the list and
+    the claim (or never pushed) still runs.
+    """
+
+    def __init__(self, client, key='skhokho:tasks'):
+        self.client = client
+        self.key = key
+
+    def push(self, task_id):
+        self.client.rpush(self.key, task_id)
+
+    def pop(self, timeout):
+        item = self.client.blpop(self.key, timeout=max(1, int(timeout)))
+        if item is None:
+            return _oldest_queued()
+        task_id = item[1]
+        return task_id.decode() if isinstance(task_id, bytes) else task_id
+
+
+def make_broker(url):
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            print("⚠️ TASK_BROKER_URL is a Redis URL but redis is not installed; queueing in the database", flush=True)
+        else:
+            return RedisBroker(redis.Redis.from_url(url))
+    return DatabaseBroker()
+
+
+def _claim(task_id, now):
+    """Flip a queued task to running; False if another worker got there first"""
+    return db.session.execute(
+        update(BackgroundTask)
+        .where(BackgroundTask.id == task_id, BackgroundTask.status == 'queued')
+        .values(status='running', started_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def requeue_expired(lease, now=None):
+    """Put running tasks started more than `lease` ago back in the queue; returns their ids"""
+    now = now or datetime.utcnow()
+    return db.session.execute(
+        update(BackgroundTask)
+        .where(BackgroundTask.status == 'running', BackgroundTask.started_at < now - lease)
+        .values(status='queued', started_at=None)
+        .returning(BackgroundTask.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+
+class TaskQueue:
+    """Queues tasks and runs them on a per-process pool of worker threads"""
+
+    def __init__(self):
+        self.broker = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._finished = threading.Condition()
+        self._swept_at = None
+
+    def _broker(self):
+        if self.broker is None:
+            self.broker = make_broker(current_app.config.get('TASK_BROKER_URL'))
+        return self.broker
+
+    def enqueue(self, name, payload=None, user_id=None, parent_id=None):
+        """Store a task, hand it to the broker and return it; the caller's session is committed"""
+        if name not in TASKS:
+            raise ValueError(f'Unknown task {name}')
+        queued = BackgroundTask(name=name, payload=json.dumps(payload or {}), user_id=user_id, parent_id=parent_id)
+        db.session.add(queued)
+        db.session.commit()
+        self._broker().push(queued.id)
+        self._wake.set()
+        self._start_workers(current_app._get_current_object())
+        return queued
+
+    def requeue_stale(self):
+        """Requeue tasks whose lease ran out, at most once per SWEEP_SECONDS; returns their ids"""
+        if self._swept_at is not None and time.monotonic() - self._swept_at < SWEEP_SECONDS:
+            return []
+        self._swept_at = time.monotonic()
+        lease = timedelta(seconds=current_app.config.get('TASK_LEASE_SECONDS', LEASE_SECONDS))
+        requeued = requeue_expired(lease)
+        db.session.commit()
+        for task_id in requeued:
+            self._broker().push(task_id)
+        return requeued
+
+    def run_next(self, timeout=0):
+        """Claim and run one queued task in this thread; returns its id, or None if there was none"""
+        self.requeue_stale()
+        now = datetime.utcnow()
+        task_id = self._broker().pop(timeout)
+        if task_id is None or not _claim(task_id, now):
+            db.session.rollback()
+            return None
+        db.session.commit()
+
+        claimed = db.session.get(BackgroundTask, task_id)
+        try:
+            result = TASKS[claimed.name](json.loads(claimed.payload), claimed)
+            outcome = {'status': 'done', 'result': json.dumps(result)}
+        except Exception as e:
+            print(f"⚠️ Task {claimed.name} failed: {e}", flush=True)
+            db.session.rollback()
+            outcome = {'status': 'failed', 'error': str(e)}
+        # Guarded on this claim: if the lease ran out the task was requeued
+        # and its outcome now belongs to whichever worker took it next
+        db.session.execute(
+            update(BackgroundTask)
+            .where(BackgroundTask.id == task_id, BackgroundTask.status == 'running',
+                   BackgroundTask.started_at == now)
+            .values(finished_at=datetime.utcnow(), **outcome)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        with self._finished:
+            self._finished.notify_all()
+        return task_id
+
+    def run_pending(self, limit=None):
+        """Run queued tasks in this thread until none are left (or `limit` have run); returns how many ran"""
+        ran = 0
+        while limit is None or ran < limit:
+            if self.run_next() is None:
+                break
+            ran += 1
+        return ran
+
+    def wait(self, task_id, timeout):
+        """The task once it has finished, or as it stands after `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            current = db.session.get(BackgroundTask, task_id, populate_existing=True)
+            remaining = deadline - time.monotonic()
+            if current is None or current.status in ('done', 'failed') or remaining <= 0:
+                return current
+            db.session.rollback()  # let the next read see other workers' commits
+            with self._finished:
+                self._finished.wait(min(POLL_SECONDS, remaining))
+
+    def _start_workers(self, app):
+        count = app.config.get('TASK_WORKERS', 0)
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            for _ in range(count - len(self._workers)):
+                worker = threading.Thread(target=self._work, args=(app,), daemon=True, name='skhokho-task-worker')
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    ran = self.run_next(timeout=POLL_SECONDS)
+                except Exception as e:
+                    print(f"⚠️ Task worker error: {e}", flush=True)
+                    ran = None
+                finally:
+                    db.session.remove()
+            if ran is None:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+
+queue = TaskQueue()
+
+
+def serialize(background_task):
+    return {
+        'id': background_task.id,
+        'name': background_task.name,
+        'status': background_task.status,
+        'result': json.loads(background_task.result) if background_task.result else None,
+        'error': background_task.error,
+        'created_at': background_task.created_at.isoformat() if background_task.created_at else None,
+        'finished_at': background_task.finished_at.isoformat() if background_task.finished_at else None
+    }
+
+
+def accepted(background_task, **extra):
+    """202 body telling a client where to poll (or stream) a queued task's result"""
+    return dict(extra, task_id=background_task.id, status=background_task.status,
+                status_url=url_for('api.task_status', task_id=background_task.id),
+                stream_url=url_for('api.task_stream', task_id=background_task.id))
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream_result(task_id, duration=STREAM_SECONDS):
+    """SSE frames: a keep-alive each poll until the task finishes, then one 'result' event"""
+    deadline = time.monotonic() + duration
+    yield 'retry: 3000\n\n'
+    while True:
+        current = queue.wait(task_id, min(POLL_SECONDS * 5, max(deadline - time.monotonic(), 0)))
+        if current is None:
+            return
+        if current.status in ('done', 'failed'):
+            yield _sse('result', serialize(current))
+            return
+        db.session.close()
+        if time.monotonic() >= deadline:
+            return
+        yield ': keep-alive\n\n'
@@ -0,0 +1,296 @@
+"""
+Tile Service
+Mapbox Vector Tiles (MVT) of services and civic issues, cached on disk per tile
+"""
+import math
+import os
+import shutil
+import struct
+import threading
+import time
+import uuid
+
+from flask import current_app
+
+from app.extensions import db
+from app.models import Service, CivicIssue
+from app.services.geo_service import tile_bounds, tile_for, viewport_filter
+
+# Tile coordinate resolution, per the MVT spec default
+EXTENT = 4096
+
+# Highest zoom served (and cached) by the tile endpoint
+MAX_ZOOM = 18
+
+MVT_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+# Cached tiles older than this are rebuilt, which bounds how long a tile
+# rebuilt by one worker mid-invalidation by another can stay stale
+MAX_AGE = 300
+
+
+# --- Minimal protobuf writer (only what vector_tile.proto needs) ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _uint_field(field, value):
+    return _key(field, 0) + _varint(value)
+
+
+def _bytes_field(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed_field(field, values):
+    return _bytes_field(field, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    """vector_tile.Tile.Value"""
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        return _uint_field(6, _zigzag(value))  # sint_value
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack('<d', value)  # double_value
+    return _bytes_field(1, str(value).encode('utf-8'))  # string_value
+
+
+def encode_layer(name, features):
+    """
+    Encode one MVT layer of point features.
+
+    `features` is a list of (id, (px, py), properties) with pixel
+    coordinates already in the 0..EXTENT tile space.
+    """
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded_features = []
+
+    for feature_id, (px, py), properties in features:
+        tags = []
+        for prop, value in properties.items():
+            if value is None:
+                continue
+            if prop not in key_index:
+                key_index[prop] = len(keys)
+                keys.append(prop)
+            value_key = (type(value).__name__, value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags.extend([key_index[prop], value_index[value_key]])
+
+        # MoveTo(1) once, then the zigzagged point
+        geometry = [(1 & 0x7) | (1 << 3), _zigzag(px), _zigzag(py)]
+        feature = (
+            _uint_field(1, feature_id)
+            + _packed_field(2, tags)
+            + _uint_field(3, 1)  # GeomType.POINT
+            + _packed_field(4, geometry)
+        )
+        encoded_features.append(_bytes_field(2, feature))
+
+    layer = (
+        _uint_field(15, 2)  # version
+        + _bytes_field(1, name.encode('utf-8'))
+        + b''.join(encoded_features)
+        + b''.join(_bytes_field(3, key.encode('utf-8')) for key in keys)
+        + b''.join(_bytes_field(4, _encode_value(value)) for value in values)
+        + _uint_field(5, EXTENT)
+    )
+    return _bytes_field(3, layer)
+
+
+# --- Tile building ---
+
+def _to_tile_pixels(lat, lng, z, x, y):
+    n = 2 ** z
+    merc_x = (lng + 180.0) / 360.0 * n
+    merc_y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return int(round((merc_x - x) * EXTENT)), int(round((merc_y - y) * EXTENT))
+
+
+def _rows_in_tile(model, columns, z, x, y):
+    bounds = tile_bounds(z, x, y)
+    south, west, north, east = bounds
+    return db.session.query(*columns).filter(
+        viewport_filter(model, bounds, z, db.engine.dialect.name),
+        # Half-open on the shared edges so a point lands in exactly one tile
+        model.longitude < east,
+        model.latitude > south
+    ).all()
+
+
+def build_tile(z, x, y):
+    """Encode the services and issues layers for one tile"""
+    services = _rows_in_tile(Service, (
+        Service.id, Service.latitude, Service.longitude,
+        Service.name, Service.category, Service.price
+    ), z, x, y)
+    issues = _rows_in_tile(CivicIssue, (
+        CivicIssue.id, CivicIssue.latitude, CivicIssue.longitude,
+        CivicIssue.title, CivicIssue.category, CivicIssue.ai_risk_score, CivicIssue.status
+    ), z, x, y)
+
+    tile = b''
+    if services:
+        tile += encode_layer('services', [
+            (sid, _to_tile_pixels(lat, lng, z, x, y),
+             {'id': sid, 'title': name, 'category': category, 'price': float(price)})
+            for sid, lat, lng, name, category, price in services
+        ])
+    if issues:
+        tile += encode_layer('issues', [
+            (iid, _to_tile_pixels(lat, lng, z, x, y),
+             {'id': iid, 'title': title, 'category': category, 'severity': severity, 'status': status})
+            for iid, lat, lng, title, category, severity, status in issues
+        ])
+    return tile
+
+
+# --- Disk cache ---
+
+def cache_dir():
+    return current_app.config.get('TILE_CACHE_DIR') or os.path.join(current_app.instance_path, 'tiles')
+
+
+def _generation_file(root):
+    return os.path.join(root, 'generation')
+
+
+def generation(root):
+    """Stamp of the current cache generation; tiles live under <root>/<generation>/"""
+    try:
+        with open(_generation_file(root)) as f:
+            return f.read().strip() or '0'
+    except FileNotFoundError:
+        return '0'
+
+
+def new_generation(root):
+    """Start an empty generation, so every worker stops reading the old tiles at once"""
+    if not os.path.isdir(root):
+        return  # nothing cached yet, nothing to invalidate
+    tmp_path = f'{_generation_file(root)}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, _generation_file(root))
+
+
+def _tile_path(base, z, x, y):
+    return os.path.join(base, str(z), str(x), f'{y}.mvt')
+
+
+def _is_fresh(path):
+    max_age = current_app.config.get('TILE_MAX_AGE') or MAX_AGE
+    try:
+        return time.time() - os.path.getmtime(path) <= max_age
+    except FileNotFoundError:
+        return False
+
+
+def get_tile_path(z, x, y):
+    """Path to the cached tile on disk, building it first if it's missing or too old"""
+    root = cache_dir()
+    path = _tile_path(os.path.join(root, generation(root)), z, x, y)
+    if not _is_fresh(path):
+        tile = build_tile(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so a concurrent reader never sees half a tile
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(tile)
+        os.replace(tmp_path, path)
+    return path
+
+
+def invalidate_point(root, lat, lng):
+    """Delete every cached tile, at every zoom, that contains this point"""
+    base = os.path.join(root, generation(root))
+    for z in range(MAX_ZOOM + 1):
+        x, y = tile_for(lat, lng, z)
+        try:
+            os.remove(_tile_path(base, z, x, y))
+        except FileNotFoundError:
+            pass
+
+
+# Points touched in a flush are only purged from disk once the commit lands,
+# so a tile rebuilt in between can't capture uncommitted rows.
+
+def _remember_point(mapper, connection, target):
+    session = db.inspect(target).session
+    if session is None:
+        return
+    points = session.info.setdefault('dirty_tile_points', set())
+    state = db.inspect(target)
+    old_lat = state.attrs.latitude.history.deleted
+    old_lng = state.attrs.longitude.history.deleted
+    if old_lat or old_lng:
+        points.add((old_lat[0] if old_lat else target.latitude,
+                    old_lng[0] if old_lng else target.longitude))
+    if target.latitude is not None and target.longitude is not None:
+        points.add((target.latitude, target.longitude))
+
+
+def _purge_after_commit(session):
+    points = session.info.pop('dirty_tile_points', None)
+    if not points:
+        return
+    root = cache_dir()
+    for lat, lng in points:
+        invalidate_point(root, lat, lng)
+
+
+def _forget_after_rollback(session):
+    session.info.pop('dirty_tile_points', None)
+
+
+def prune_generations(root):
+    """Delete every cached generation except the current one; returns how many went"""
+    if not os.path.isdir(root):
+        return 0
+    current = generation(root)
+    pruned = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name != current and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            pruned += 1
+    return pruned
+
+
+def _on_table_recreated(target, connection, **kw):
+    # Retired generations stay on disk until `manage.py prune_tiles`; deleting
+    # them here would pull tiles out from under other workers mid-request
+    new_generation(cache_dir())
+
+
+for _model in (Service, CivicIssue):
+    db.event.listen(_model, 'after_insert', _remember_point)
+    db.event.listen(_model, 'after_update', _remember_point)
+    db.event.listen(_model, 'after_delete', _remember_point)
+    db.event.listen(_model.__table__, 'after_create', _on_table_recreated)
+    db.event.listen(_model.__table__, 'after_drop', _on_table_recreated)
+
+db.event.listen(db.session, 'after_commit', _purge_after_commit)
+db.event.listen(db.session, 'after_rollback', _forget_after_rollback)
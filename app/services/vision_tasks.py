@@ -0,0 +1,89 @@
+"""
+Vision Tasks
+Background tasks for AI image analysis and the CivicNerve reports that follow a danger sighting
+"""
+import os
+
+from flask import current_app
+from PIL import Image
+
+from app.extensions import db
+from app.models import CivicIssue
+from app.services.ai_service import get_skhokho_response
+from app.services.task_queue import task, queue
+
+DANGER_KEYWORDS = ['DANGER', 'HAZARD', 'WARNING', 'UNSAFE', 'FIRE', 'MANHOLE']
+
+# Where a scan without a GPS fix is reported (Soweto)
+DEFAULT_LOCATION = (-26.2309, 27.8596)
+
+
+def upload_path(image_url):
+    """Filesystem path of a /static/uploads/... URL"""
+    return os.path.join(current_app.root_path, image_url.lstrip('/'))
+
+
+def queue_analysis(image_url, user_id=None, message='', context='', detect_danger=False,
+                   latitude=None, longitude=None):
+    """Queue a vision.analyze task for an image already saved under /static/uploads"""
+    return queue.enqueue('vision.analyze', {
+        'image_url': image_url,
+        'message': message,
+        'context': context,
+        'detect_danger': detect_danger,
+        'latitude': latitude,
+        'longitude': longitude
+    }, user_id=user_id)
+
+
+def is_danger(analysis):
+    return any(keyword in analysis.upper() for keyword in DANGER_KEYWORDS)
+
+
+@task('vision.analyze')
+def analyze_upload(payload, background_task):
+    """
+    Describe an uploaded image. With detect_danger set, a hazardous scene
+    queues a civic.report_danger task rather than reporting inline.
+    """
+    with Image.open(upload_path(payload['image_url'])) as image:
+        image.load()
+        analysis = get_skhokho_response(payload.get('message', ''), payload.get('context', ''), image=image)
+
+    result = {'analysis': analysis, 'image_url': payload['image_url']}
+    if payload.get('detect_danger'):
+        result['is_danger'] = is_danger(analysis)
+        if result['is_danger'] and background_task.user_id is not None:
+            report = queue.enqueue('civic.report_danger', {
+                'analysis': analysis,
+                'image_url': payload['image_url'],
+                'latitude': payload.get('latitude'),
+                'longitude': payload.get('longitude')
+            }, user_id=background_task.user_id, parent_id=background_task.id)
+            result['report_task_id'] = report.id
+            result['urgent_warning'] = "⚠️ DANGER DETECTED! Civic report being filed. Nearby users alerted."
+    return result
+
+
+@task('civic.report_danger')
+def report_danger(payload, background_task):
+    """File a CivicNerve issue for a danger spotted by a Macalaa scan"""
+    latitude = payload.get('latitude')
+    longitude = payload.get('longitude')
+    if latitude is None or longitude is None:
+        latitude, longitude = DEFAULT_LOCATION
+
+    issue = CivicIssue(
+        title="⚠️ DANGER DETECTED by Macalaa",
+        description=f"Automatic danger detection:\n\n{payload['analysis']}",
+        category='Hazard',
+        latitude=float(latitude),
+        longitude=float(longitude),
+        ai_risk_score=95,  # High severity for dangers
+        status='Reported',
+        image_url=payload.get('image_url'),
+        reporter_id=background_task.user_id
+    )
+    db.session.add(issue)
+    db.session.commit()
+    return {'civic_issue_id': issue.id}
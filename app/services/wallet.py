@@ -4,15 +4,120 @@ Handles all money movement across the Skhokho platform
 """
 from app.extensions import db
 from app.models import User, Transaction
-from datetime import datetime
+from app.services import ledger
+from app.services.money import Money, Cents
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, case, or_, literal, bindparam, tuple_
 from sqlalchemy.exc import SQLAlchemyError
 
 
+# Balances are only ever changed by a single conditional UPDATE evaluated in
+# the database, so concurrent workers can't overwrite each other's writes.
+# A guarded UPDATE that matches no row means the user is missing or short.
+
+def _apply_delta(user_id: int, delta: Money):
+    """
+    Add `delta` to a wallet in one statement, refusing to go below zero.
+    Returns the new balance, or None if no row was updated.
+    """
+    stmt = update(User).where(User.id == user_id)
+    if delta < 0:
+        stmt = stmt.where(User.wallet_balance >= -delta)
+    stmt = stmt.values(wallet_balance=User.wallet_balance + delta).returning(User.wallet_balance)
+    return db.session.execute(stmt).scalar_one_or_none()
+
+
+def _apply_credits(credits: dict):
+    """Add {user_id: amount} to many wallets with one executemany UPDATE"""
+    user_table = User.__table__
+    db.session.execute(
+        update(user_table)
+        .where(user_table.c.id == bindparam('recipient_id'))
+        .values(wallet_balance=user_table.c.wallet_balance + bindparam('credit', type_=Cents)),
+        [{'recipient_id': user_id, 'credit': amount} for user_id, amount in sorted(credits.items())]
+    )
+
+
+def _insufficient_funds(user_id: int) -> dict:
+    """Explain why a guarded debit matched no row"""
+    balance = db.session.query(User.wallet_balance).filter(User.id == user_id).first()
+    if balance is None:
+        return {"success": False, "message": "User not found"}
+    return {"success": False, "message": f"Insufficient funds. Balance: R{balance[0]:.2f}"}
+
+
+# Transaction history is paged by keyset on (timestamp, id), newest first, so
+# page N costs the same index range scan as page 1 (no OFFSET). Rows without a
+# timestamp count as stamped at _EPOCH: they come last, by id.
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Rows fetched per round-trip while streaming a statement
+STATEMENT_BATCH = 1000
+
+
+def history_cursor(transaction) -> str:
+    """Opaque cursor pointing just past `transaction`"""
+    micros = ((transaction.timestamp or _EPOCH) - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}_{transaction.id}"
+
+
+def parse_history_cursor(raw):
+    """Cursor string back to (timestamp, id), or None if missing/invalid"""
+    try:
+        micros, transaction_id = raw.split('_')
+        return _EPOCH + timedelta(microseconds=int(micros)), int(transaction_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def transaction_page(user_id: int, limit: int = 10, before: str = None):
+    """
+    One page of a user's history, newest first.
+    Returns (transactions, next_cursor); next_cursor is None on the last page.
+    """
+    query = Transaction.query.filter(Transaction.user_id == user_id)
+    position = parse_history_cursor(before)
+    undated_only = position is not None and position[0] <= _EPOCH
+
+    rows = []
+    if not undated_only:
+        dated = query.filter(Transaction.timestamp.isnot(None))
+        if position:
+            dated = dated.filter(tuple_(Transaction.timestamp, Transaction.id) < position)
+        rows = dated.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        undated = query.filter(Transaction.timestamp.is_(None))
+        if undated_only:
+            undated = undated.filter(Transaction.id < position[1])
+        rows += undated.order_by(Transaction.id.desc()).limit(limit + 1 - len(rows)).all()
+    transactions = rows[:limit]
+    next_cursor = history_cursor(transactions[-1]) if len(rows) > limit else None
+    return transactions, next_cursor
+
+
+def iter_statement(user_id: int, start: datetime = None, end: datetime = None):
+    """
+    Stream a user's transactions oldest first through a server-side cursor,
+    STATEMENT_BATCH rows at a time, so long statements never sit in memory.
+    """
+    stmt = select(
+        Transaction.id, Transaction.timestamp, Transaction.transaction_type,
+        Transaction.description, Transaction.amount
+    ).where(Transaction.user_id == user_id)
+    if start:
+        stmt = stmt.where(Transaction.timestamp >= start)
+    if end:
+        stmt = stmt.where(Transaction.timestamp < end)
+    stmt = stmt.order_by(Transaction.timestamp, Transaction.id).execution_options(yield_per=STATEMENT_BATCH)
+    yield from db.session.execute(stmt)
+
+
 class WalletService:
     """Service for managing user wallets and transactions"""
     
     @staticmethod
-    def deposit(user_id: int, amount: float, description: str = "Deposit") -> dict:
+    def deposit(user_id: int, amount: Money | float, description: str = "Deposit") -> dict:
         """
         Add money to a user's wallet
         
@@ -24,17 +129,16 @@ class WalletService:
         Returns:
             dict with success status and message
         """
+        amount = Money.coerce(amount)
         if amount <= 0:
             return {"success": False, "message": "Amount must be positive"}
         
         try:
-            user = db.session.get(User, user_id)
-            if not user:
+            new_balance = _apply_delta(user_id, amount)
+            if new_balance is None:
+                db.session.rollback()
                 return {"success": False, "message": "User not found"}
             
-            # Update balance
-            user.wallet_balance += amount
-            
             # Create transaction record
             transaction = Transaction(
                 user_id=user_id,
@@ -43,19 +147,23 @@ class WalletService:
                 description=description
             )
             db.session.add(transaction)
+            ledger.record("Deposit", [
+                (ledger.EXTERNAL, -amount),
+                (ledger.wallet_account(user_id), amount)
+            ], description)
             db.session.commit()
             
             return {
                 "success": True,
                 "message": f"Deposited R{amount:.2f}",
-                "new_balance": user.wallet_balance
+                "new_balance": new_balance
             }
         except SQLAlchemyError as e:
             db.session.rollback()
             return {"success": False, "message": f"Database error: {str(e)}"}
     
     @staticmethod
-    def withdraw(user_id: int, amount: float, description: str = "Withdrawal") -> dict:
+    def withdraw(user_id: int, amount: Money | float, description: str = "Withdrawal") -> dict:
         """
         Withdraw money from a user's wallet
         
@@ -67,23 +175,16 @@ class WalletService:
         Returns:
             dict with success status and message
         """
+        amount = Money.coerce(amount)
         if amount <= 0:
             return {"success": False, "message": "Amount must be positive"}
         
         try:
-            user = db.session.get(User, user_id)
-            if not user:
-                return {"success": False, "message": "User not found"}
-            
-            # Check sufficient balance
-            if user.wallet_balance < amount:
-                return {
-                    "success": False,
-                    "message": f"Insufficient funds. Balance: R{user.wallet_balance:.2f}"
-                }
-            
-            # Update balance
-            user.wallet_balance -= amount
+            # Balance check and debit happen in the same UPDATE
+            new_balance = _apply_delta(user_id, -amount)
+            if new_balance is None:
+                db.session.rollback()
+                return _insufficient_funds(user_id)
             
             # Create transaction record
             transaction = Transaction(
@@ -93,19 +194,23 @@ class WalletService:
                 description=description
             )
             db.session.add(transaction)
+            ledger.record("Withdrawal", [
+                (ledger.wallet_account(user_id), -amount),
+                (ledger.EXTERNAL, amount)
+            ], description)
             db.session.commit()
             
             return {
                 "success": True,
                 "message": f"Withdrew R{amount:.2f}",
-                "new_balance": user.wallet_balance
+                "new_balance": new_balance
             }
         except SQLAlchemyError as e:
             db.session.rollback()
             return {"success": False, "message": f"Database error: {str(e)}"}
     
     @staticmethod
-    def transfer(from_id: int, to_id: int, amount: float, description: str = "Transfer") -> dict:
+    def transfer(from_id: int, to_id: int, amount: Money | float, description: str = "Transfer") -> dict:
         """
         Transfer money between two users
         
@@ -118,6 +223,7 @@ class WalletService:
         Returns:
             dict with success status and message
         """
+        amount = Money.coerce(amount)
         if amount <= 0:
             return {"success": False, "message": "Amount must be positive"}
         
@@ -125,24 +231,37 @@ class WalletService:
             return {"success": False, "message": "Cannot transfer to yourself"}
         
         try:
-            sender = db.session.get(User, from_id)
-            recipient = db.session.get(User, to_id)
-            
-            if not sender:
-                return {"success": False, "message": "Sender not found"}
-            if not recipient:
-                return {"success": False, "message": "Recipient not found"}
-            
-            # Check sufficient balance
-            if sender.wallet_balance < amount:
+            # Debit and credit both rows in one UPDATE; the sender's row only
+            # matches if it can cover the amount, so anything short of two
+            # updated rows means the transfer must not happen.
+            rows = db.session.execute(
+                update(User)
+                .where(
+                    User.id.in_((from_id, to_id)),
+                    or_(User.id != from_id, User.wallet_balance >= amount)
+                )
+                .values(wallet_balance=User.wallet_balance + case(
+                    (User.id == from_id, literal(-amount, Cents)), else_=literal(amount, Cents)
+                ))
+                .returning(User.id, User.username, User.wallet_balance)
+            ).all()
+            
+            if len(rows) != 2:
+                db.session.rollback()
+                users = dict(db.session.query(User.id, User.wallet_balance).filter(
+                    User.id.in_((from_id, to_id))
+                ).all())
+                if from_id not in users:
+                    return {"success": False, "message": "Sender not found"}
+                if to_id not in users:
+                    return {"success": False, "message": "Recipient not found"}
                 return {
                     "success": False,
-                    "message": f"Insufficient funds. Balance: R{sender.wallet_balance:.2f}"
+                    "message": f"Insufficient funds. Balance: R{users[from_id]:.2f}"
                 }
             
-            # Perform transfer
-            sender.wallet_balance -= amount
-            recipient.wallet_balance += amount
+            updated = {row.id: row for row in rows}
+            sender, recipient = updated[from_id], updated[to_id]
             
             # Create transaction records for both users
             sender_transaction = Transaction(
@@ -163,6 +282,10 @@ class WalletService:
             
             db.session.add(sender_transaction)
             db.session.add(recipient_transaction)
+            ledger.record("Transfer", [
+                (ledger.wallet_account(from_id), -amount),
+                (ledger.wallet_account(to_id), amount)
+            ], description)
             db.session.commit()
             
             return {
@@ -175,6 +298,147 @@ class WalletService:
             db.session.rollback()
             return {"success": False, "message": f"Database error: {str(e)}"}
     
+    @staticmethod
+    def transfer_many(from_id: int, payouts: list, description: str = "Payout") -> dict:
+        """
+        Pay many users from one wallet in a single transaction (payroll, rewards)
+        
+        Either every payout lands or none does. Rows are locked in id order
+        so concurrent batches over overlapping users can't deadlock.
+        
+        Args:
+            from_id: Payer's user ID
+            payouts: List of (to_id, amount, description) tuples
+            description: Used for payouts whose own description is empty
+        
+        Returns:
+            dict with success status and message
+        """
+        if not payouts:
+            return {"success": False, "message": "No payouts given"}
+        
+        payouts = [(to_id, Money.coerce(amount), desc or description) for to_id, amount, desc in payouts]
+        if any(amount <= 0 for _, amount, _ in payouts):
+            return {"success": False, "message": "Amount must be positive"}
+        if any(to_id == from_id for to_id, _, _ in payouts):
+            return {"success": False, "message": "Cannot transfer to yourself"}
+        
+        total = sum(amount for _, amount, _ in payouts)
+        credits = {}
+        for to_id, amount, _ in payouts:
+            credits[to_id] = credits.get(to_id, Money(0)) + amount
+        
+        try:
+            # Lock every row involved, lowest id first (a no-op on SQLite,
+            # which serialises writers anyway)
+            usernames = dict(db.session.execute(
+                select(User.id, User.username)
+                .where(User.id.in_([from_id, *credits]))
+                .order_by(User.id)
+                .with_for_update()
+            ).all())
+            if from_id not in usernames:
+                db.session.rollback()
+                return {"success": False, "message": "Sender not found"}
+            missing = sorted(set(credits) - set(usernames))
+            if missing:
+                db.session.rollback()
+                return {"success": False, "message": f"Recipient not found: {missing[0]}"}
+            
+            # Funds are checked once, for the whole batch
+            sender_balance = _apply_delta(from_id, -total)
+            if sender_balance is None:
+                db.session.rollback()
+                return _insufficient_funds(from_id)
+            
+            # One executemany for the credits, one bulk insert for the history
+            _apply_credits(credits)
+            
+            sender_name = usernames[from_id]
+            history = []
+            for to_id, amount, desc in payouts:
+                history.append({
+                    'user_id': from_id, 'amount': -amount, 'transaction_type': "Payment",
+                    'description': f"{desc} to {usernames[to_id]}", 'related_user_id': to_id
+                })
+                history.append({
+                    'user_id': to_id, 'amount': amount, 'transaction_type': "Earning",
+                    'description': f"{desc} from {sender_name}", 'related_user_id': from_id
+                })
+            db.session.execute(insert(Transaction), history)
+            
+            ledger.record("Transfer", [(ledger.wallet_account(from_id), -total)] + [
+                (ledger.wallet_account(to_id), amount) for to_id, amount, _ in payouts
+            ], description)
+            db.session.commit()
+            
+            return {
+                "success": True,
+                "message": f"Paid R{total:.2f} to {len(credits)} recipients",
+                "count": len(payouts),
+                "total": total,
+                "sender_balance": sender_balance
+            }
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"success": False, "message": f"Database error: {str(e)}"}
+    
+    @staticmethod
+    def reward(user_id: int, amount: Money | float, points: int = 0, reason: str = "Reward") -> dict:
+        """
+        Pay a platform reward (credits plus optional reputation points)
+        
+        Args:
+            user_id: The user's ID
+            amount: Credits to award (must be positive)
+            points: Reputation points to add alongside
+            reason: Reason for the reward
+            
+        Returns:
+            dict with success status and message
+        """
+        amount = Money.coerce(amount)
+        if amount <= 0:
+            return {"success": False, "message": "Amount must be positive"}
+        
+        try:
+            row = db.session.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(
+                    wallet_balance=User.wallet_balance + amount,
+                    reputation_points=User.reputation_points + points
+                )
+                .returning(User.wallet_balance, User.reputation_points)
+            ).first()
+            
+            if row is None:
+                db.session.rollback()
+                return {"success": False, "message": "User not found"}
+            
+            transaction = Transaction(
+                user_id=user_id,
+                amount=amount,
+                transaction_type="Reward",
+                description=reason
+            )
+            db.session.add(transaction)
+            ledger.record("Reward", [
+                (ledger.REWARDS, -amount),
+                (ledger.wallet_account(user_id), amount)
+            ], reason)
+            db.session.commit()
+            
+            return {
+                "success": True,
+                "message": f"Rewarded R{amount:.2f} for {reason}",
+                "new_balance": row.wallet_balance,
+                "total_reputation": row.reputation_points
+            }
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"success": False, "message": f"Database error: {str(e)}"}
+    
     @staticmethod
     def get_balance(user_id: int) -> dict:
         """Get user's current wallet balance"""
@@ -192,23 +456,21 @@ class WalletService:
             return {"success": False, "message": f"Database error: {str(e)}"}
     
     @staticmethod
-    def get_transaction_history(user_id: int, limit: int = 10) -> dict:
-        """Get user's recent transaction history"""
+    def get_transaction_history(user_id: int, limit: int = 10, before: str = None) -> dict:
+        """Get a page of the user's transaction history (pass next_cursor as `before` for the next)"""
         try:
-            transactions = Transaction.query.filter_by(user_id=user_id)\
-                .order_by(Transaction.timestamp.desc())\
-                .limit(limit)\
-                .all()
+            transactions, next_cursor = transaction_page(user_id, limit, before)
             
             return {
                 "success": True,
+                "next_cursor": next_cursor,
                 "transactions": [
                     {
                         "id": t.id,
                         "amount": t.amount,
                         "type": t.transaction_type,
                         "description": t.description,
-                        "timestamp": t.timestamp.isoformat()
+                        "timestamp": t.timestamp.isoformat() if t.timestamp else None
                     }
                     for t in transactions
                 ]
@@ -217,7 +479,7 @@ class WalletService:
             return {"success": False, "message": f"Database error: {str(e)}"}
     
     @staticmethod
-    def convert_points_to_money(user_id: int, points: int, conversion_rate: float = 0.1) -> dict:
+    def convert_points_to_money(user_id: int, points: int, conversion_rate: Money | float = 0.1) -> dict:
         """
         Convert reputation points to money
         
@@ -233,23 +495,30 @@ class WalletService:
             return {"success": False, "message": "Points must be positive"}
         
         try:
-            user = db.session.get(User, user_id)
-            if not user:
-                return {"success": False, "message": "User not found"}
-            
-            if user.reputation_points < points:
+            # Convert points to money (exact: whole points times whole cents)
+            amount = Money.coerce(conversion_rate) * points
+            
+            # Spend points and credit balance in one guarded UPDATE
+            row = db.session.execute(
+                update(User)
+                .where(User.id == user_id, User.reputation_points >= points)
+                .values(
+                    reputation_points=User.reputation_points - points,
+                    wallet_balance=User.wallet_balance + amount
+                )
+                .returning(User.wallet_balance, User.reputation_points)
+            ).first()
+            
+            if row is None:
+                db.session.rollback()
+                available = db.session.query(User.reputation_points).filter(User.id == user_id).first()
+                if available is None:
+                    return {"success": False, "message": "User not found"}
                 return {
                     "success": False,
-                    "message": f"Insufficient points. Available: {user.reputation_points}"
+                    "message": f"Insufficient points. Available: {available[0]}"
                 }
             
-            # Convert points to money
-            amount = points * conversion_rate
-            
-            # Update user's balance and points
-            user.reputation_points -= points
-            user.wallet_balance += amount
-            
             # Create transaction record
             transaction = Transaction(
                 user_id=user_id,
@@ -258,20 +527,24 @@ class WalletService:
                 description=f"Converted {points} points to R{amount:.2f}"
             )
             db.session.add(transaction)
+            ledger.record("Conversion", [
+                (ledger.REWARDS, -amount),
+                (ledger.wallet_account(user_id), amount)
+            ], transaction.description)
             db.session.commit()
             
             return {
                 "success": True,
                 "message": f"Converted {points} points to R{amount:.2f}",
-                "new_balance": user.wallet_balance,
-                "remaining_points": user.reputation_points
+                "new_balance": row.wallet_balance,
+                "remaining_points": row.reputation_points
             }
         except SQLAlchemyError as e:
             db.session.rollback()
             return {"success": False, "message": f"Database error: {str(e)}"}
     
     @staticmethod
-    def convert_money_to_points(user_id: int, amount: float, conversion_rate: float = 0.1) -> dict:
+    def convert_money_to_points(user_id: int, amount: Money | float, conversion_rate: Money | float = 0.1) -> dict:
         """
         Convert money to reputation points
         
@@ -283,26 +556,28 @@ class WalletService:
         Returns:
             dict with success status and message
         """
+        amount = Money.coerce(amount)
         if amount <= 0:
             return {"success": False, "message": "Amount must be positive"}
         
         try:
-            user = db.session.get(User, user_id)
-            if not user:
-                return {"success": False, "message": "User not found"}
-            
-            if user.wallet_balance < amount:
-                return {
-                    "success": False,
-                    "message": f"Insufficient funds. Balance: R{user.wallet_balance:.2f}"
-                }
-            
-            # Convert money to points
-            points = int(amount / conversion_rate)
-            
-            # Update user's balance and points
-            user.wallet_balance -= amount
-            user.reputation_points += points
+            # Convert money to points; integer cents, so R0.30 is 3 points, not 2
+            points = amount.cents // Money.coerce(conversion_rate).cents
+            
+            # Debit balance and grant points in one guarded UPDATE
+            row = db.session.execute(
+                update(User)
+                .where(User.id == user_id, User.wallet_balance >= amount)
+                .values(
+                    wallet_balance=User.wallet_balance - amount,
+                    reputation_points=User.reputation_points + points
+                )
+                .returning(User.wallet_balance, User.reputation_points)
+            ).first()
+            
+            if row is None:
+                db.session.rollback()
+                return _insufficient_funds(user_id)
             
             # Create transaction record
             transaction = Transaction(
@@ -312,13 +587,17 @@ class WalletService:
                 description=f"Converted R{amount:.2f} to {points} points"
             )
             db.session.add(transaction)
+            ledger.record("Conversion", [
+                (ledger.wallet_account(user_id), -amount),
+                (ledger.REWARDS, amount)
+            ], transaction.description)
             db.session.commit()
             
             return {
                 "success": True,
                 "message": f"Converted R{amount:.2f} to {points} points",
-                "new_balance": user.wallet_balance,
-                "total_points": user.reputation_points
+                "new_balance": row.wallet_balance,
+                "total_points": row.reputation_points
             }
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -338,22 +617,27 @@ class WalletService:
             dict with success status and message
         """
         try:
-            user = db.session.get(User, user_id)
-            if not user:
-                return {"success": False, "message": "User not found"}
-            
-            user.reputation_points += points
-            
             # Ensure reputation doesn't go negative
-            if user.reputation_points < 0:
-                user.reputation_points = 0
+            total = db.session.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(reputation_points=case(
+                    (User.reputation_points + points < 0, 0),
+                    else_=User.reputation_points + points
+                ))
+                .returning(User.reputation_points)
+            ).scalar_one_or_none()
+            
+            if total is None:
+                db.session.rollback()
+                return {"success": False, "message": "User not found"}
             
             db.session.commit()
             
             return {
                 "success": True,
                 "message": f"Added {points} reputation points for {reason}",
-                "total_reputation": user.reputation_points
+                "total_reputation": total
             }
         except SQLAlchemyError as e:
             db.session.rollback()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Payroll benchmark: N calls to WalletService.transfer vs one transfer_many,
+over a seeded in-memory database.
+
+    python benchmarks/bench_payroll.py --payouts 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.models import User
+from app.services.wallet import WalletService
+from config import Config
+
+
+class BenchConfig(Config):
+    # Set before create_app: the engine is built when the app is
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+
+
+def seed(count):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'username': 'payer', 'password_hash': 'x', 'wallet_balance': count * 1000}
+    ] + [
+        {'username': f'worker{i}', 'password_hash': 'x', 'wallet_balance': 0}
+        for i in range(count)
+    ])
+    db.session.commit()
+    payer_id = User.query.filter_by(username='payer').one().id
+    worker_ids = [uid for (uid,) in db.session.query(User.id).filter(User.id != payer_id)]
+    return payer_id, worker_ids
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--payouts', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        payer_id, worker_ids = seed(args.payouts)
+        one_by_one_ms, _ = timed(lambda: [
+            WalletService.transfer(payer_id, worker_id, 12.5, "Wages") for worker_id in worker_ids
+        ])
+
+        payer_id, worker_ids = seed(args.payouts)
+        batch_ms, result = timed(lambda: WalletService.transfer_many(
+            payer_id, [(worker_id, 12.5, "Wages") for worker_id in worker_ids]
+        ))
+        assert result['success'], result['message']
+
+        print(f"Paying {args.payouts:,} workers")
+        print(f"   {'transfer() per payout':<22}: {one_by_one_ms:9.2f} ms  ({args.payouts:,} commits)")
+        print(f"   {'transfer_many()':<22}: {batch_ms:9.2f} ms  (1 commit, {one_by_one_ms / batch_ms:.0f}x)")
+
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Radar distance benchmark: scalar haversine loop vs the NumPy kernel,
+plus a full scan_surroundings() over a seeded in-memory database.
+
+    python benchmarks/bench_radar.py --points 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from app.extensions import db
+from app.models import Opportunity, NewsItem
+from app.services.geo_service import encode
+from app.services.radar_service import haversine, haversine_many, scan_surroundings
+
+# Soweto
+ORIGIN = (-26.2485, 27.8546)
+
+
+class BenchConfig(Config):
+    # Set before create_app: the engine is built when the app is
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def random_points(count, spread=2.0):
+    lats = [ORIGIN[0] + random.uniform(-spread, spread) for _ in range(count)]
+    longs = [ORIGIN[1] + random.uniform(-spread, spread) for _ in range(count)]
+    return lats, longs
+
+
+def bench_kernel(count, repeat):
+    lats, longs = random_points(count)
+
+    scalar_ms = timed(lambda: [haversine(ORIGIN[0], ORIGIN[1], la, lo) for la, lo in zip(lats, longs)], repeat)
+    vector_ms = timed(lambda: haversine_many(ORIGIN[0], ORIGIN[1], lats, longs), repeat)
+
+    print(f"Distance kernel over {count:,} points (best of {repeat})")
+    print(f"   scalar haversine loop : {scalar_ms:9.2f} ms")
+    print(f"   numpy haversine_many  : {vector_ms:9.2f} ms  ({scalar_ms / vector_ms:.0f}x)")
+
+
+def bench_scan(count, repeat):
+    app = create_app(BenchConfig)
+
+    with app.app_context():
+        db.create_all()
+        lats, longs = random_points(count)
+        # Bulk insert skips ORM events, so stamp the geohash here
+        db.session.execute(Opportunity.__table__.insert(), [
+            {'title': f'Opportunity {i}', 'category': 'Job', 'latitude': la,
+             'longitude': lo, 'geohash': encode(la, lo)}
+            for i, (la, lo) in enumerate(zip(lats[::2], longs[::2]))
+        ])
+        db.session.execute(NewsItem.__table__.insert(), [
+            {'title': f'News {i}', 'category': 'Community', 'latitude': la,
+             'longitude': lo, 'geohash': encode(la, lo), 'is_breaking': i % 10 == 0}
+            for i, (la, lo) in enumerate(zip(lats[1::2], longs[1::2]))
+        ])
+        db.session.commit()
+
+        found = len(scan_surroundings(*ORIGIN))
+        scan_ms = timed(lambda: scan_surroundings(*ORIGIN), repeat)
+
+        print(f"scan_surroundings() over {count:,} rows, 5km radius (best of {repeat})")
+        print(f"   bbox prefilter + numpy: {scan_ms:9.2f} ms  ({found} spots)")
+
+        db.drop_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    bench_kernel(args.points, args.repeat)
+    bench_scan(args.points, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
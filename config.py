@@ -6,4 +6,20 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///skhokho.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Where /tiles/{z}/{x}/{y}.mvt files are cached (defaults to <instance>/tiles)
+    TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR')
+    # Seconds a cached tile is served before it is rebuilt
+    TILE_MAX_AGE = int(os.environ.get('TILE_MAX_AGE', 300))
+    # How long one job chat SSE connection stays open before the browser reconnects
+    CHAT_STREAM_SECONDS = int(os.environ.get('CHAT_STREAM_SECONDS', 300))
+    # Background worker threads per process for AI vision tasks (0: run them with `manage.py run_tasks`)
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 2))
+    # Queue broker; the task table itself unless this is a redis:// URL
+    TASK_BROKER_URL = os.environ.get('TASK_BROKER_URL')
+    # Seconds a claimed task may run before it is assumed lost and queued again
+    TASK_LEASE_SECONDS = int(os.environ.get('TASK_LEASE_SECONDS', 600))
+    # Uploaded photos are downsized to fit this edge (px), re-encoded and thumbnailed before analysis
+    IMAGE_MAX_EDGE = int(os.environ.get('IMAGE_MAX_EDGE', 1280))
+    THUMBNAIL_EDGE = int(os.environ.get('THUMBNAIL_EDGE', 256))
+    IMAGE_FORMAT = os.environ.get('IMAGE_FORMAT', 'WEBP')
@@ -122,5 +122,141 @@ def show_stats():
             click.echo(f"   Total Reputation Points: {total_reputation}")
 
 
+@cli.command()
+def prune_tombstones():
+    """Delete map sync tombstones older than the retention window"""
+    from app.services.sync_service import prune_tombstones as prune, TOMBSTONE_RETENTION
+    app = create_app()
+    
+    with app.app_context():
+        removed = prune()
+        click.echo(f"🧹 Pruned {removed} tombstones older than {TOMBSTONE_RETENTION.days} days")
+
+
+@cli.command()
+def prune_tiles():
+    """Delete vector tile cache generations retired by table recreation"""
+    from app.services.tile_service import cache_dir, prune_generations
+    app = create_app()
+    
+    with app.app_context():
+        removed = prune_generations(cache_dir())
+        click.echo(f"🧹 Pruned {removed} old tile cache generations")
+
+
+@cli.command()
+def snapshot_balances():
+    """Snapshot ledger balances so balance lookups only sum recent postings"""
+    from app.services.ledger import take_snapshots
+    app = create_app()
+    
+    with app.app_context():
+        written = take_snapshots()
+        click.echo(f"📸 Snapshotted {written} ledger accounts")
+
+
+@cli.command()
+def prune_idempotency_keys():
+    """Delete idempotency keys whose replay window has passed"""
+    from app.services.idempotency import prune_idempotency_keys as prune
+    app = create_app()
+    
+    with app.app_context():
+        removed = prune()
+        click.echo(f"🧹 Pruned {removed} expired idempotency keys")
+
+
+@cli.command()
+def release_escrow():
+    """Pay providers for every completed job still holding escrow"""
+    from app.services.escrow import EscrowService
+    app = create_app()
+    
+    with app.app_context():
+        result = EscrowService.release_completed()
+        icon = "💸" if result['success'] else "❌"
+        click.echo(f"{icon} {result['message']}")
+
+
+@cli.command()
+@click.option('--days', default=7, show_default=True, help='Cancel Pending jobs older than this')
+def cancel_stale_jobs(days):
+    """Cancel stale Pending jobs in one sweep and refund their escrow"""
+    from datetime import timedelta
+    from app.services.job_states import cancel_stale_pending
+    from app.services.escrow import EscrowService
+    app = create_app()
+    
+    with app.app_context():
+        cancelled = cancel_stale_pending(older_than=timedelta(days=days))
+        click.echo(f"🗑️  Cancelled {len(cancelled)} jobs pending for over {days} days")
+        result = EscrowService.refund_cancelled()
+        icon = "💸" if result['success'] else "❌"
+        click.echo(f"{icon} {result['message']}")
+
+
+@cli.command()
+def rebuild_ratings():
+    """Recompute rating aggregates from every Review (normally kept current on insert)"""
+    from app.services.ratings import rebuild_rating_aggregates
+    app = create_app()
+    
+    with app.app_context():
+        rows = rebuild_rating_aggregates()
+        click.echo(f"⭐ Rebuilt {rows} rating aggregates")
+
+
+@cli.command()
+def rebuild_search():
+    """Recreate the service search index (SQLite migrations that rebuild the service table drop its triggers)"""
+    from app.services.search_service import rebuild_search_index
+    from app.models import Service
+    app = create_app()
+    
+    with app.app_context():
+        rebuild_search_index()
+        click.echo(f"🔍 Reindexed {Service.query.count()} services for search")
+
+
+@cli.command()
+@click.option('--once', is_flag=True, help='Drain the queue and exit instead of waiting for more')
+def run_tasks(once):
+    """Run queued background tasks (AI vision) in this process, for TASK_WORKERS=0 deployments"""
+    import time
+    from app.services.task_queue import queue, POLL_SECONDS
+    app = create_app()
+    
+    with app.app_context():
+        click.echo("🧵 Running background tasks...")
+        while True:
+            ran = queue.run_pending()
+            if ran:
+                click.echo(f"✅ Ran {ran} tasks")
+            if once:
+                break
+            db.session.remove()
+            time.sleep(POLL_SECONDS)
+
+
+@cli.command()
+def reconcile():
+    """Check wallet balances against transaction history and record any drift"""
+    from app.services.reconciliation import reconcile as run_reconciliation
+    from app.models import BalanceDrift
+    app = create_app()
+    
+    with app.app_context():
+        run = run_reconciliation()
+        click.echo(f"🧮 Checked {run.transactions_checked} new transactions across {run.users_checked} users "
+                   f"(checkpoint #{run.last_transaction_id})")
+        if run.drift_count:
+            click.echo(f"⚠️  {run.drift_count} balances drifted:")
+            for drift in BalanceDrift.query.filter_by(run_id=run.id).order_by(BalanceDrift.user_id):
+                click.echo(f"   User {drift.user_id}: balance R{drift.actual}, history says R{drift.expected} "
+                           f"({drift.difference:+.2f})")
+        else:
+            click.echo("✅ Every balance matches its transactions")
+
+
 if __name__ == '__main__':
     cli()
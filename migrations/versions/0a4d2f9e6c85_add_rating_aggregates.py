@@ -0,0 +1,54 @@
+"""Add per-user rating aggregates
+
+Revision ID: 0a4d2f9e6c85
+Revises: f1c8e4a6b392
+Create Date: 2026-10-18 18:21:36.905217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a4d2f9e6c85'
+down_revision = 'f1c8e4a6b392'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rating_aggregate',
+    sa.Column('reviewee_id', sa.Integer(), nullable=False),
+    sa.Column('role_rated', sa.String(length=20), nullable=False),
+    sa.Column('review_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('average', sa.Float(), nullable=False),
+    sa.Column('stars_1', sa.Integer(), nullable=False),
+    sa.Column('stars_2', sa.Integer(), nullable=False),
+    sa.Column('stars_3', sa.Integer(), nullable=False),
+    sa.Column('stars_4', sa.Integer(), nullable=False),
+    sa.Column('stars_5', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['reviewee_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('reviewee_id', 'role_rated')
+    )
+    with op.batch_alter_table('rating_aggregate', schema=None) as batch_op:
+        batch_op.create_index('ix_rating_aggregate_role_average', ['role_rated', 'average', 'review_count'], unique=False)
+
+    # Existing reviews, summed once; inserts keep the rows current from here on
+    op.execute(
+        "INSERT INTO rating_aggregate (reviewee_id, role_rated, review_count, rating_sum, average, "
+        "stars_1, stars_2, stars_3, stars_4, stars_5, updated_at) "
+        "SELECT reviewee_id, role_rated, COUNT(*), SUM(rating), CAST(SUM(rating) AS FLOAT) / COUNT(*), "
+        "SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END), SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END), SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END), CURRENT_TIMESTAMP "
+        "FROM review GROUP BY reviewee_id, role_rated"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('rating_aggregate', schema=None) as batch_op:
+        batch_op.drop_index('ix_rating_aggregate_role_average')
+
+    op.drop_table('rating_aggregate')
@@ -0,0 +1,54 @@
+"""Add job transition log and status sweep index
+
+Revision ID: 1b7e5d3c9f40
+Revises: 0a4d2f9e6c85
+Create Date: 2026-10-18 19:02:13.187440
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b7e5d3c9f40'
+down_revision = '0a4d2f9e6c85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_transition',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('from_status', sa.String(length=20), nullable=True),
+    sa.Column('to_status', sa.String(length=20), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=True),
+    sa.Column('reason', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['job_id'], ['job.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job_transition', schema=None) as batch_op:
+        batch_op.create_index('ix_job_transition_job_id', ['job_id', 'id'], unique=False)
+        batch_op.create_index('ix_job_transition_to_status_created', ['to_status', 'created_at'], unique=False)
+
+    op.create_index('ix_job_status_created', 'job', ['status', 'created_at'], unique=False)
+
+    # Existing jobs get one entry for the status they are in now, so
+    # time-in-state has a starting point for them
+    op.execute(
+        "INSERT INTO job_transition (job_id, from_status, to_status, reason, created_at) "
+        "SELECT id, NULL, status, 'Before transition log', "
+        "COALESCE(paid_at, completed_at, started_at, created_at, CURRENT_TIMESTAMP) FROM job "
+        "WHERE status IS NOT NULL"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_job_status_created', table_name='job')
+    with op.batch_alter_table('job_transition', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_transition_to_status_created')
+        batch_op.drop_index('ix_job_transition_job_id')
+
+    op.drop_table('job_transition')
@@ -0,0 +1,52 @@
+"""Add map sync change tracking and tombstones
+
+Revision ID: 23fb6191a919
+Revises: dacf920a3a5d
+Create Date: 2026-10-18 11:40:07.552910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '23fb6191a919'
+down_revision = 'dacf920a3a5d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('map_tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('map_tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_map_tombstone_deleted_at', ['deleted_at'], unique=False)
+
+    with op.batch_alter_table('service', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_service_updated_at', ['updated_at'], unique=False)
+
+    # Existing services count as last changed when they were created
+    op.execute('UPDATE service SET updated_at = created_at')
+
+    with op.batch_alter_table('civic_issue', schema=None) as batch_op:
+        batch_op.create_index('ix_civic_issue_updated_at', ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('civic_issue', schema=None) as batch_op:
+        batch_op.drop_index('ix_civic_issue_updated_at')
+
+    with op.batch_alter_table('service', schema=None) as batch_op:
+        batch_op.drop_index('ix_service_updated_at')
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('map_tombstone', schema=None) as batch_op:
+        batch_op.drop_index('ix_map_tombstone_deleted_at')
+
+    op.drop_table('map_tombstone')
@@ -0,0 +1,24 @@
+"""Add (job_id, id) index for paged job chat history
+
+Revision ID: 2c9f6a8d1e53
+Revises: 1b7e5d3c9f40
+Create Date: 2026-10-18 19:40:52.610384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c9f6a8d1e53'
+down_revision = '1b7e5d3c9f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_job_chat_job_id', 'job_chat', ['job_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_chat_job_id', table_name='job_chat')
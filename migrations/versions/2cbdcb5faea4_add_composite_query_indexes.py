@@ -0,0 +1,44 @@
+"""Add composite indexes for hot query paths
+
+Revision ID: 2cbdcb5faea4
+Revises: 23fb6191a919
+Create Date: 2026-10-18 12:58:30.104471
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2cbdcb5faea4'
+down_revision = '23fb6191a919'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) - kept in step with __table_args__ in app/models.py
+INDEXES = [
+    ('ix_transaction_user_timestamp', 'transaction', ['user_id', sa.text('timestamp DESC')]),
+    ('ix_goal_user_completed_parent', 'goal', ['user_id', 'is_completed', 'parent_id']),
+    ('ix_network_alert_user_completed_date', 'network_alert', ['user_id', 'is_completed', 'alert_date']),
+    ('ix_network_alert_contact_id', 'network_alert', ['contact_id']),
+    ('ix_network_contact_user_id', 'network_contact', ['user_id']),
+    ('ix_diary_entry_user_created', 'diary_entry', ['user_id', sa.text('created_at DESC')]),
+    ('ix_chat_log_user_created', 'chat_log', ['user_id', sa.text('created_at DESC')]),
+    ('ix_job_chat_job_timestamp', 'job_chat', ['job_id', 'timestamp']),
+    ('ix_job_provider_status', 'job', ['provider_id', 'status']),
+    ('ix_job_client_status', 'job', ['client_id', 'status']),
+    ('ix_service_provider_id', 'service', ['provider_id']),
+    ('ix_civic_issue_created_at', 'civic_issue', ['created_at']),
+    ('ix_milestone_goal_id', 'milestone', ['goal_id']),
+    ('ix_balaa_history_user_id', 'balaa_history', ['user_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,71 @@
+"""Add full-text search index over services
+
+Revision ID: 3e4a7c1d8b26
+Revises: 2c9f6a8d1e53
+Create Date: 2026-10-18 20:31:07.215940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e4a7c1d8b26'
+down_revision = '2c9f6a8d1e53'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of the DDL in app/services/search_service.py as of this revision
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+SQLITE_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS service_fts USING fts5("
+    "name, category, description, content='service', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS service_fts_insert AFTER INSERT ON service BEGIN "
+    "INSERT INTO service_fts(rowid, name, category, description) "
+    "VALUES (new.id, new.name, new.category, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS service_fts_delete AFTER DELETE ON service BEGIN "
+    "INSERT INTO service_fts(service_fts, rowid, name, category, description) "
+    "VALUES ('delete', old.id, old.name, old.category, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS service_fts_update AFTER UPDATE OF name, category, description ON service BEGIN "
+    "INSERT INTO service_fts(service_fts, rowid, name, category, description) "
+    "VALUES ('delete', old.id, old.name, old.category, old.description); "
+    "INSERT INTO service_fts(rowid, name, category, description) "
+    "VALUES (new.id, new.name, new.category, new.description); END",
+    "INSERT INTO service_fts(service_fts) VALUES ('rebuild')",
+)
+
+SQLITE_DROP_DDL = (
+    "DROP TRIGGER IF EXISTS service_fts_insert",
+    "DROP TRIGGER IF EXISTS service_fts_delete",
+    "DROP TRIGGER IF EXISTS service_fts_update",
+    "DROP TABLE IF EXISTS service_fts",
+)
+
+POSTGRES_INDEX_DDL = (
+    f"CREATE INDEX IF NOT EXISTS ix_service_search ON service USING GIN (({PG_SEARCH_VECTOR}))",
+)
+
+POSTGRES_DROP_DDL = (
+    "DROP INDEX IF EXISTS ix_service_search",
+)
+
+
+def upgrade():
+    # FTS5 table plus sync triggers on SQLite, a GIN expression index on
+    # PostgreSQL; existing services are indexed as part of the create
+    statements = {'sqlite': SQLITE_INDEX_DDL, 'postgresql': POSTGRES_INDEX_DDL}
+    for statement in statements.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
+
+
+def downgrade():
+    statements = {'sqlite': SQLITE_DROP_DDL, 'postgresql': POSTGRES_DROP_DDL}
+    for statement in statements.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
@@ -0,0 +1,44 @@
+"""Add background task queue table
+
+Revision ID: 4f8b2d6e1a37
+Revises: 3e4a7c1d8b26
+Create Date: 2026-10-18 21:14:52.903116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8b2d6e1a37'
+down_revision = '3e4a7c1d8b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('background_task',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('parent_id', sa.String(length=32), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['parent_id'], ['background_task.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('background_task', schema=None) as batch_op:
+        batch_op.create_index('ix_background_task_status_created', ['status', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('background_task', schema=None) as batch_op:
+        batch_op.drop_index('ix_background_task_status_created')
+
+    op.drop_table('background_task')
@@ -0,0 +1,81 @@
+"""Add double-entry ledger and balance snapshots
+
+Revision ID: 7a70a569071c
+Revises: 2cbdcb5faea4
+Create Date: 2026-10-18 13:40:12.551203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a70a569071c'
+down_revision = '2cbdcb5faea4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ledger_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entry_type', sa.String(length=50), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('job_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['job_id'], ['job.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('ledger_posting',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('account', sa.String(length=40), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['entry_id'], ['ledger_entry.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ledger_posting', schema=None) as batch_op:
+        batch_op.create_index('ix_ledger_posting_account_id', ['account', 'id'], unique=False)
+
+    op.create_table('balance_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account', sa.String(length=40), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=False),
+    sa.Column('last_posting_id', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('balance_snapshot', schema=None) as batch_op:
+        batch_op.create_index('ix_balance_snapshot_account_taken', ['account', 'taken_at'], unique=False)
+
+    # Existing wallet balances become one opening entry, balanced by the
+    # 'opening' account, so the ledger agrees with wallet_balance from day one.
+    # The id comes from the table's own sequence so later inserts don't collide with it.
+    bind = op.get_bind()
+    entry_id = bind.execute(sa.text(
+        "INSERT INTO ledger_entry (entry_type, description, created_at) "
+        "VALUES ('Opening', 'Balances before the ledger', CURRENT_TIMESTAMP) RETURNING id"
+    )).scalar()
+    bind.execute(sa.text(
+        "INSERT INTO ledger_posting (entry_id, account, amount, created_at) "
+        "SELECT :entry_id, 'wallet:' || id, wallet_balance, CURRENT_TIMESTAMP FROM \"user\" "
+        "WHERE wallet_balance IS NOT NULL AND wallet_balance != 0"
+    ), {'entry_id': entry_id})
+    bind.execute(sa.text(
+        "INSERT INTO ledger_posting (entry_id, account, amount, created_at) "
+        "SELECT :entry_id, 'opening', -SUM(wallet_balance), CURRENT_TIMESTAMP FROM \"user\" "
+        "HAVING SUM(wallet_balance) != 0"
+    ), {'entry_id': entry_id})
+
+
+def downgrade():
+    with op.batch_alter_table('balance_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('ix_balance_snapshot_account_taken')
+
+    op.drop_table('balance_snapshot')
+    with op.batch_alter_table('ledger_posting', schema=None) as batch_op:
+        batch_op.drop_index('ix_ledger_posting_account_id')
+
+    op.drop_table('ledger_posting')
+    op.drop_table('ledger_entry')
@@ -0,0 +1,55 @@
+"""Store money as integer cents
+
+Revision ID: b3e1d5c08f42
+Revises: 7a70a569071c
+Create Date: 2026-10-18 14:22:47.193655
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e1d5c08f42'
+down_revision = '7a70a569071c'
+branch_labels = None
+depends_on = None
+
+# (table, column, type before, nullable) - every column that holds rands
+MONEY_COLUMNS = [
+    ('user', 'wallet_balance', sa.Float(), True),
+    ('transaction', 'amount', sa.Float(), False),
+    ('service', 'price', sa.Integer(), False),
+    ('job', 'price', sa.Integer(), False),
+    ('job', 'agreed_price', sa.Integer(), True),
+    ('ledger_posting', 'amount', sa.Float(), False),
+    ('balance_snapshot', 'balance', sa.Float(), False),
+]
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table, column, old_type, nullable in MONEY_COLUMNS:
+        if not postgres:
+            # SQLite rebuilds the table on a type change, so scale in place first
+            op.execute(f'UPDATE "{table}" SET {column} = ROUND({column} * 100)')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column,
+                   existing_type=old_type,
+                   type_=sa.BigInteger(),
+                   existing_nullable=nullable,
+                   postgresql_using=f'ROUND({column} * 100)::bigint')
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table, column, old_type, nullable in reversed(MONEY_COLUMNS):
+        # Whole-rand columns lose any cents on the way back
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column,
+                   existing_type=sa.BigInteger(),
+                   type_=old_type,
+                   existing_nullable=nullable,
+                   postgresql_using=f'{column} / 100.0')
+        if not postgres:
+            op.execute(f'UPDATE "{table}" SET {column} = {column} / 100.0')
@@ -0,0 +1,28 @@
+"""Add id to the transaction history index for keyset paging
+
+Revision ID: c41f7d2e9a63
+Revises: b99533665014
+Create Date: 2026-10-18 16:02:47.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f7d2e9a63'
+down_revision = 'b99533665014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_transaction_user_timestamp', table_name='transaction')
+    op.create_index('ix_transaction_user_timestamp', 'transaction',
+                    ['user_id', sa.text('timestamp DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transaction_user_timestamp', table_name='transaction')
+    op.create_index('ix_transaction_user_timestamp', 'transaction',
+                    ['user_id', sa.text('timestamp DESC')], unique=False)
@@ -0,0 +1,75 @@
+"""Add balance reconciliation checkpoints and drift log
+
+Revision ID: d82b6a0f4c17
+Revises: c41f7d2e9a63
+Create Date: 2026-10-18 16:40:09.774512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd82b6a0f4c17'
+down_revision = 'c41f7d2e9a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reconciled_balance',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('opening', sa.BigInteger(), nullable=False),
+    sa.Column('transaction_total', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('reconciliation_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+    sa.Column('transactions_checked', sa.Integer(), nullable=False),
+    sa.Column('users_checked', sa.Integer(), nullable=False),
+    sa.Column('drift_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('balance_drift',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('expected', sa.BigInteger(), nullable=False),
+    sa.Column('actual', sa.BigInteger(), nullable=False),
+    sa.Column('detected_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['run_id'], ['reconciliation_run.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('balance_drift', schema=None) as batch_op:
+        batch_op.create_index('ix_balance_drift_run_id', ['run_id'], unique=False)
+        batch_op.create_index('ix_balance_drift_user_id', ['user_id'], unique=False)
+
+    # Balances that predate complete transaction history (seeded accounts, the
+    # untracked escrow deductions before the ledger) are accepted as openings,
+    # and run 0 checkpoints every existing transaction.
+    op.execute(
+        "INSERT INTO reconciled_balance (user_id, opening, transaction_total) "
+        "SELECT u.id, COALESCE(u.wallet_balance, 0) - COALESCE(t.total, 0), COALESCE(t.total, 0) "
+        "FROM \"user\" u LEFT JOIN (SELECT user_id, SUM(amount) AS total FROM \"transaction\" GROUP BY user_id) t "
+        "ON t.user_id = u.id"
+    )
+    op.execute(
+        "INSERT INTO reconciliation_run (started_at, finished_at, last_transaction_id, transactions_checked, "
+        "users_checked, drift_count) "
+        "SELECT CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, COALESCE(MAX(id), 0), COUNT(*), 0, 0 FROM \"transaction\""
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('balance_drift', schema=None) as batch_op:
+        batch_op.drop_index('ix_balance_drift_user_id')
+        batch_op.drop_index('ix_balance_drift_run_id')
+
+    op.drop_table('balance_drift')
+    op.drop_table('reconciliation_run')
+    op.drop_table('reconciled_balance')
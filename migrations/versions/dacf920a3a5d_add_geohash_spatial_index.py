@@ -0,0 +1,95 @@
+"""Add geohash grid cells and spatial indexes
+
+Revision ID: dacf920a3a5d
+Revises: fe9aaadfd457
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dacf920a3a5d'
+down_revision = 'fe9aaadfd457'
+branch_labels = None
+depends_on = None
+
+# opportunity and news_item were created with db.create_all() on some deployments,
+# so only touch the tables that actually exist.
+GEO_TABLES = ['service', 'civic_issue', 'opportunity', 'news_item']
+
+# Frozen copy of app.services.geo_service.encode as of this revision
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits = bits << 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def _existing_geo_tables():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    return [table for table in GEO_TABLES if table in tables]
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    for table in _existing_geo_tables():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+            batch_op.create_index(f'ix_{table}_geohash', ['geohash'], unique=False)
+
+        # Backfill cells for existing rows
+        rows = bind.execute(sa.text(
+            f'SELECT id, latitude, longitude FROM {table} '
+            'WHERE latitude IS NOT NULL AND longitude IS NOT NULL'
+        )).fetchall()
+        for row_id, latitude, longitude in rows:
+            bind.execute(
+                sa.text(f'UPDATE {table} SET geohash = :cell WHERE id = :id'),
+                {'cell': encode(latitude, longitude), 'id': row_id}
+            )
+
+        if bind.dialect.name == 'postgresql':
+            op.execute('CREATE EXTENSION IF NOT EXISTS postgis')
+            op.execute(
+                f'CREATE INDEX ix_{table}_geom ON {table} '
+                'USING GIST (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326))'
+            )
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    for table in _existing_geo_tables():
+        if bind.dialect.name == 'postgresql':
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_geom')
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_geohash')
+            batch_op.drop_column('geohash')
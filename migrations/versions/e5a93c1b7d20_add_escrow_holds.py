@@ -0,0 +1,66 @@
+"""Add escrow holds for hired jobs
+
+Revision ID: e5a93c1b7d20
+Revises: d82b6a0f4c17
+Create Date: 2026-10-18 17:12:55.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a93c1b7d20'
+down_revision = 'd82b6a0f4c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('escrow_hold',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('provider_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('settled_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['client_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['job_id'], ['job.id'], ),
+    sa.ForeignKeyConstraint(['provider_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('job_id')
+    )
+    with op.batch_alter_table('escrow_hold', schema=None) as batch_op:
+        batch_op.create_index('ix_escrow_hold_provider_status_amount', ['provider_id', 'status', 'amount'], unique=False)
+
+    # Unpaid jobs that were accepted before holds were tracked; their price
+    # is already out of the client's wallet, so it is held now. Pending jobs
+    # were never charged and get their hold when they are accepted.
+    bind = op.get_bind()
+    bind.execute(sa.text(
+        "INSERT INTO escrow_hold (job_id, client_id, provider_id, amount, status, created_at) "
+        "SELECT id, client_id, provider_id, price, 'held', COALESCE(created_at, CURRENT_TIMESTAMP) FROM job "
+        "WHERE (is_paid IS NULL OR is_paid = false) AND status IN ('In_Progress', 'Completed')"
+    ))
+
+    # The ledger opened without that money anywhere; put it in escrow,
+    # balanced by the opening account, so escrow matches the held total.
+    held = bind.execute(sa.text("SELECT COALESCE(SUM(amount), 0) FROM escrow_hold")).scalar()
+    if held:
+        entry_id = bind.execute(sa.text(
+            "INSERT INTO ledger_entry (entry_type, description, created_at) "
+            "VALUES ('Opening', 'Escrow held before holds were tracked', CURRENT_TIMESTAMP) RETURNING id"
+        )).scalar()
+        bind.execute(sa.text(
+            "INSERT INTO ledger_posting (entry_id, account, amount, created_at) "
+            "VALUES (:entry_id, 'escrow', :held, CURRENT_TIMESTAMP), "
+            "(:entry_id, 'opening', -:held, CURRENT_TIMESTAMP)"
+        ), {'entry_id': entry_id, 'held': held})
+
+def downgrade():
+    with op.batch_alter_table('escrow_hold', schema=None) as batch_op:
+        batch_op.drop_index('ix_escrow_hold_provider_status_amount')
+
+    op.drop_table('escrow_hold')
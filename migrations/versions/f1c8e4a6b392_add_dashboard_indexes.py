@@ -0,0 +1,33 @@
+"""Add indexes for LinkUp dashboard paging and rating averages
+
+Revision ID: f1c8e4a6b392
+Revises: e5a93c1b7d20
+Create Date: 2026-10-18 17:48:20.661930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c8e4a6b392'
+down_revision = 'e5a93c1b7d20'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) - kept in step with __table_args__ in app/models.py
+INDEXES = [
+    ('ix_job_provider_id', 'job', ['provider_id', 'id']),
+    ('ix_job_client_id', 'job', ['client_id', 'id']),
+    ('ix_review_reviewee_role_rating', 'review', ['reviewee_id', 'role_rated', 'rating']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
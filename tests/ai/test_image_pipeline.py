@@ -0,0 +1,56 @@
+import io
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+from app.services.image_pipeline import process_upload, shrink, ORIENTATION_TAG
+
+
+def _jpeg(size, orientation=None):
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera Maker'
+    if orientation:
+        exif[ORIENTATION_TAG] = orientation
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, format='JPEG', exif=exif.tobytes(), quality=95)
+    buffer.seek(0)
+    return buffer
+
+
+def test_upload_is_downsized_upright_and_stripped(app, tmp_path):
+    original = _jpeg((4000, 3000), orientation=6)  # a phone photo held upright
+    with app.app_context():
+        upload = process_upload(original, 'scan_1', folder=str(tmp_path))
+
+    assert (upload.width, upload.height) == (960, 1280)
+    assert upload.image_url == '/static/uploads/scan_1.webp'
+    assert upload.size_bytes < len(original.getvalue())
+    with Image.open(upload.path) as stored:
+        assert stored.format == 'WEBP'
+        assert dict(stored.getexif()) == {}
+    with Image.open(tmp_path / 'scan_1_thumb.webp') as thumbnail:
+        assert thumbnail.size == (192, 256)
+
+
+def test_jpeg_decodes_at_reduced_scale(app):
+    with Image.open(_jpeg((4000, 3000))) as original:
+        small = shrink(original, 1280)
+        # draft() picked a 1/2 DCT scale, so the decoder never built the full-size bitmap
+        assert original.size == (2000, 1500)
+    assert small.size == (1280, 960)
+
+
+def test_sizes_and_format_come_from_config(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_MAX_EDGE', 100)
+    monkeypatch.setitem(app.config, 'IMAGE_FORMAT', 'JPEG')
+    buffer = io.BytesIO()
+    Image.new('RGBA', (300, 150), (255, 0, 0, 128)).save(buffer, format='PNG')
+    buffer.seek(0)
+    with app.app_context():
+        upload = process_upload(buffer, 'logo', folder=str(tmp_path))
+    assert (upload.image_url, upload.width, upload.height) == ('/static/uploads/logo.jpg', 100, 50)
+
+
+def test_non_images_are_rejected(app, tmp_path):
+    with app.app_context(), pytest.raises(UnidentifiedImageError):
+        process_upload(io.BytesIO(b'not a picture'), 'junk', folder=str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
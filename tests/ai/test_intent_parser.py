@@ -0,0 +1,48 @@
+from unittest.mock import patch
+
+import pytest
+from app.extensions import db
+from app.models import Goal
+from app.services.intent_parser import parse_intent
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('split R60 taxi fare between 4', {'cmd': 'baala_calc', 'fare': 60, 'group_size': 4}),
+    ('Split 45.50 rand between three people', {'cmd': 'baala_calc', 'fare': 45.5, 'group_size': 3}),
+    ("What's my balance?", {'cmd': 'balance'}),
+    ('Add goal: Open a car wash', {'cmd': 'add_goal', 'title': 'Open a car wash', 'description': 'Added via Skhokho AI'}),
+    ('log expense - R50 airtime', {'cmd': 'add_diary', 'entry_type': 'Expense', 'content': 'R50 airtime'}),
+    ('save contact Thabo Mokoena, Plumber, 082 123 4567',
+     {'cmd': 'add_network', 'name': 'Thabo Mokoena', 'role': 'Plumber', 'phone': '0821234567', 'email': None}),
+    ('find me a sparky near me', {'cmd': 'find_service', 'service_type': 'sparky'}),
+    ('I need plumbing', {'cmd': 'find_service', 'service_type': 'plumbing'}),
+])
+def test_structured_commands_are_parsed(message, expected):
+    assert parse_intent(message) == expected
+
+
+@pytest.mark.parametrize('message', [
+    'find a way to make money',
+    'what should I do with my life?',
+    'split R60 between 0',
+    'Sho, how are you?',
+    'I need a car',
+    'I want some education',
+    '',
+])
+def test_open_ended_messages_go_to_the_model(message):
+    assert parse_intent(message) is None
+
+
+def test_chat_runs_commands_without_calling_the_model(users, app):
+    users.create_and_login('commander')
+
+    with patch('app.routes.chat.get_skhokho_response') as mock_brain:
+        response = users.post('/chat/send', json={'message': 'Add goal: Open a car wash'})
+        fare = users.post('/chat/send', json={'message': 'split R60 between 4'})
+
+    mock_brain.assert_not_called()
+    assert "Open a car wash" in response.json['response']
+    assert 'R15.00 each' in fare.json['response']
+    with app.app_context():
+        assert db.session.query(Goal.title).all() == [('Open a car wash',)]
@@ -0,0 +1,84 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app.services import ai_service
+from app.services.ai_service import registry, get_skhokho_response, get_hustle_plan, HTTPBackend
+
+
+class FakeModel:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def generate(self, parts, model=ai_service.MODEL_NAME):
+        self.calls.append(parts)
+        return self.reply
+
+
+@pytest.fixture
+def fake_backend():
+    def install(reply):
+        fake = FakeModel(reply)
+        registry.set_backend(fake)
+        return fake
+    yield install
+    registry.reset()
+
+
+def test_backend_is_built_once_and_reused(monkeypatch):
+    built = []
+    monkeypatch.setattr(ai_service.ModelRegistry, '_configured_backend',
+                        staticmethod(lambda: built.append(1) or FakeModel('Sho')))
+    registry.reset()
+    try:
+        assert get_skhokho_response('Hello') == 'Sho'
+        assert get_skhokho_response('Hello again') == 'Sho'
+        assert len(built) == 1
+    finally:
+        registry.reset()
+
+
+def test_missing_key_is_not_cached(monkeypatch):
+    monkeypatch.delenv('GOOGLE_API_KEY', raising=False)
+    monkeypatch.delenv('SKHOKHO_AI_URL', raising=False)
+    registry.reset()
+    assert 'Key Missing' in get_skhokho_response('Hello')
+    assert registry.backend() is None and registry._backend is None
+
+
+def test_prompts_go_through_the_installed_backend(fake_backend):
+    fake = fake_backend('```json\n{"title": "Kota stand", "steps": []}\n```')
+    assert get_hustle_plan('Sell kotas') == {'title': 'Kota stand', 'steps': []}
+    assert 'Sell kotas' in fake.calls[0]
+
+
+def test_http_backend_talks_to_a_local_model_server():
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            seen.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            body = json.dumps({'text': 'Eish, sharp'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        backend = HTTPBackend(f'http://127.0.0.1:{server.server_port}')
+        assert backend.generate('Hello') == 'Eish, sharp'
+        assert backend.generate(['Hello', ' there']) == 'Eish, sharp'
+        assert [request['prompt'] for request in seen] == ['Hello', 'Hello there']
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,102 @@
+from app.services import response_cache as cache_module
+from app.services.ai_service import registry, get_skhokho_response
+from app.services.response_cache import ResponseCache, cache_key, response_cache
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, parts, model=None):
+        self.calls += 1
+        return f'Reply {self.calls}'
+
+
+class DictStore:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value.encode()
+
+
+def test_same_question_same_context_skips_the_model():
+    model = CountingModel()
+    registry.set_backend(model)
+    response_cache.clear()
+    try:
+        context = "\n    RADAR: Taxi rank 200m\n    "
+        first = get_skhokho_response("What should I do here?", context)
+        assert get_skhokho_response("  what should I do   HERE ", "RADAR: Taxi rank 200m") == first
+        assert model.calls == 1
+
+        get_skhokho_response("What should I do here?", "RADAR: Clinic 50m")
+        assert model.calls == 2
+        assert response_cache.stats()['hits'] == 1 and response_cache.stats()['misses'] == 2
+    finally:
+        registry.reset()
+        response_cache.clear()
+
+
+def test_entries_expire_and_least_recent_is_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    cache = ResponseCache(ttl=60, max_entries=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    assert cache.get('a') == 'A'        # a is now the most recent
+    cache.set('c', 'C')
+    assert cache.get('b') is None       # so b was evicted
+    assert cache.stats()['evictions'] == 1
+
+    now[0] += 61
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 1
+
+
+def test_shared_store_serves_other_workers():
+    store = DictStore()
+    one, two = ResponseCache(shared=store), ResponseCache(shared=store)
+    key = cache_key('Split R60 between 4', 'context')
+    one.set(key, 'R15 each')
+
+    assert two.get(key) == 'R15 each'
+    assert two.get(key) == 'R15 each'
+    assert (two.stats()['shared_hits'], two.stats()['hits']) == (1, 1)
+
+
+def test_stats_need_the_api_key(client, monkeypatch):
+    monkeypatch.setenv('SKHOKHO_CLIENT_SECRET', 'sekret')
+    assert client.get('/api/v1/cache-stats').status_code == 401
+    response = client.get('/api/v1/cache-stats', headers={'X-API-KEY': 'sekret'})
+    assert response.status_code == 200
+    assert {'hits', 'misses', 'hit_rate', 'size'} <= response.json.keys()
+
+
+def test_area_scans_share_an_answer_as_the_user_moves(app, users):
+    from app.extensions import db
+    from app.models import Service
+
+    model = CountingModel()
+    registry.set_backend(model)
+    response_cache.clear()
+    user_id = users.create_and_login('walker')
+    with app.app_context():
+        db.session.add(Service(provider_id=user_id, name='Corner Barber', category='Beauty', price=60,
+                               latitude=-26.2041, longitude=28.0473))
+        db.session.commit()
+    try:
+        scans = [
+            users.post('/location/scan', json={'latitude': lat, 'longitude': lng}).json
+            for lat, lng in ((-26.2041, 28.0473), (-26.2042, 28.0474))
+        ]
+
+        assert scans[0]['findings'] != scans[1]['findings']  # the distances moved
+        assert scans[0]['advice'] == scans[1]['advice'] == 'Reply 1'
+        assert model.calls == 1
+    finally:
+        registry.reset()
+        response_cache.clear()
@@ -0,0 +1,150 @@
+import base64
+import io
+import json
+import os
+
+import pytest
+from PIL import Image
+from app.extensions import db
+from app.models import CivicIssue, BackgroundTask
+from app.services.ai_service import registry
+from app.services.task_queue import queue
+
+
+class VisionModel:
+    def __init__(self, reply):
+        self.reply = reply
+
+    def generate(self, parts, model=None):
+        return self.reply
+
+
+@pytest.fixture
+def vision(app, monkeypatch):
+    """No worker threads: tests run the queue themselves with run_pending()"""
+    monkeypatch.setitem(app.config, 'TASK_WORKERS', 0)
+    monkeypatch.setenv('SKHOKHO_CLIENT_SECRET', 'sekret')
+    uploads = []
+
+    def install(reply):
+        registry.set_backend(VisionModel(reply))
+        return uploads
+
+    yield install
+    registry.reset()
+    for image_url in uploads:
+        path = os.path.join(app.root_path, image_url.lstrip('/'))
+        stem, extension = os.path.splitext(path)
+        for leftover in (path, f'{stem}_thumb{extension}'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def _photo():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), 'orange').save(buffer, format='JPEG')
+    buffer.seek(0)
+    return buffer
+
+
+def test_scan_returns_at_once_and_danger_report_follows(users, app, vision):
+    uploads = vision('DANGER: open manhole on the pavement')
+    user_id = users.create_and_login('scanner')
+
+    response = users.post('/macalaa/api/macalaa/scan-environment', data={
+        'image': (_photo(), 'street.jpg'), 'latitude': '-26.25', 'longitude': '27.85'
+    }, content_type='multipart/form-data')
+    assert response.status_code == 202
+    queued = response.json
+    uploads.append(queued['image_url'])
+    assert queued['status'] == 'queued'
+
+    with app.app_context():
+        assert queue.run_pending() == 2  # the scan, then the report it queued
+        issue = CivicIssue.query.one()
+        assert (issue.reporter_id, issue.latitude, issue.category) == (user_id, -26.25, 'Hazard')
+        report = BackgroundTask.query.filter_by(name='civic.report_danger').one()
+        assert report.parent_id == queued['task_id']
+
+    state = users.get(queued['status_url']).json
+    assert state['status'] == 'done'
+    assert state['result']['is_danger'] is True
+    assert state['result']['report_task_id'] == report.id
+    assert state['result']['analysis'].startswith('DANGER')
+
+
+def test_tasks_are_private_to_their_owner(users, vision):
+    uploads = vision('A quiet street')
+    users.create_and_login('owner')
+    queued = users.post('/analyze/image', data={'file': (_photo(), 'a.jpg')},
+                        content_type='multipart/form-data').json
+    uploads.append(queued['image_url'])
+
+    users.create_and_login('snoop')
+    assert users.get(queued['status_url']).status_code == 404
+
+
+def test_api_images_are_queued_and_long_polled(client, app, vision):
+    uploads = vision('A taxi rank')
+    response = client.post('/api/v1/ask', headers={'X-API-KEY': 'sekret'}, json={
+        'message': 'Where am I?', 'image_base64': base64.b64encode(_photo().getvalue()).decode()
+    })
+    assert response.status_code == 202
+    queued = response.json
+
+    with app.app_context():
+        payload = json.loads(db.session.get(BackgroundTask, queued['task_id']).payload)
+        uploads.append(payload['image_url'])
+        assert client.get(queued['status_url']).status_code == 401
+        assert queue.run_pending() == 1
+
+    state = client.get(queued['status_url'] + '?wait=5', headers={'X-API-KEY': 'sekret'}).json
+    assert (state['status'], state['result']['analysis']) == ('done', 'A taxi rank')
+
+    stream = client.get(queued['stream_url'], headers={'X-API-KEY': 'sekret'})
+    assert 'event: result' in stream.get_data(as_text=True)
+
+
+def test_failed_task_is_recorded_and_claimed_once(app, vision):
+    vision('unused')
+    with app.app_context():
+        queued = queue.enqueue('vision.analyze', {'image_url': '/static/uploads/missing.jpg'})
+        assert queue.run_next() == queued.id
+        assert queue.run_next() is None
+
+        failed = db.session.get(BackgroundTask, queued.id)
+        assert failed.status == 'failed'
+        assert 'missing.jpg' in failed.error
+
+
+def test_task_past_its_lease_is_run_again(app, vision, monkeypatch):
+    from datetime import datetime, timedelta
+    vision('unused')
+    monkeypatch.setattr(queue, '_swept_at', None)
+    with app.app_context():
+        queued = queue.enqueue('vision.analyze', {'image_url': '/static/uploads/lost.jpg'})
+        # Claimed by a worker that died an hour ago
+        BackgroundTask.query.filter_by(id=queued.id).update(
+            {'status': 'running', 'started_at': datetime.utcnow() - timedelta(hours=1)}
+        )
+        db.session.commit()
+
+        assert queue.run_next() == queued.id
+        assert db.session.get(BackgroundTask, queued.id, populate_existing=True).status == 'failed'
+
+
+def test_redis_broker_falls_back_to_the_table(app, vision):
+    from app.services.task_queue import RedisBroker
+
+    class EmptyList:
+        def rpush(self, key, value):
+            pass  # lost on the way in
+
+        def blpop(self, key, timeout):
+            return None
+
+    vision('unused')
+    with app.app_context():
+        queued = queue.enqueue('vision.analyze', {'image_url': '/static/uploads/dropped.jpg'})
+        assert RedisBroker(EmptyList()).pop(1) == queued.id
+        assert queue.run_pending() == 1
@@ -1,6 +1,7 @@
 import pytest
 from app import create_app
 from app.extensions import db
+from app.models import User
 from sqlalchemy.pool import NullPool
 
 @pytest.fixture(scope='session')
@@ -68,3 +69,44 @@ class AuthActions:
 @pytest.fixture
 def auth(client):
     return AuthActions(client)
+
+
+class UserActions:
+    def __init__(self, app, client):
+        self._app = app
+        self._client = client
+
+    def create(self, username, password='testpassword', **fields):
+        """Add a user (wallet_balance, role, ... as keyword arguments) and return its id"""
+        with self._app.app_context():
+            user = User(username=username, email=f'{username}@example.com', **fields)
+            user.set_password(password)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+
+    def login(self, user_id):
+        """Log the test client in as `user_id` without going through the login form"""
+        with self._client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return user_id
+
+    def create_and_login(self, username, **fields):
+        return self.login(self.create(username, **fields))
+
+    # A fresh app context keeps flask-login from reusing a user cached on g by
+    # earlier requests (the session-wide app context outlives every test)
+
+    def get(self, url, **kwargs):
+        with self._app.app_context():
+            return self._client.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        with self._app.app_context():
+            return self._client.post(url, **kwargs)
+
+
+@pytest.fixture
+def users(app, client):
+    return UserActions(app, client)
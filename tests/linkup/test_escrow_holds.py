@@ -0,0 +1,108 @@
+from app.extensions import db
+from app.models import User, Service, Job, Transaction, EscrowHold
+from app.services import ledger
+from app.services.escrow import EscrowService
+
+
+def _hire(client_id, provider_id, price):
+    service = Service(provider_id=provider_id, name='Garden', category='Outdoor', price=price, latitude=0.0, longitude=0.0)
+    db.session.add(service)
+    db.session.flush()
+    job = Job(client_id=client_id, provider_id=provider_id, service_id=service.id, status='In_Progress', price=price)
+    db.session.add(job)
+    db.session.flush()
+    result = EscrowService.hold(job.id)
+    assert result['success'], result['message']
+    return job.id
+
+
+def test_hold_release_moves_money_through_escrow(app, users):
+    with app.app_context():
+        customer, provider = users.create('customer', wallet_balance=100), users.create('gardener')
+        job_id = _hire(customer, provider, 60)
+
+        assert db.session.get(User, customer).wallet_balance == 40
+        assert EscrowService.pending_earnings(provider) == 60
+        assert not EscrowService.release(job_id)['success']  # still in progress
+
+        Job.query.filter_by(id=job_id).update({'status': 'Completed'})
+        assert EscrowService.release(job_id)['success']
+        assert not EscrowService.release(job_id)['success']  # already settled
+
+        assert db.session.get(User, provider).wallet_balance == 60
+        assert EscrowService.pending_earnings(provider) == 0
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.is_paid) == ('Paid', True)
+        assert Transaction.query.filter_by(user_id=provider, transaction_type='Earning').one().amount == 60
+        assert ledger.balance(ledger.ESCROW) == 0
+
+
+def test_refund_returns_money_to_client(app, users):
+    with app.app_context():
+        customer, provider = users.create('customer', wallet_balance=100), users.create('gardener')
+        job_id = _hire(customer, provider, 60)
+
+        assert EscrowService.refund(job_id)['success']
+        assert not EscrowService.release(job_id)['success']
+
+        assert db.session.get(User, customer).wallet_balance == 100
+        assert db.session.get(User, provider).wallet_balance == 0
+        assert db.session.get(EscrowHold, 1).status == 'refunded'
+
+
+def test_short_funds_hold_nothing(app, users):
+    with app.app_context():
+        customer, provider = users.create('customer', wallet_balance=10), users.create('gardener')
+        service = Service(provider_id=provider, name='Garden', category='Outdoor', price=60, latitude=0.0, longitude=0.0)
+        db.session.add(service)
+        db.session.flush()
+        job = Job(client_id=customer, provider_id=provider, service_id=service.id, status='In_Progress', price=60)
+        db.session.add(job)
+        db.session.flush()
+
+        assert not EscrowService.hold(job.id)['success']
+        assert EscrowHold.query.count() == 0
+        assert Job.query.count() == 0
+
+
+def test_batch_release_settles_only_completed_jobs(app, users):
+    with app.app_context():
+        customer = users.create('customer', wallet_balance=1000)
+        providers = [users.create(f'gardener{i}') for i in range(3)]
+        done = [_hire(customer, provider, 100) for provider in providers]
+        done.append(_hire(customer, providers[0], 50))
+        open_job = _hire(customer, providers[1], 70)
+        Job.query.filter(Job.id.in_(done)).update({'status': 'Completed'}, synchronize_session=False)
+        db.session.commit()
+
+        result = EscrowService.release_completed()
+
+        assert result['success']
+        assert (result['count'], result['total']) == (4, 350)
+        assert [db.session.get(User, p).wallet_balance for p in providers] == [150, 100, 100]
+        assert all(db.session.get(Job, job_id).is_paid for job_id in done)
+        assert {db.session.get(Job, job_id).status for job_id in done} == {'Paid'}
+        assert not db.session.get(Job, open_job).is_paid
+        assert EscrowService.pending_earnings(providers[1]) == 70
+        assert ledger.balance(ledger.ESCROW) == 70
+        assert EscrowService.release_completed()['count'] == 0
+
+
+def test_client_completes_job_and_releases_payment(app, users):
+    with app.app_context():
+        customer, provider = users.create('customer', wallet_balance=100), users.create('gardener')
+        job_id = _hire(customer, provider, 60)
+
+    users.login(provider)
+    users.post(f'/linkup/complete/{job_id}')
+    with app.app_context():
+        assert db.session.get(Job, job_id).status == 'In_Progress'  # providers can't sign off their own work
+
+    users.login(customer)
+    users.post(f'/linkup/complete/{job_id}')
+
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.is_paid) == ('Paid', True)
+        assert job.completed_at is not None
+        assert db.session.get(User, provider).wallet_balance == 60
@@ -0,0 +1,103 @@
+from app.extensions import db
+from app.models import Service, Job, JobChat
+from app.services.job_chat import message_page, notifier
+
+
+def _setup_job(users, login_as=None):
+    ids = {role: users.create(f'chat_{role}') for role in ('client', 'provider', 'outsider')}
+    service = Service(provider_id=ids['provider'], name='Painting', category='Home', price=10,
+                      latitude=0.0, longitude=0.0)
+    db.session.add(service)
+    db.session.flush()
+    job = Job(client_id=ids['client'], provider_id=ids['provider'], service_id=service.id,
+              status='In_Progress', price=10)
+    db.session.add(job)
+    db.session.commit()
+    if login_as is not None:
+        users.login(ids[login_as])
+    return job.id, ids
+
+
+def _say(job_id, sender_id, count):
+    db.session.add_all(JobChat(job_id=job_id, sender_id=sender_id, message=f'msg {i}') for i in range(count))
+    db.session.commit()
+
+
+def test_history_pages_walk_back_without_gaps(app, users):
+    with app.app_context():
+        job_id, ids = _setup_job(users)
+        _say(job_id, ids['client'], 23)
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = message_page(job_id, limit=10, before=cursor)
+            assert [m.id for m in page] == sorted(m.id for m in page)  # each page reads oldest first
+            seen = [m.message for m in page] + seen
+            if cursor is None:
+                break
+
+        assert seen == [f'msg {i}' for i in range(23)]
+
+
+def test_history_endpoint_is_for_participants_only(app, users):
+    with app.app_context():
+        job_id, ids = _setup_job(users, login_as='outsider')
+        _say(job_id, ids['client'], 3)
+
+    assert users.get(f'/linkup/job/{job_id}/messages').status_code == 403
+    assert users.get(f'/linkup/job/{job_id}/stream').status_code == 403
+    users.post('/linkup/chat/send', data={'job_id': job_id, 'message': 'let me in'})
+
+    with app.app_context():
+        assert JobChat.query.filter_by(job_id=job_id).count() == 3
+
+
+def test_json_send_and_history(app, users):
+    with app.app_context():
+        job_id, ids = _setup_job(users, login_as='client')
+        _say(job_id, ids['provider'], 2)
+
+    sent = users.post('/linkup/chat/send', data={'job_id': job_id, 'message': 'On my way?'},
+                      headers={'Accept': 'application/json'})
+    history = users.get(f'/linkup/job/{job_id}/messages?limit=2').get_json()
+
+    assert sent.status_code == 201
+    assert sent.get_json()['sender'] == 'chat_client'
+    assert [m['message'] for m in history['messages']] == ['msg 1', 'On my way?']
+    assert history['next_cursor'] is not None
+
+
+def test_stream_sends_messages_after_the_cursor(app, users, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHAT_STREAM_SECONDS', 0)
+    with app.app_context():
+        job_id, ids = _setup_job(users, login_as='client')
+        _say(job_id, ids['provider'], 4)
+        first_id = JobChat.query.filter_by(job_id=job_id).order_by(JobChat.id).first().id
+
+    response = users.get(f'/linkup/job/{job_id}/stream?after={first_id + 1}')
+    body = response.get_data(as_text=True)
+    resumed = users.get(f'/linkup/job/{job_id}/stream', headers={'Last-Event-ID': str(first_id + 2)})
+    resumed_body = resumed.get_data(as_text=True)
+    fresh = users.get(f'/linkup/job/{job_id}/stream').get_data(as_text=True)
+
+    assert response.mimetype == 'text/event-stream'
+    assert body.startswith('retry: 3000')
+    assert [line for line in body.splitlines() if line.startswith('id:')] == [
+        f'id: {first_id + 2}', f'id: {first_id + 3}'
+    ]
+    assert '"message": "msg 3"' in body
+    assert [line for line in resumed_body.splitlines() if line.startswith('id:')] == [f'id: {first_id + 3}']
+    assert 'id:' not in fresh  # no cursor: only messages from now on
+
+
+def test_commit_wakes_streams_for_that_job(app, users):
+    with app.app_context():
+        job_id, ids = _setup_job(users)
+        before = notifier.version(job_id)
+
+        db.session.add(JobChat(job_id=job_id, sender_id=ids['client'], message='ping'))
+        db.session.flush()
+        assert notifier.version(job_id) == before  # not until the commit lands
+        db.session.commit()
+
+        assert notifier.wait(job_id, before, timeout=0) == before + 1
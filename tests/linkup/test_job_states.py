@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+import pytest
+from app.extensions import db
+from app.models import User, Service, Job, JobTransition, EscrowHold
+from app.services.escrow import EscrowService
+from app.services.job_states import (
+    transition, bulk_transition, cancel_stale_pending, time_in_state, InvalidTransition,
+    PENDING, IN_PROGRESS, COMPLETED, PAID, DISPUTED, CANCELLED
+)
+
+
+def _jobs(users, count, status=PENDING, created_at=None, client=None, provider=None):
+    client = client or users.create('client')
+    provider = provider or users.create('sparky')
+    service = Service(provider_id=provider, name='Wiring', category='Electrical', price=10, latitude=0.0, longitude=0.0)
+    db.session.add(service)
+    db.session.flush()
+    jobs = [Job(client_id=client, provider_id=provider, service_id=service.id, status=status, price=10,
+                created_at=created_at or datetime.utcnow()) for _ in range(count)]
+    db.session.add_all(jobs)
+    db.session.commit()
+    return jobs
+
+
+def test_transitions_stamp_and_log(app, users):
+    with app.app_context():
+        (job,) = _jobs(users, 1)
+        start = datetime(2026, 3, 1, 9)
+
+        transition(job, IN_PROGRESS, actor_id=job.client_id, now=start)
+        transition(job, DISPUTED, now=start + timedelta(hours=1))
+        transition(job, IN_PROGRESS, now=start + timedelta(hours=2))
+        transition(job, COMPLETED, now=start + timedelta(hours=3))
+        transition(job, PAID, now=start + timedelta(hours=4))
+        db.session.commit()
+
+        job = db.session.get(Job, job.id)
+        assert job.status == PAID and job.is_paid
+        assert job.started_at == start  # kept from the first time it started
+        assert (job.completed_at, job.paid_at) == (start + timedelta(hours=3), start + timedelta(hours=4))
+        assert [(t.from_status, t.to_status) for t in job.transitions] == [
+            (PENDING, IN_PROGRESS), (IN_PROGRESS, DISPUTED), (DISPUTED, IN_PROGRESS),
+            (IN_PROGRESS, COMPLETED), (COMPLETED, PAID)
+        ]
+        assert job.transitions[0].actor_id == job.client_id
+
+
+def test_illegal_and_stale_transitions_are_refused(app, users):
+    with app.app_context():
+        (job,) = _jobs(users, 1)
+
+        with pytest.raises(InvalidTransition):
+            transition(job, COMPLETED)
+
+        # Another request cancels it after we read it
+        Job.query.filter_by(id=job.id).update({'status': CANCELLED})
+        with pytest.raises(InvalidTransition):
+            transition(job, IN_PROGRESS)
+        db.session.rollback()
+        assert JobTransition.query.count() == 0
+
+
+def test_bulk_transition_moves_matching_jobs_in_one_update(app, users):
+    with app.app_context():
+        old = _jobs(users, 3, created_at=datetime(2026, 1, 1))
+        fresh = _jobs(users, 2, client=old[0].client_id, provider=old[0].provider_id)
+        started = _jobs(users, 1, status=IN_PROGRESS, created_at=datetime(2026, 1, 1),
+                        client=old[0].client_id, provider=old[0].provider_id)
+
+        cancelled = cancel_stale_pending(now=datetime(2026, 2, 1))
+
+        assert sorted(cancelled) == sorted(job.id for job in old)
+        assert {db.session.get(Job, job.id).status for job in old} == {CANCELLED}
+        assert {db.session.get(Job, job.id).status for job in fresh + started} == {PENDING, IN_PROGRESS}
+        assert JobTransition.query.filter_by(to_status=CANCELLED).count() == 3
+        with pytest.raises(InvalidTransition):
+            bulk_transition(CANCELLED, IN_PROGRESS)
+
+
+def test_cancelled_jobs_are_refunded_in_one_batch(app, users):
+    with app.app_context():
+        client = users.create('client', wallet_balance=100)
+        jobs = _jobs(users, 3, created_at=datetime(2026, 1, 1), client=client)
+        for job in jobs:
+            assert EscrowService.hold(job.id)['success']
+
+        cancel_stale_pending(now=datetime(2026, 2, 1))
+        result = EscrowService.refund_cancelled()
+
+        assert (result['count'], result['total']) == (3, 30)
+        assert db.session.get(User, client).wallet_balance == 100
+        assert {hold.status for hold in EscrowHold.query} == {'refunded'}
+
+
+def test_time_in_state_from_the_log(app, users):
+    with app.app_context():
+        jobs = _jobs(users, 2)
+        start = datetime(2026, 3, 1, 9)
+        for job, hours in zip(jobs, (2, 4)):
+            transition(job, IN_PROGRESS, now=start)
+            transition(job, COMPLETED, now=start + timedelta(hours=hours))
+        db.session.commit()
+
+        stats = time_in_state()
+
+        assert stats[IN_PROGRESS] == {'count': 2, 'avg_seconds': pytest.approx(3 * 3600, abs=1)}
+        assert COMPLETED not in stats  # still there, so no finished stay to measure
+
+
+def test_hire_and_complete_go_through_the_state_machine(app, users):
+    with app.app_context():
+        customer, provider = users.create('customer', wallet_balance=100), users.create('sparky')
+        service = Service(provider_id=provider, name='Wiring', category='Electrical', price=40, latitude=0.0, longitude=0.0)
+        db.session.add(service)
+        db.session.commit()
+        service_id = service.id
+
+    users.login(customer)
+    users.post(f'/linkup/hire/{service_id}')
+    with app.app_context():
+        job_id = Job.query.filter_by(client_id=customer).one().id
+    users.post(f'/linkup/complete/{job_id}')
+    users.post(f'/linkup/complete/{job_id}')  # second sign-off is refused
+
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.is_paid) == (PAID, True)
+        assert job.started_at and job.completed_at and job.paid_at
+        assert [t.to_status for t in job.transitions] == [IN_PROGRESS, COMPLETED, PAID]
+        assert db.session.get(User, provider).wallet_balance == 40
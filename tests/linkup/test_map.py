@@ -17,3 +17,178 @@ def test_map_interface_loads(client, auth):
     assert response.status_code == 200
     # We look for the unique CSS ID for the map container
     assert b'id="map"' in response.data or b'LinkUp' in response.data
+
+
+def test_map_data_only_returns_viewport(client, app, users):
+    """QA: Does the map API skip pins outside the visible bbox?"""
+    from app.models import Service, CivicIssue
+    from app.services.geo_service import encode
+
+    user_id = users.create_and_login("viewport_user")
+
+    with app.app_context():
+        # One plumber in Soweto, one in Cape Town
+        soweto = Service(provider_id=user_id, name="Soweto Plumber", category="Plumbing", price=100,
+                         latitude=-26.2321, longitude=27.8816)
+        cape_town = Service(provider_id=user_id, name="Cape Plumber", category="Plumbing", price=100,
+                            latitude=-33.9249, longitude=18.4241)
+        pothole = CivicIssue(reporter_id=user_id, title="Pothole", description="Deep one", category="Pothole",
+                             latitude=-26.2300, longitude=27.8800)
+        db.session.add_all([soweto, cape_town, pothole])
+        db.session.commit()
+
+        # Grid cell is stamped on insert and follows updates
+        assert soweto.geohash == encode(-26.2321, 27.8816)
+        cape_town.latitude = -33.9000
+        db.session.commit()
+        assert cape_town.geohash == encode(-33.9000, 18.4241)
+
+    response = client.get('/api/map-data?bbox=27.80,-26.30,27.95,-26.20&zoom=13')
+    assert response.status_code == 200
+    assert [s['title'] for s in response.json['services']] == ["Soweto Plumber"]
+    assert [i['title'] for i in response.json['issues']] == ["Pothole"]
+
+    # Without a bbox the whole dataset is returned
+    response = client.get('/api/map-data')
+    assert len(response.json['services']) == 2
+
+
+def test_map_clusters_aggregate_per_tile(client, app, users):
+    """QA: Does the cluster endpoint collapse nearby pins into one cached cluster?"""
+    from app.models import Service, CivicIssue
+    from app.services.geo_service import tile_for
+
+    user_id = users.create_and_login("cluster_user")
+
+    with app.app_context():
+        db.session.add_all([
+            Service(provider_id=user_id, name="Plumber A", category="Plumbing", price=100,
+                    latitude=-26.2321, longitude=27.8816),
+            Service(provider_id=user_id, name="Plumber B", category="Plumbing", price=100,
+                    latitude=-26.2322, longitude=27.8817),
+            CivicIssue(reporter_id=user_id, title="Pothole", description="Deep one", category="Pothole",
+                       latitude=-26.2323, longitude=27.8815, ai_risk_score=90),
+        ])
+        db.session.commit()
+
+    x, y = tile_for(-26.2321, 27.8816, 10)
+    response = client.get(f'/api/map-clusters/10/{x}/{y}')
+    assert response.status_code == 200
+    [cluster] = response.json['clusters']
+    assert cluster['count'] == 3
+    assert cluster['services'] == 2 and cluster['issues'] == 1
+    assert cluster['max_severity'] == 90
+    assert cluster['categories'] == {'Plumbing': 2, 'Pothole': 1}
+
+    # A new pin in the tile invalidates the cached cluster
+    with app.app_context():
+        db.session.add(Service(provider_id=user_id, name="Sparky", category="Electrical", price=100,
+                               latitude=-26.2324, longitude=27.8818))
+        db.session.commit()
+    [cluster] = client.get(f'/api/map-clusters/10/{x}/{y}').json['clusters']
+    assert cluster['count'] == 4
+
+    assert client.get('/api/map-clusters/2/9/0').status_code == 404
+
+
+def test_vector_tile_cached_and_invalidated(client, app, users, tmp_path):
+    """QA: Is the .mvt tile served from disk and dropped when a pin in it changes?"""
+    import os
+    from app.models import Service
+    from app.services.geo_service import tile_for
+
+    app.config['TILE_CACHE_DIR'] = str(tmp_path)
+    try:
+        user_id = users.create_and_login("tile_user")
+
+        with app.app_context():
+            db.session.add(Service(provider_id=user_id, name="Tile Plumber", category="Plumbing", price=120,
+                                   latitude=-26.2321, longitude=27.8816))
+            db.session.commit()
+
+        x, y = tile_for(-26.2321, 27.8816, 14)
+        response = client.get(f'/tiles/14/{x}/{y}.mvt')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/vnd.mapbox-vector-tile'
+        assert b'services' in response.data and b'Tile Plumber' in response.data
+
+        cached = tmp_path / '0' / '14' / str(x) / f'{y}.mvt'
+        assert cached.exists()
+
+        # Moving the pin out of the tile purges the cached file on commit
+        with app.app_context():
+            service = Service.query.filter_by(name="Tile Plumber").first()
+            service.latitude = -33.9249
+            db.session.commit()
+        assert not cached.exists()
+        assert b'Tile Plumber' not in client.get(f'/tiles/14/{x}/{y}.mvt').data
+    finally:
+        app.config['TILE_CACHE_DIR'] = None
+
+
+def test_vector_tile_cache_generations_and_max_age(client, app, users, tmp_path):
+    """QA: Does recreating a table retire the cache without deleting it, and do old tiles expire?"""
+    import os
+    from app.services.tile_service import generation, prune_generations
+
+    app.config['TILE_CACHE_DIR'] = str(tmp_path)
+    try:
+        users.create_and_login("gen_user")
+
+        assert client.get('/tiles/3/4/4.mvt').status_code == 200
+        old_tile = tmp_path / '0' / '3' / '4' / '4.mvt'
+        assert old_tile.exists()
+
+        # A tile past TILE_MAX_AGE is rebuilt in place
+        os.utime(old_tile, (0, 0))
+        client.get('/tiles/3/4/4.mvt')
+        assert os.path.getmtime(old_tile) > 0
+
+        # create_all/drop_all switch generations; the old tiles stay until pruned
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            current = generation(str(tmp_path))
+        assert current != '0' and old_tile.exists()
+        assert prune_generations(str(tmp_path)) == 1
+        assert not old_tile.exists()
+    finally:
+        app.config['TILE_CACHE_DIR'] = None
+
+
+def test_map_data_delta_sync(client, app, users):
+    """QA: Does ?since= return only changes and deletions after the cursor?"""
+    from datetime import datetime, timedelta
+    from app.models import Service
+
+    user_id = users.create_and_login("sync_user")
+
+    with app.app_context():
+        old = Service(provider_id=user_id, name="Old Plumber", category="Plumbing", price=100,
+                      latitude=-26.2321, longitude=27.8816)
+        doomed = Service(provider_id=user_id, name="Closing Down", category="Plumbing", price=100,
+                         latitude=-26.2322, longitude=27.8817)
+        db.session.add_all([old, doomed])
+        db.session.commit()
+        doomed_id = doomed.id
+        # Pretend both were last touched an hour ago
+        db.session.execute(Service.__table__.update().values(updated_at=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+
+    first = client.get('/api/map-data').json
+    assert first['full'] is True
+    assert len(first['services']) == 2
+
+    with app.app_context():
+        db.session.delete(db.session.get(Service, doomed_id))
+        db.session.add(Service(provider_id=user_id, name="New Sparky", category="Electrical", price=80,
+                               latitude=-26.2323, longitude=27.8818))
+        db.session.commit()
+
+    delta = client.get(f"/api/map-data?since={first['cursor']}").json
+    assert delta['full'] is False
+    assert [s['title'] for s in delta['services']] == ["New Sparky"]
+    assert delta['deleted']['services'] == [doomed_id]
+
+    # A garbage cursor falls back to a full sync
+    assert client.get('/api/map-data?since=yesterday').json['full'] is True
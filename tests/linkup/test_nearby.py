@@ -0,0 +1,105 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app.extensions import db
+from app.models import User, Service
+from app.services.nearby_service import nearest_services, KDTree, to_unit_vector
+from app.services.radar_service import haversine
+
+
+def test_kdtree_matches_brute_force():
+    """QA: Does the KD-tree return the same k nearest as a full scan?"""
+    random.seed(7)
+    points = [(-26.2 + random.uniform(-0.2, 0.2), 27.9 + random.uniform(-0.2, 0.2)) for _ in range(500)]
+    tree = KDTree(list(range(len(points))), [to_unit_vector(lat, lng) for lat, lng in points])
+
+    hits = tree.query(to_unit_vector(-26.2, 27.9), 10, 2.0)
+
+    expected = sorted(range(len(points)), key=lambda i: haversine(-26.2, 27.9, *points[i]))[:10]
+    assert [service_id for _, service_id in hits] == expected
+
+
+def test_nearest_services_sorted_by_distance(app):
+    """QA: Do we get the closest providers of the right category, nearest first?"""
+    with app.app_context():
+        provider = User(username="nearby_provider", email="np@test.com", password_hash="x")
+        db.session.add(provider)
+        db.session.commit()
+
+        far = Service(provider_id=provider.id, name="Far Plumber", category="Plumbing", price=100,
+                      latitude=-26.2400, longitude=27.8546)
+        close = Service(provider_id=provider.id, name="Close Plumber", category="Plumbing", price=100,
+                        latitude=-26.2480, longitude=27.8546)
+        sparky = Service(provider_id=provider.id, name="Sparky", category="Electrical", price=100,
+                         latitude=-26.2484, longitude=27.8546)
+        db.session.add_all([far, close, sparky])
+        db.session.commit()
+
+        results = nearest_services(-26.2485, 27.8546, k=5, category="plumber", radius_meters=2000)
+        assert [s.name for s, _ in results] == ["Close Plumber", "Far Plumber"]
+        assert results[0][1] < results[1][1]
+
+        # Radius is a hard cut-off
+        results = nearest_services(-26.2485, 27.8546, k=5, category="Plumbing", radius_meters=200)
+        assert [s.name for s, _ in results] == ["Close Plumber"]
+
+        # Deletes drop out of the index immediately
+        db.session.delete(close)
+        db.session.commit()
+        results = nearest_services(-26.2485, 27.8546, k=5, radius_meters=2000)
+        assert [s.name for s, _ in results] == ["Sparky", "Far Plumber"]
+
+
+def test_nearest_services_catches_up_out_of_order_commits(app):
+    """QA: Is a row with a lower id, committed by another worker after a higher one, still found?"""
+    with app.app_context():
+        provider = User(username="nearby_late", email="nl@test.com", password_hash="x")
+        db.session.add(provider)
+        db.session.commit()
+
+        db.session.add_all([
+            Service(id=10, provider_id=provider.id, name="Early", category="Plumbing", price=100,
+                    latitude=-26.2480, longitude=27.8546),
+            Service(id=20, provider_id=provider.id, name="Later", category="Plumbing", price=100,
+                    latitude=-26.2470, longitude=27.8546),
+        ])
+        db.session.commit()
+        assert len(nearest_services(-26.2485, 27.8546, k=5, radius_meters=2000)) == 2
+
+        # A Core insert skips this process's mapper hooks, like a commit from another worker
+        db.session.execute(insert(Service).values(
+            id=15, provider_id=provider.id, name="Slow Commit", category="Plumbing", price=100,
+            latitude=-26.2484, longitude=27.8546, updated_at=datetime.utcnow()
+        ))
+        db.session.commit()
+
+        results = nearest_services(-26.2485, 27.8546, k=5, radius_meters=2000)
+        assert [s.name for s, _ in results] == ["Slow Commit", "Early", "Later"]
+
+
+def test_nearest_services_sees_commits_long_after_the_stamp(app):
+    """QA: Is a row stamped minutes before it commits still caught up, and a rolled-back move ignored?"""
+    with app.app_context():
+        provider = User(username="nearby_slow", email="ns@test.com", password_hash="x")
+        db.session.add(provider)
+        db.session.commit()
+        db.session.add(Service(provider_id=provider.id, name="Fresh", category="Plumbing", price=100,
+                               latitude=-26.2480, longitude=27.8546))
+        db.session.commit()
+        assert len(nearest_services(-26.2485, 27.8546, k=5, radius_meters=2000)) == 1
+
+        # Stamped five minutes ago by a transaction that only commits now
+        db.session.execute(insert(Service).values(
+            provider_id=provider.id, name="Long Transaction", category="Plumbing", price=100,
+            latitude=-26.2484, longitude=27.8546, updated_at=datetime.utcnow() - timedelta(minutes=5)
+        ))
+        db.session.commit()
+        assert [s.name for s, _ in nearest_services(-26.2485, 27.8546, k=5, radius_meters=2000)] == [
+            "Long Transaction", "Fresh"
+        ]
+
+        fresh = Service.query.filter_by(name="Fresh").one()
+        fresh.latitude = -33.9249
+        db.session.flush()
+        db.session.rollback()
+        assert len(nearest_services(-26.2485, 27.8546, k=5, radius_meters=2000)) == 2
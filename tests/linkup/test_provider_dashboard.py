@@ -0,0 +1,78 @@
+from app.extensions import db
+from app.models import Service, Job, Review
+from app.services.provider_stats import provider_stats, job_page
+
+
+def _add_jobs(client_id, provider_id, specs):
+    """specs: list of (status, price, is_paid)"""
+    service = Service(provider_id=provider_id, name='Tiling', category='Home', price=10, latitude=0.0, longitude=0.0)
+    db.session.add(service)
+    db.session.flush()
+    jobs = [Job(client_id=client_id, provider_id=provider_id, service_id=service.id, status=status, price=price,
+                is_paid=is_paid) for status, price, is_paid in specs]
+    db.session.add_all(jobs)
+    db.session.commit()
+    return [job.id for job in jobs]
+
+
+def test_stats_are_aggregated_per_status(app, users):
+    with app.app_context():
+        client, provider = users.create('homeowner'), users.create('tiler', role='provider')
+        job_ids = _add_jobs(client, provider, [
+            ('Completed', 100, True), ('Completed', 40.5, True), ('Completed', 30, False),
+            ('Paid', 25, True), ('In_Progress', 70, False), ('Cancelled', 20, False),
+        ])
+        _add_jobs(client, users.create('other', role='provider'), [('Completed', 999, True)])
+        db.session.add_all([
+            Review(job_id=job_ids[0], reviewer_id=client, reviewee_id=provider, rating=5, role_rated='provider'),
+            Review(job_id=job_ids[1], reviewer_id=client, reviewee_id=provider, rating=4, role_rated='provider'),
+            Review(job_id=job_ids[0], reviewer_id=provider, reviewee_id=client, rating=1, role_rated='customer'),
+        ])
+        db.session.commit()
+
+        stats = provider_stats(provider)
+
+        assert stats['total_earnings'] == 165.5
+        assert stats['completed_jobs'] == 4
+        assert stats['total_jobs'] == 6
+        assert stats['jobs_by_status'] == {'Completed': 3, 'Paid': 1, 'In_Progress': 1, 'Cancelled': 1}
+        assert (stats['average_rating'], stats['review_count']) == (4.5, 2)
+
+
+def test_stats_for_a_new_provider(app, users):
+    with app.app_context():
+        stats = provider_stats(users.create('newbie', role='provider'))
+
+        assert stats['total_earnings'] == 0
+        assert stats['jobs_by_status'] == {}
+        assert stats['average_rating'] is None
+
+
+def test_job_pages_walk_every_job_newest_first(app, users):
+    with app.app_context():
+        client, provider = users.create('homeowner'), users.create('tiler', role='provider')
+        job_ids = _add_jobs(client, provider, [('Pending', 10, False)] * 45)
+
+        seen, cursor = [], None
+        while True:
+            jobs, cursor = job_page(Job.provider_id, provider, limit=20, before=cursor)
+            seen.extend(job.id for job in jobs)
+            if cursor is None:
+                break
+
+        assert seen == sorted(job_ids, reverse=True)
+        assert [job.id for job in job_page(Job.client_id, client, limit=5)[0]] == seen[:5]
+
+
+def test_dashboard_renders_stats_and_pager(app, users):
+    with app.app_context():
+        homeowner, provider = users.create('homeowner'), users.create('tiler', role='provider')
+        _add_jobs(homeowner, provider, [('Completed', 25, True)] * 21)
+
+    users.login(provider)
+    page = users.get('/linkup/dashboard')
+
+    assert page.status_code == 200
+    assert b'525.00' in page.data
+    assert b'Completed: <span class="text-white font-bold">21</span>' in page.data
+    assert b'OLDER' in page.data
@@ -0,0 +1,134 @@
+import pytest
+from app.extensions import db
+from app.models import Service, Job, Review, RatingAggregate
+from app.services.ratings import rating_for, top_rated, rebuild_rating_aggregates
+
+
+def _service_for(provider_id):
+    service = Service(provider_id=provider_id, name='Braiding', category='Beauty', price=10, latitude=-26.2, longitude=27.9)
+    db.session.add(service)
+    db.session.commit()
+    return service.id
+
+
+def _review(client_id, provider_id, service_id, rating, role_rated='provider'):
+    job = Job(client_id=client_id, provider_id=provider_id, service_id=service_id, status='Completed', price=10)
+    db.session.add(job)
+    db.session.flush()
+    reviewer, reviewee = (client_id, provider_id) if role_rated == 'provider' else (provider_id, client_id)
+    review = Review(job_id=job.id, reviewer_id=reviewer, reviewee_id=reviewee, rating=rating, role_rated=role_rated)
+    db.session.add(review)
+    db.session.commit()
+    return review
+
+
+def test_inserts_keep_aggregate_current(app, users):
+    with app.app_context():
+        client, provider = users.create('client'), users.create('braider')
+        service_id = _service_for(provider)
+        for rating in (5, 4, 4, 1):
+            _review(client, provider, service_id, rating)
+        _review(client, provider, service_id, 2, role_rated='customer')
+
+        aggregate = rating_for(provider)
+        assert (aggregate.review_count, aggregate.rating_sum, aggregate.average) == (4, 14, 3.5)
+        assert aggregate.histogram == {1: 1, 2: 0, 3: 0, 4: 2, 5: 1}
+        assert rating_for(client, 'customer').average == 2
+        assert rating_for(provider, 'customer') is None
+
+
+def test_delete_backs_the_review_out(app, users):
+    with app.app_context():
+        client, provider = users.create('client'), users.create('braider')
+        service_id = _service_for(provider)
+        keep = _review(client, provider, service_id, 5)
+        drop = _review(client, provider, service_id, 2)
+
+        db.session.delete(drop)
+        db.session.commit()
+
+        aggregate = rating_for(provider)
+        assert (aggregate.review_count, aggregate.average, aggregate.stars_2) == (1, 5, 0)
+        db.session.delete(keep)
+        db.session.commit()
+        assert (rating_for(provider).review_count, rating_for(provider).average) == (0, 0)
+
+
+def test_failed_insert_leaves_aggregate_untouched(app, users):
+    with app.app_context():
+        client, provider = users.create('client'), users.create('braider')
+        service_id = _service_for(provider)
+        _review(client, provider, service_id, 4)
+
+        with pytest.raises(ValueError):
+            _review(client, provider, service_id, 9)
+        db.session.rollback()
+
+        assert rating_for(provider).review_count == 1
+
+
+def test_rebuild_matches_incremental(app, users):
+    with app.app_context():
+        client = users.create('client')
+        providers = [users.create(f'braider{i}') for i in range(3)]
+        for i, provider in enumerate(providers):
+            service_id = _service_for(provider)
+            for rating in range(1, 3 + i):
+                _review(client, provider, service_id, rating)
+        incremental = [(a.reviewee_id, a.review_count, a.average, a.histogram) for a in RatingAggregate.query.order_by('reviewee_id')]
+
+        assert rebuild_rating_aggregates() == 3
+        rebuilt = [(a.reviewee_id, a.review_count, a.average, a.histogram) for a in RatingAggregate.query.order_by('reviewee_id')]
+        assert rebuilt == incremental
+        assert [a.reviewee_id for a in top_rated()] == providers[::-1]
+
+
+def test_map_data_filters_by_provider_rating(app, users):
+    with app.app_context():
+        viewer = users.create('viewer')
+        good, poor = users.create('good'), users.create('poor')
+        good_service, poor_service = _service_for(good), _service_for(poor)
+        _review(viewer, good, good_service, 5)
+        _review(viewer, poor, poor_service, 2)
+        _service_for(users.create('unrated'))
+
+    users.login(viewer)
+    everything = users.get('/api/map-data').get_json()['services']
+    rated = users.get('/api/map-data?min_rating=4').get_json()['services']
+
+    assert sorted((s['rating'], s['reviews']) for s in everything if s['rating']) == [(2.0, 1), (5.0, 1)]
+    assert any(s['rating'] is None and s['reviews'] == 0 for s in everything)
+    assert [s['id'] for s in rated] == [good_service]
+
+
+def test_map_delta_drops_services_that_fall_below_min_rating(app, users):
+    from datetime import datetime, timedelta
+
+    with app.app_context():
+        viewer = users.create('viewer')
+        good, steady = users.create('good'), users.create('steady')
+        good_service, steady_service = _service_for(good), _service_for(steady)
+        review = _review(viewer, good, good_service, 5)
+        review_id = review.id
+        _review(viewer, steady, steady_service, 5)
+
+    users.login(viewer)
+    first = users.get('/api/map-data?min_rating=4').get_json()
+    assert sorted(s['id'] for s in first['services']) == [good_service, steady_service]
+
+    with app.app_context():
+        _review(viewer, good, good_service, 1)
+    delta = users.get(f"/api/map-data?min_rating=4&since={first['cursor']}").get_json()
+    assert good_service not in [s['id'] for s in delta['services']]
+    assert delta['deleted']['services'] == [good_service]
+
+    # A rebuild that changes an average resends only that provider's services
+    with app.app_context():
+        hour_ago = datetime.utcnow() - timedelta(hours=1)
+        Service.query.update({'updated_at': hour_ago})
+        Review.query.filter_by(id=review_id).update({'rating': 1})  # behind the aggregate's back
+        db.session.commit()
+        rebuild_rating_aggregates()
+
+        assert db.session.get(Service, good_service).updated_at > hour_ago
+        assert db.session.get(Service, steady_service).updated_at == hour_ago
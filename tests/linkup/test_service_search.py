@@ -0,0 +1,60 @@
+from app.extensions import db
+from app.models import Service
+from app.services.search_service import search_services, search_terms
+
+
+def _seed_services(users):
+    provider_id = users.create('search_provider')
+    listings = [
+        ('Thabo Electrical', 'Electrical', 'Wiring, DB boards and COC certificates'),
+        ('Lerato Plumbing', 'Plumbing', 'Burst pipes and geyser installs'),
+        ('Handy Sipho', 'Home', 'Odd jobs, some plumbing and painting'),
+        ('Zanele Braids', 'Beauty', 'Box braids and cornrows'),
+    ]
+    db.session.add_all(Service(provider_id=provider_id, name=name, category=category, description=description,
+                               price=10, latitude=-26.2, longitude=27.9)
+                       for name, category, description in listings)
+    db.session.commit()
+    return provider_id
+
+
+def test_slang_finds_the_trade(app, users):
+    with app.app_context():
+        _seed_services(users)
+        assert search_terms('hire a sparky') == [('sparky', 'electrical', 'electrician')]
+        assert [s.name for s in search_services('sparky')] == ['Thabo Electrical']
+        assert [s.name for s in search_services('braids')] == ['Zanele Braids']
+
+
+def test_prefixes_match_and_name_beats_description(app, users):
+    with app.app_context():
+        _seed_services(users)
+        names = [s.name for s in search_services('plumb')]
+        # Named and categorised Plumbing outranks a passing mention in a description
+        assert names == ['Lerato Plumbing', 'Handy Sipho']
+        assert search_services('the a me') == []
+
+
+def test_index_follows_edits_and_deletes(app, users):
+    with app.app_context():
+        _seed_services(users)
+        Service.query.filter_by(name='Zanele Braids').update({'name': 'Zanele Hair Studio'})
+        db.session.commit()
+        assert [s.name for s in search_services('studio')] == ['Zanele Hair Studio']
+
+        Service.query.filter_by(name='Lerato Plumbing').delete()
+        db.session.commit()
+        assert [s.name for s in search_services('plumber')] == ['Handy Sipho']
+
+
+def test_voice_hire_searches_any_trade(app, users):
+    with app.app_context():
+        users.login(_seed_services(users))
+
+    response = users.post('/macalaa/api/macalaa/voice', json={'command': 'Hire a sparky'})
+    assert response.status_code == 200
+    assert 'Electrical' in response.json['response']
+    assert response.json['action'] == {'type': 'navigate', 'url': '/linkup/map'}
+
+    response = users.post('/macalaa/api/macalaa/voice', json={'command': 'hire a pilot'})
+    assert response.json['action'] is None
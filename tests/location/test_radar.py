@@ -0,0 +1,32 @@
+from app.extensions import db
+from app.models import Opportunity, NewsItem
+from app.services.radar_service import haversine, haversine_many, scan_surroundings, get_breaking_news
+
+
+def test_vectorized_haversine_matches_scalar():
+    """QA: Does the NumPy kernel agree with the scalar formula?"""
+    lats = [-26.2321, -26.2041, -33.9249]
+    longs = [27.8816, 28.0473, 18.4241]
+
+    distances = haversine_many(-26.2485, 27.8546, lats, longs)
+
+    for lat, lng, distance in zip(lats, longs, distances):
+        assert abs(distance - haversine(-26.2485, 27.8546, lat, lng)) < 0.01
+
+
+def test_radar_only_reports_spots_inside_radius(app):
+    """QA: Does the radar ignore spots outside the scan radius?"""
+    with app.app_context():
+        db.session.add_all([
+            Opportunity(title="Kasi Dev Internship", category="Internship", latitude=-26.2400, longitude=27.8600),
+            Opportunity(title="Cape Town Job", category="Job", latitude=-33.9249, longitude=18.4241),
+            NewsItem(title="Water outage", category="Community", latitude=-26.2500, longitude=27.8500, is_breaking=True),
+            NewsItem(title="Durban traffic", category="Traffic", latitude=-29.8587, longitude=31.0218, is_breaking=True),
+        ])
+        db.session.commit()
+
+        tags = scan_surroundings(-26.2485, 27.8546)
+        assert tags == ["🎯 OPPORTUNITY: Kasi Dev Internship (Internship)", "🚨 BREAKING: Water outage"]
+
+        news = get_breaking_news(-26.2485, 27.8546)
+        assert [n['title'] for n in news] == ["Water outage"]
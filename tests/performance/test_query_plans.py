@@ -0,0 +1,65 @@
+"""
+EXPLAIN guards for the hot per-user queries.
+
+Fails if any of them regresses to a full table scan or an in-memory sort.
+"""
+from datetime import datetime
+import pytest
+from sqlalchemy import tuple_
+from sqlalchemy.dialects import sqlite
+from app.extensions import db
+from app.models import (
+    Transaction, Goal, NetworkAlert, NetworkContact, DiaryEntry, ChatLog,
+    JobChat, Job, BalaaHistory, Milestone, EscrowHold, Review, RatingAggregate,
+    JobTransition, BackgroundTask
+)
+
+
+# Built lazily: Model.query needs an app context
+HOT_QUERIES = {
+    'wallet history': lambda: Transaction.query.filter_by(user_id=1).order_by(Transaction.timestamp.desc()).limit(10),
+    'wallet history page': lambda: Transaction.query.filter_by(user_id=1)
+        .filter(tuple_(Transaction.timestamp, Transaction.id) < (datetime(2026, 1, 1), 500))
+        .order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(11),
+    'active goals': lambda: Goal.query.filter_by(user_id=1, is_completed=False, parent_id=None),
+    'upcoming alerts': lambda: NetworkAlert.query.filter_by(user_id=1, is_completed=False)
+        .filter(NetworkAlert.alert_date > datetime(2026, 1, 1)),
+    'contact alerts': lambda: NetworkAlert.query.filter_by(contact_id=1),
+    'contacts': lambda: NetworkContact.query.filter_by(user_id=1),
+    'diary': lambda: DiaryEntry.query.filter_by(user_id=1).order_by(DiaryEntry.created_at.desc()),
+    'chat log': lambda: ChatLog.query.filter_by(user_id=1).order_by(ChatLog.created_at.desc()),
+    'job chat': lambda: JobChat.query.filter_by(job_id=1).order_by(JobChat.timestamp),
+    'provider jobs': lambda: Job.query.filter_by(provider_id=1),
+    'client jobs': lambda: Job.query.filter_by(client_id=1),
+    'provider job page': lambda: Job.query.filter_by(provider_id=1).filter(Job.id < 500).order_by(Job.id.desc()).limit(21),
+    'client job page': lambda: Job.query.filter_by(client_id=1).filter(Job.id < 500).order_by(Job.id.desc()).limit(21),
+    'provider job stats': lambda: db.session.query(Job.status, db.func.count(Job.id)).filter_by(provider_id=1)
+        .group_by(Job.status),
+    'provider rating': lambda: db.session.query(db.func.avg(Review.rating)).filter_by(reviewee_id=1, role_rated='provider'),
+    'chat history page': lambda: JobChat.query.filter_by(job_id=1).filter(JobChat.id < 500)
+        .order_by(JobChat.id.desc()).limit(51),
+    'chat stream poll': lambda: JobChat.query.filter_by(job_id=1).filter(JobChat.id > 500).order_by(JobChat.id).limit(50),
+    'stale pending sweep': lambda: Job.query.filter(Job.status == 'Pending', Job.created_at < datetime(2026, 1, 1)),
+    'job transitions': lambda: JobTransition.query.filter_by(job_id=1).order_by(JobTransition.id),
+    'top rated providers': lambda: RatingAggregate.query.filter_by(role_rated='provider')
+        .filter(RatingAggregate.review_count >= 1)
+        .order_by(RatingAggregate.average.desc(), RatingAggregate.review_count.desc()).limit(10),
+    'balaa history': lambda: BalaaHistory.query.filter_by(user_id=1),
+    'milestones': lambda: Milestone.query.filter_by(goal_id=1),
+    'pending earnings': lambda: db.session.query(db.func.sum(EscrowHold.amount)).filter_by(provider_id=1, status='held'),
+    'next queued task': lambda: BackgroundTask.query.filter_by(status='queued')
+        .order_by(BackgroundTask.created_at, BackgroundTask.id).limit(1),
+}
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(app, name):
+    with app.app_context():
+        query = HOT_QUERIES[name]()
+        sql = str(query.statement.compile(dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+        assert plan, f'{name}: empty plan'
+        for step in plan:
+            assert not (step.startswith('SCAN') and 'INDEX' not in step), f'{name}: table scan in {plan}'
+            assert 'TEMP B-TREE' not in step, f'{name}: unindexed sort in {plan}'
@@ -0,0 +1,73 @@
+"""
+Concurrent wallet stress: many threads, one wallet, no lost updates.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from app.extensions import db
+from app.models import User, Transaction
+from app.services.wallet import WalletService
+
+THREADS = 8
+
+
+def _run_concurrently(app, fn, calls):
+    def worker(args):
+        with app.app_context():
+            try:
+                return fn(*args)
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(worker, calls))
+
+
+def test_concurrent_deposits_are_not_lost(app, users):
+    user_id = users.create('saver', wallet_balance=0)
+
+    results = _run_concurrently(app, WalletService.deposit, [(user_id, 1)] * 200)
+
+    assert all(r['success'] for r in results)
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 200
+        assert Transaction.query.filter_by(user_id=user_id).count() == 200
+
+
+def test_concurrent_withdrawals_never_overdraw(app, users):
+    user_id = users.create('spender', wallet_balance=100)
+
+    results = _run_concurrently(app, WalletService.withdraw, [(user_id, 10)] * 40)
+
+    # Exactly as many succeed as the balance can cover
+    assert sum(r['success'] for r in results) == 10
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 0
+        assert Transaction.query.filter_by(user_id=user_id).count() == 10
+
+
+def test_concurrent_transfers_conserve_money(app, users):
+    alice = users.create('alice', wallet_balance=500)
+    bob = users.create('bob', wallet_balance=500)
+
+    calls = [(alice, bob, 7), (bob, alice, 5)] * 100
+    results = _run_concurrently(app, WalletService.transfer, calls)
+
+    moved_to_bob = sum(7 for (src, _, _), r in zip(calls, results) if r['success'] and src == alice)
+    moved_to_alice = sum(5 for (src, _, _), r in zip(calls, results) if r['success'] and src == bob)
+    with app.app_context():
+        a = db.session.get(User, alice).wallet_balance
+        b = db.session.get(User, bob).wallet_balance
+        assert a + b == 1000
+        assert a == 500 - moved_to_bob + moved_to_alice
+        assert min(a, b) >= 0
+
+
+def test_failed_withdrawal_leaves_no_trace(app, users):
+    with app.app_context():
+        user_id = users.create('broke', wallet_balance=5)
+
+        result = WalletService.withdraw(user_id, 10)
+
+        assert not result['success']
+        assert 'Insufficient funds' in result['message']
+        assert db.session.get(User, user_id).wallet_balance == 5
+        assert Transaction.query.filter_by(user_id=user_id).count() == 0
@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models import Transaction
+from app.services.wallet import WalletService, transaction_page
+
+
+def _add_history(user_id, count, same_time_every=1):
+    start = datetime(2026, 1, 1)
+    db.session.add_all([
+        Transaction(user_id=user_id, amount=i + 0.25, transaction_type='Deposit', description=f'Deposit {i}',
+                    timestamp=start + timedelta(minutes=i // same_time_every))
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def test_pages_cover_every_row_once(app, users):
+    with app.app_context():
+        user_id = users.create('pager')
+        # Runs of identical timestamps straddle page boundaries; the id tie-break keeps them apart
+        _add_history(user_id, 47, same_time_every=4)
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            transactions, cursor = transaction_page(user_id, limit=10, before=cursor)
+            seen.extend(t.id for t in transactions)
+            pages += 1
+            if cursor is None:
+                break
+
+        expected = [t.id for t in Transaction.query.order_by(Transaction.timestamp.desc(), Transaction.id.desc())]
+        assert seen == expected
+        assert pages == 5
+
+
+def test_rows_without_timestamp_page_last(app, users):
+    with app.app_context():
+        user_id = users.create('undated')
+        _add_history(user_id, 12)
+        undated = [t.id for t in Transaction.query.filter_by(user_id=user_id).order_by(Transaction.id).limit(5)]
+        Transaction.query.filter(Transaction.id.in_(undated)).update({'timestamp': None})
+        db.session.commit()
+
+        seen, cursor = [], None
+        while True:
+            transactions, cursor = transaction_page(user_id, limit=4, before=cursor)
+            seen.extend(t.id for t in transactions)
+            if cursor is None:
+                break
+
+        assert len(seen) == len(set(seen)) == 12
+        assert seen[-5:] == sorted(undated, reverse=True)
+
+
+def test_undated_rows_render_everywhere(app, users):
+    user_id = users.create_and_login('legacy')
+    with app.app_context():
+        _add_history(user_id, 2)
+        Transaction.query.filter_by(description='Deposit 0').update({'timestamp': None})
+        db.session.commit()
+        history = WalletService.get_transaction_history(user_id)['transactions']
+        assert sorted(row['timestamp'] or '' for row in history) == ['', '2026-01-01T00:01:00']
+
+    assert users.get('/wallet').status_code == 200
+    rows = list(csv.DictReader(io.StringIO(users.get('/wallet/statement.csv').get_data(as_text=True))))
+    assert sorted(row['timestamp'] for row in rows) == ['', '2026-01-01T00:01:00']
+    body = json.loads(users.get('/wallet/statement.json').get_data(as_text=True))
+    assert None in [row['timestamp'] for row in body]
+
+
+def test_history_reports_next_cursor(app, users):
+    with app.app_context():
+        user_id = users.create('historian')
+        _add_history(user_id, 3)
+
+        first = WalletService.get_transaction_history(user_id, limit=2)
+        rest = WalletService.get_transaction_history(user_id, limit=2, before=first['next_cursor'])
+
+        assert [t['description'] for t in first['transactions']] == ['Deposit 2', 'Deposit 1']
+        assert [t['description'] for t in rest['transactions']] == ['Deposit 0']
+        assert rest['next_cursor'] is None
+        # A mangled cursor falls back to the first page
+        assert WalletService.get_transaction_history(user_id, limit=2, before='junk')['transactions'] == first['transactions']
+
+
+def test_wallet_page_links_to_older(app, users):
+    user_id = users.create_and_login('scroller')
+    with app.app_context():
+        _add_history(user_id, 12)
+
+    first = users.get('/wallet')
+    assert b'Deposit 11' in first.data and b'Deposit 1<' not in first.data
+    assert b'OLDER' in first.data
+
+    with app.app_context():
+        cursor = transaction_page(user_id, limit=10)[1]
+    older = users.get(f'/wallet?before={cursor}')
+    assert b'Deposit 1<' in older.data and b'Deposit 11' not in older.data
+    assert b'OLDER' not in older.data
+
+
+def test_csv_statement_streams_all_rows_oldest_first(app, users):
+    user_id = users.create_and_login('accountant')
+    with app.app_context():
+        _add_history(user_id, 1203)
+
+    response = users.get('/wallet/statement.csv')
+
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 1203
+    assert rows[0]['description'] == 'Deposit 0'
+    assert rows[-1]['amount'] == '1202.25'
+
+
+def test_json_statement_is_valid_json(app, users):
+    user_id = users.create_and_login('auditor')
+    with app.app_context():
+        _add_history(user_id, 3)
+
+    response = users.get('/wallet/statement.json')
+    assert users.get('/wallet/statement.xml').status_code == 404
+
+    body = json.loads(response.get_data(as_text=True))
+    assert [row['amount'] for row in body] == ['0.25', '1.25', '2.25']
+    assert body[0]['type'] == 'Deposit'
+
+
+def test_empty_statement(users):
+    users.create_and_login('newcomer')
+    response = users.get('/wallet/statement.json')
+
+    assert json.loads(response.get_data(as_text=True)) == []
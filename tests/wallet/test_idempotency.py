@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+import pytest
+from app.extensions import db
+from app.models import User, Service, Job, Transaction, IdempotencyKey
+from app.services import idempotency
+from app.services.idempotency import prune_idempotency_keys
+from app.services.wallet import WalletService
+
+
+def test_retried_deposit_is_applied_once(app, users):
+    user_id = users.create_and_login('retrier')
+
+    first = users.post('/deposit', data={'amount': '50', 'idempotency_key': 'abc123'})
+    retry = users.post('/deposit', data={'amount': '50', 'idempotency_key': 'abc123'})
+
+    assert first.status_code == retry.status_code == 302
+    assert retry.location == first.location
+    assert retry.headers.get('Idempotent-Replayed') == 'true'
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 50
+        assert Transaction.query.filter_by(user_id=user_id).count() == 1
+
+
+def test_replay_repeats_the_original_flash(app, users):
+    users.create_and_login('flashy')
+
+    users.post('/deposit', data={'amount': '20'}, headers={'Idempotency-Key': 'k-1'})
+    page = users.post('/deposit', data={'amount': '20'}, headers={'Idempotency-Key': 'k-1'}, follow_redirects=True)
+
+    assert b'Deposited R20.00' in page.data
+
+
+def test_new_key_runs_again(app, users):
+    user_id = users.create_and_login('twice')
+
+    users.post('/deposit', data={'amount': '10', 'idempotency_key': 'one'})
+    users.post('/deposit', data={'amount': '10', 'idempotency_key': 'two'})
+    users.post('/deposit', data={'amount': '10'})
+
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 30
+
+
+def test_key_reused_for_different_request_is_rejected(app, users):
+    user_id = users.create_and_login('sneaky', wallet_balance=100)
+
+    users.post('/withdraw', data={'amount': '10', 'idempotency_key': 'same'})
+    response = users.post('/withdraw', data={'amount': '90', 'idempotency_key': 'same'})
+
+    assert response.status_code == 422
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 90
+
+
+def test_in_flight_key_is_not_run_twice(app, users):
+    with app.app_context():
+        user_id = users.create_and_login('impatient')
+        db.session.add(IdempotencyKey(
+            user_id=user_id, key='busy', endpoint='main.deposit', fingerprint='x',
+            expires_at=datetime.utcnow() + timedelta(seconds=30)
+        ))
+        db.session.commit()
+
+    response = users.post('/deposit', data={'amount': '10'}, headers={'Idempotency-Key': 'busy'})
+
+    assert response.status_code == 409
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 0
+
+
+def test_stale_pending_key_is_taken_over(app, users):
+    """A request that died mid-flight only blocks its key until the pending lock runs out"""
+    with app.app_context():
+        user_id = users.create_and_login('orphaned')
+        db.session.add(IdempotencyKey(
+            user_id=user_id, key='crashed', endpoint='main.deposit', fingerprint='x',
+            created_at=datetime.utcnow() - timedelta(minutes=5),
+            expires_at=datetime.utcnow() - timedelta(minutes=4)
+        ))
+        db.session.commit()
+
+    first = users.post('/deposit', data={'amount': '10'}, headers={'Idempotency-Key': 'crashed'})
+    retry = users.post('/deposit', data={'amount': '10'}, headers={'Idempotency-Key': 'crashed'})
+
+    assert first.status_code == 302
+    assert retry.headers.get('Idempotent-Replayed') == 'true'
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 10
+        record = IdempotencyKey.query.filter_by(key='crashed').one()
+        assert record.status == 'completed'
+        assert record.expires_at > datetime.utcnow() + timedelta(hours=23)
+
+
+def test_crash_before_storing_the_response_is_not_run_again(app, users, monkeypatch):
+    """The key is marked in the deposit's own transaction, so a retry can't deposit twice"""
+    user_id = users.create_and_login('unlucky')
+
+    def crash(*args):
+        raise RuntimeError('worker killed')
+
+    monkeypatch.setattr(idempotency, '_complete', crash)
+    with pytest.raises(RuntimeError):
+        users.post('/deposit', data={'amount': '10'}, headers={'Idempotency-Key': 'lost'})
+    monkeypatch.undo()
+
+    with app.app_context():
+        assert IdempotencyKey.query.filter_by(key='lost').one().status == 'committed'
+        # Long past the pending lock, the key still isn't taken over
+        IdempotencyKey.query.update({IdempotencyKey.created_at: datetime.utcnow() - timedelta(hours=1)})
+        db.session.commit()
+
+    retry = users.post('/deposit', data={'amount': '10'}, headers={'Idempotency-Key': 'lost'})
+
+    assert retry.status_code == 409
+    assert b'went through' in retry.data
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 10
+
+
+def test_request_whose_key_was_taken_over_cannot_commit(app, users):
+    with app.app_context():
+        user_id = users.create('overtaken')
+        record = IdempotencyKey(
+            user_id=user_id, key='slow', endpoint='main.deposit', fingerprint='x',
+            created_at=datetime.utcnow(), expires_at=datetime.utcnow() + timedelta(seconds=60)
+        )
+        db.session.add(record)
+        db.session.commit()
+
+        # This request claimed the key a while ago; a retry has since restamped it
+        db.session.info[idempotency.CLAIM] = (record.id, datetime.utcnow() - timedelta(minutes=2))
+        try:
+            assert not WalletService.deposit(user_id, 10)['success']
+        finally:
+            db.session.info.pop(idempotency.CLAIM)
+
+        assert db.session.get(User, user_id).wallet_balance == 0
+        assert Transaction.query.filter_by(user_id=user_id).count() == 0
+
+
+def test_expired_key_runs_again_and_is_pruned(app, users):
+    user_id = users.create_and_login('returning')
+
+    users.post('/deposit', data={'amount': '10', 'idempotency_key': 'old'})
+    with app.app_context():
+        IdempotencyKey.query.update({IdempotencyKey.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+
+    users.post('/deposit', data={'amount': '10', 'idempotency_key': 'old'})
+
+    with app.app_context():
+        assert db.session.get(User, user_id).wallet_balance == 20
+        assert prune_idempotency_keys(now=datetime.utcnow() + timedelta(days=2)) == 1
+
+
+def test_retried_hire_creates_one_job(app, users):
+    with app.app_context():
+        provider_id = users.create('plumber')
+        service = Service(provider_id=provider_id, name='Leak Fix', category='Plumbing', price=40, latitude=0.0, longitude=0.0)
+        db.session.add(service)
+        db.session.commit()
+        service_id = service.id
+        client_id = users.create_and_login('customer', wallet_balance=100)
+
+    for _ in range(3):
+        users.post(f'/linkup/hire/{service_id}', headers={'Idempotency-Key': 'hire-1'})
+
+    with app.app_context():
+        assert Job.query.filter_by(client_id=client_id).count() == 1
+        assert db.session.get(User, client_id).wallet_balance == 60
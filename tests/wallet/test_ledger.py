@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func
+from app.extensions import db
+from app.models import User, Service, Job, CivicIssue, LedgerEntry, LedgerPosting, BalanceSnapshot
+from app.services import ledger
+from app.services.wallet import WalletService
+
+
+def test_every_entry_balances(app, users):
+    with app.app_context():
+        alice = users.create('alice')
+        bob = users.create('bob')
+
+        WalletService.deposit(alice, 200)
+        WalletService.transfer(alice, bob, 50)
+        WalletService.withdraw(bob, 20)
+        WalletService.convert_money_to_points(alice, 10)
+        WalletService.reward(bob, 50, points=10, reason='Civic report')
+
+        totals = db.session.query(func.sum(LedgerPosting.amount)).group_by(LedgerPosting.entry_id).all()
+        assert len(totals) == 5
+        assert all(total == 0 for (total,) in totals)
+
+        # The ledger agrees with the cached wallet balances
+        for user_id in (alice, bob):
+            assert ledger.balance(ledger.wallet_account(user_id)) == db.session.get(User, user_id).wallet_balance
+
+
+def test_failed_movement_posts_nothing(app, users):
+    with app.app_context():
+        user_id = users.create('broke', wallet_balance=5)
+
+        assert not WalletService.withdraw(user_id, 10)['success']
+        assert LedgerEntry.query.count() == 0
+
+
+def test_unbalanced_entry_is_rejected(app):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            ledger.record('Deposit', [(ledger.EXTERNAL, -10), (ledger.wallet_account(1), 5)])
+
+
+def test_balance_as_of_uses_snapshots(app, users):
+    with app.app_context():
+        user_id = users.create('saver')
+        account = ledger.wallet_account(user_id)
+        start = datetime.utcnow()
+
+        for _ in range(3):
+            WalletService.deposit(user_id, 10)
+        # Age the postings past the settle window so the snapshot covers them
+        LedgerPosting.query.update({LedgerPosting.created_at: start - timedelta(hours=1)})
+        db.session.commit()
+
+        assert ledger.take_snapshots() == 2  # the wallet and 'external'
+        snapshot = BalanceSnapshot.query.filter_by(account=account).one()
+        assert snapshot.balance == 30
+
+        WalletService.deposit(user_id, 5)
+        assert ledger.balance(account) == 35
+        assert ledger.balance(account, as_of=start) == 30
+
+        # Nothing new has settled, so a second run writes nothing
+        assert ledger.take_snapshots() == 0
+
+
+def test_snapshot_repairs_postings_committed_late(app, users):
+    with app.app_context():
+        user_id = users.create('saver')
+        account = ledger.wallet_account(user_id)
+        for amount in (10, 20, 30):
+            WalletService.deposit(user_id, amount)
+        LedgerPosting.query.update({LedgerPosting.created_at: datetime.utcnow() - timedelta(hours=1)})
+        db.session.commit()
+
+        # The middle deposit's postings aren't visible yet when the snapshot runs
+        late = [
+            {'id': p.id, 'entry_id': p.entry_id, 'account': p.account, 'amount': p.amount, 'created_at': p.created_at}
+            for p in LedgerPosting.query.filter(LedgerPosting.amount.in_([20, -20]))
+        ]
+        LedgerPosting.query.filter(LedgerPosting.id.in_([row['id'] for row in late])).delete()
+        db.session.commit()
+        assert ledger.take_snapshots() == 2
+        assert ledger.balance(account) == 40
+
+        db.session.execute(LedgerPosting.__table__.insert(), late)
+        db.session.commit()
+        assert ledger.balance(account) == 40  # below the snapshot's high-water mark
+
+        assert ledger.take_snapshots() == 2
+        assert ledger.balance(account) == 60
+        assert ledger.balance(ledger.EXTERNAL) == -60
+        assert ledger.take_snapshots() == 0
+
+
+def test_hire_holds_price_in_escrow(app, users):
+    with app.app_context():
+        provider = users.create('plumber')
+        customer = users.create('customer', wallet_balance=150)
+        service = Service(provider_id=provider, name='Leak Fix', category='Plumbing', price=100, latitude=0.0, longitude=0.0)
+        db.session.add(service)
+        db.session.commit()
+        service_id = service.id
+
+    users.login(customer)
+    users.post(f'/linkup/hire/{service_id}')
+
+    with app.app_context():
+        job = Job.query.filter_by(client_id=customer).one()
+        assert db.session.get(User, customer).wallet_balance == 50
+        assert ledger.balance(ledger.ESCROW) == 100
+        assert LedgerEntry.query.filter_by(entry_type='Escrow').one().job_id == job.id
+
+    # A second hire can't be covered: no job, no escrow, no charge
+    users.post(f'/linkup/hire/{service_id}')
+
+    with app.app_context():
+        assert Job.query.filter_by(client_id=customer).count() == 1
+        assert db.session.get(User, customer).wallet_balance == 50
+        assert ledger.balance(ledger.ESCROW) == 100
+
+
+def test_severe_civic_report_is_rewarded_through_the_ledger(app, users):
+    with app.app_context():
+        reporter = users.create('reporter')
+
+    users.login(reporter)
+    users.post('/civic/report', data={'title': 'Main Rd', 'description': 'Deep pothole by the taxi rank',
+                                      'latitude': '-26.24', 'longitude': '27.85'})
+    users.post('/civic/report', data={'title': 'Faded paint', 'description': 'Lines need repainting',
+                                      'latitude': '', 'longitude': ''})
+
+    with app.app_context():
+        severe, mild = CivicIssue.query.order_by(CivicIssue.id).all()
+        assert (severe.category, severe.status, severe.ai_risk_score) == ('General', 'Reported', 90)
+        assert len(severe.guardian_seal) == 64
+        assert mild.ai_risk_score == 40 and mild.latitude == -26.2321
+
+        # Only the severe report pays out, and it's one balanced ledger entry
+        assert db.session.get(User, reporter).wallet_balance == 50
+        entry = LedgerEntry.query.filter_by(entry_type='Reward').one()
+        postings = sorted((p.account, p.amount) for p in LedgerPosting.query.filter_by(entry_id=entry.id))
+        assert postings == [(ledger.REWARDS, -50), (ledger.wallet_account(reporter), 50)]
+
+    assert b'SEVERITY: 90' in users.get('/civic/').data
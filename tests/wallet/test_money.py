@@ -0,0 +1,68 @@
+from decimal import Decimal
+from app.extensions import db
+from app.models import User, Transaction
+from app.services.money import Money
+from app.services.wallet import WalletService
+
+
+def test_money_rounds_rands_to_cents():
+    assert Money.from_rands(12.345).cents == 1235
+    assert Money.from_rands('0.1').cents == 10
+    assert Money.coerce(Money(5)) == Money(5)
+    assert Money.coerce(None) is None
+
+
+def test_money_arithmetic_is_exact():
+    # 0.1 + 0.2 != 0.3 in floats
+    assert Money.from_rands(0.1) + Money.from_rands(0.2) == Money.from_rands(0.3)
+    assert sum([Money(10)] * 3) == Money(30)
+    assert Money(250) - 1 == Money(150)
+    assert Money(10) * 7 == Money(70)
+    assert Money(1250) == 12.5
+    assert Money(100) > 0.99
+    assert f'R{Money(1250):.2f}' == 'R12.50'
+    assert str(Money(-5)) == '-0.05'
+    assert Money(1250).rands == Decimal('12.50')
+
+
+def test_column_stores_integer_cents(app):
+    with app.app_context():
+        user = User(username='saver', email='saver@example.com', wallet_balance=12.34)
+        user.set_password('x')
+        db.session.add(user)
+        db.session.commit()
+
+        raw = db.session.execute(db.text('SELECT wallet_balance FROM "user"')).scalar()
+        assert raw == 1234
+        assert db.session.get(User, user.id).wallet_balance == Money(1234)
+
+
+def test_sql_sum_stays_exact(app):
+    with app.app_context():
+        user = User(username='micro', email='micro@example.com', wallet_balance=0)
+        user.set_password('x')
+        db.session.add(user)
+        db.session.commit()
+
+        db.session.execute(Transaction.__table__.insert(), [
+            {'user_id': user.id, 'amount': Money(10), 'transaction_type': 'Deposit'}
+            for _ in range(10000)
+        ])
+        db.session.commit()
+
+        total = db.session.query(db.func.sum(Transaction.amount)).scalar()
+        assert total == Money(100000)
+        assert total.cents == 100000
+
+
+def test_money_to_points_has_no_float_truncation(app):
+    with app.app_context():
+        user = User(username='converter', email='c@example.com', wallet_balance=1, reputation_points=0)
+        user.set_password('x')
+        db.session.add(user)
+        db.session.commit()
+
+        result = WalletService.convert_money_to_points(user.id, 0.3)
+
+        assert result['total_points'] == 3
+        assert result['new_balance'] == Money(70)
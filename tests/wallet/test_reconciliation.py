@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models import User, Transaction, ReconciledBalance, BalanceDrift
+from app.services.reconciliation import reconcile, RECONCILE_SETTLE
+from app.services.wallet import WalletService
+
+
+def _settled():
+    return datetime.utcnow() + RECONCILE_SETTLE + timedelta(seconds=1)
+
+
+def test_wallet_movements_reconcile_cleanly(app, users):
+    with app.app_context():
+        alice, bob = users.create('alice'), users.create('bob')
+        WalletService.deposit(alice, 100)
+        WalletService.withdraw(alice, 30)
+        WalletService.transfer(alice, bob, 25.5)
+
+        run = reconcile(now=_settled())
+
+        assert run.drift_count == 0
+        assert run.transactions_checked == Transaction.query.count()
+        assert run.last_transaction_id == db.session.query(db.func.max(Transaction.id)).scalar()
+        assert db.session.get(ReconciledBalance, bob).transaction_total == 25.5
+
+
+def test_tampered_balance_is_recorded_as_drift(app, users):
+    with app.app_context():
+        alice = users.create('alice')
+        WalletService.deposit(alice, 100)
+        User.query.filter_by(id=alice).update({'wallet_balance': 150})
+        db.session.commit()
+
+        run = reconcile(now=_settled())
+
+        (drift,) = run.drifts
+        assert drift.user_id == alice
+        assert (drift.expected, drift.actual, drift.difference) == (100, 150, 50)
+
+
+def test_later_runs_only_fold_new_transactions(app, users):
+    with app.app_context():
+        alice = users.create('alice')
+        WalletService.deposit(alice, 40)
+        first = reconcile(now=_settled())
+        WalletService.deposit(alice, 2)
+        WalletService.deposit(alice, 3)
+
+        second = reconcile(now=_settled())
+        third = reconcile(now=_settled())
+
+        assert first.transactions_checked == 1
+        assert second.transactions_checked == 2
+        assert third.transactions_checked == 0
+        assert third.last_transaction_id == second.last_transaction_id
+        assert db.session.get(ReconciledBalance, alice).transaction_total == 45
+        assert BalanceDrift.query.count() == 0
+
+
+def test_unsettled_transactions_wait_for_the_next_run(app, users):
+    with app.app_context():
+        alice = users.create('alice')
+        WalletService.deposit(alice, 10)
+
+        early = reconcile()
+        assert early.transactions_checked == 0
+        assert early.drift_count == 0  # the fresh deposit is taken back off the balance
+
+        later = reconcile(now=_settled())
+        assert later.transactions_checked == 1
+        assert later.drift_count == 0
+
+
+def test_balance_without_history_is_drift(app, users):
+    with app.app_context():
+        ghost = users.create('ghost', wallet_balance=500)
+
+        run = reconcile(now=_settled())
+
+        assert [(d.user_id, d.expected, d.actual) for d in run.drifts] == [(ghost, 0, 500)]
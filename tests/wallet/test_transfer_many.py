@@ -0,0 +1,72 @@
+from sqlalchemy import func
+from app.extensions import db
+from app.models import User, Transaction, LedgerPosting
+from app.services import ledger
+from app.services.wallet import WalletService
+
+
+def test_pays_every_recipient_in_one_batch(app, users):
+    with app.app_context():
+        boss = users.create('boss', wallet_balance=1000)
+        crew = [users.create(f'worker{i}') for i in range(20)]
+
+        result = WalletService.transfer_many(boss, [(worker, 25, 'Week 1 wages') for worker in crew])
+
+        assert result['success']
+        assert result['count'] == 20
+        assert result['sender_balance'] == 500
+        for worker in crew:
+            assert db.session.get(User, worker).wallet_balance == 25
+        assert Transaction.query.filter_by(user_id=boss, transaction_type='Payment').count() == 20
+        assert Transaction.query.filter_by(transaction_type='Earning').count() == 20
+        assert Transaction.query.filter_by(user_id=crew[0]).one().description == 'Week 1 wages from boss'
+        assert ledger.balance(ledger.wallet_account(boss)) == -500  # no opening entry in tests
+        assert db.session.query(func.sum(LedgerPosting.amount)).scalar() == 0
+
+
+def test_repeated_recipient_is_credited_for_each_payout(app, users):
+    with app.app_context():
+        boss = users.create('boss', wallet_balance=100)
+        worker = users.create('worker')
+
+        result = WalletService.transfer_many(boss, [(worker, 10, 'Shift'), (worker, 15, None)])
+
+        assert result['success']
+        assert db.session.get(User, worker).wallet_balance == 25
+        assert Transaction.query.filter_by(user_id=worker).count() == 2
+
+
+def test_short_funds_pay_nobody(app, users):
+    with app.app_context():
+        boss = users.create('boss', wallet_balance=50)
+        crew = [users.create(f'worker{i}') for i in range(3)]
+
+        result = WalletService.transfer_many(boss, [(worker, 20, 'Wages') for worker in crew])
+
+        assert not result['success']
+        assert 'Insufficient funds' in result['message']
+        assert db.session.get(User, boss).wallet_balance == 50
+        assert all(db.session.get(User, worker).wallet_balance == 0 for worker in crew)
+        assert Transaction.query.count() == 0
+
+
+def test_unknown_recipient_pays_nobody(app, users):
+    with app.app_context():
+        boss = users.create('boss', wallet_balance=50)
+        worker = users.create('worker')
+
+        result = WalletService.transfer_many(boss, [(worker, 10, 'Wages'), (9999, 10, 'Wages')])
+
+        assert not result['success']
+        assert result['message'] == 'Recipient not found: 9999'
+        assert db.session.get(User, boss).wallet_balance == 50
+        assert db.session.get(User, worker).wallet_balance == 0
+
+
+def test_rejects_bad_payouts(app, users):
+    with app.app_context():
+        boss = users.create('boss', wallet_balance=50)
+
+        assert not WalletService.transfer_many(boss, [])['success']
+        assert not WalletService.transfer_many(boss, [(boss, 10, 'Self')])['success']
+        assert not WalletService.transfer_many(boss, [(2, -5, 'Refund')])['success']